@@ -1,9 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import json
 
-from database import get_db, FanCurve
+from database import as_utc, get_db, FanCurve, utcnow
+from services.curve_replay import replay_curve
+from services.fan_controller import CompiledCurve, DEFAULT_SPEED_DEADBAND
+from services.history_query import HISTORY_RANGES
 
 router = APIRouter()
 
@@ -24,6 +30,26 @@ class CurveResponse(BaseModel):
 class CurveUpdateRequest(BaseModel):
     points: List[CurvePoint]
 
+class CurveSimulateRequest(BaseModel):
+    points: List[CurvePoint]
+    # 回放的时间范围：since/until（ISO 8601，不含时区按 UTC）优先，否则为最近 range
+    range: str = "24h"
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    host_id: Optional[int] = None
+    # 转速死区，默认与监控服务当前配置相同
+    deadband: Optional[int] = None
+
+def _validate_points(points: List[CurvePoint]):
+    if len(points) < 2:
+        raise HTTPException(status_code=400, detail="至少需要2个控制点")
+    
+    for point in points:
+        if not (0 <= point.temp <= 100):
+            raise HTTPException(status_code=400, detail=f"温度值无效: {point.temp}")
+        if not (0 <= point.speed <= 100):
+            raise HTTPException(status_code=400, detail=f"转速值无效: {point.speed}")
+
 @router.get("", response_model=CurveResponse)
 def get_curve(db: Session = Depends(get_db)):
     """获取风扇曲线配置"""
@@ -36,14 +62,7 @@ def get_curve(db: Session = Depends(get_db)):
 def update_curve(request: CurveUpdateRequest, db: Session = Depends(get_db)):
     """更新风扇曲线配置"""
     # 验证数据
-    if len(request.points) < 2:
-        raise HTTPException(status_code=400, detail="至少需要2个控制点")
-    
-    for point in request.points:
-        if not (0 <= point.temp <= 100):
-            raise HTTPException(status_code=400, detail=f"温度值无效: {point.temp}")
-        if not (0 <= point.speed <= 100):
-            raise HTTPException(status_code=400, detail=f"转速值无效: {point.speed}")
+    _validate_points(request.points)
     
     # 清除旧数据
     db.query(FanCurve).delete()
@@ -59,3 +78,37 @@ def update_curve(request: CurveUpdateRequest, db: Session = Depends(get_db)):
         monitor_service.invalidate_curve_cache()
     
     return {"success": True}
+
+@router.post("/simulate")
+def simulate_curve(request: CurveSimulateRequest):
+    """在历史数据上回放候选曲线（不修改当前曲线）
+
+    按下发规则（含转速死区）计算每个采样会下发的转速，流式返回 NDJSON：
+    若干行 ``{"type": "commands", "data": [[主机, Unix 秒, 转速], ...]}``，
+    最后一行 ``{"type": "summary"}`` 含命令数、转速变化次数、平均转速、
+    各转速累计时长（秒）的直方图，以及历史上实际转速的同样统计。
+    """
+    _validate_points(request.points)
+    if request.range not in HISTORY_RANGES:
+        raise HTTPException(status_code=400, detail=f"时间范围必须是以下之一: {list(HISTORY_RANGES)}")
+    until = as_utc(request.until) if request.until else utcnow()
+    since = as_utc(request.since) if request.since else until - HISTORY_RANGES[request.range][0]
+    if since >= until:
+        raise HTTPException(status_code=400, detail="起始时间必须早于结束时间")
+    
+    deadband = request.deadband
+    if deadband is None:
+        deadband = monitor_service.speed_deadband if monitor_service else DEFAULT_SPEED_DEADBAND
+    if not (0 <= deadband <= 20):
+        raise HTTPException(status_code=400, detail="转速死区必须在0-20%之间")
+    
+    # 未指定主机时默认回放默认主机的数据
+    host_id = request.host_id
+    if host_id is None and monitor_service is not None and monitor_service.primary_host:
+        host_id = monitor_service.primary_host.host_id
+    
+    curve = CompiledCurve((p.temp, p.speed) for p in request.points)
+    return StreamingResponse(
+        (json.dumps(item, ensure_ascii=False) + "\n" for item in replay_curve(curve, since, until, host_id, deadband)),
+        media_type="application/x-ndjson"
+    )
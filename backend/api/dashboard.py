@@ -1,8 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import timedelta
+from typing import Iterator, List, Optional
+from datetime import datetime, timedelta
+import csv
+import io
+import json
 
-from database import get_db, MonitorHistory, utcnow
+from database import as_utc, get_read_db, read_engine, utcnow
+from services.history_query import bucket_seconds_for, query_history, resolve_range
+from services.history_store import get_history_store
+from services.sensor_store import query_sensor_history
+from services import history_format
 
 router = APIRouter()
 
@@ -22,72 +31,161 @@ def get_status():
             "fan_speed": 0,
             "power": 0,
             "control_mode": "auto",
-            "last_update": None
+            "last_update": None,
+            "hosts": {}
         }
-    return dict(monitor_service.current_status)
+    status = dict(monitor_service.current_status)
+    status["hosts"] = dict(status["hosts"])
+    return status
 
 @router.get("/history")
-def get_history(range: str = "1h", db: Session = Depends(get_db)):
-    """获取历史数据（自动采样，限制最大数据点数）"""
-    time_ranges = {
-        "1h": timedelta(hours=1),
-        "6h": timedelta(hours=6),
-        "24h": timedelta(hours=24),
-        "7d": timedelta(days=7),
-    }
-    
-    # 每个时间范围的最大数据点数
-    max_points = {
-        "1h": 120,    # 1小时，约30秒一个点
-        "6h": 180,    # 6小时，约2分钟一个点
-        "24h": 288,   # 24小时，约5分钟一个点
-        "7d": 336,    # 7天，约30分钟一个点
-    }
-    
-    delta = time_ranges.get(range, timedelta(hours=1))
-    limit = max_points.get(range, 120)
-    since = utcnow() - delta
-    
-    # 获取总记录数
-    total_count = db.query(MonitorHistory)\
-        .filter(MonitorHistory.recorded_at >= since)\
-        .count()
+def get_history(
+    range: str = "1h",
+    host_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=10, le=5000, description="最大数据点数"),
+    format: Optional[str] = Query(None, description="响应格式: json / columnar / binary / msgpack，优先于 Accept"),
+    accept: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db)
+):
+    """获取历史数据（按时间桶聚合，限制最大数据点数）
+
+    最近 6 小时内的范围直接由监控服务的内存缓冲计算，其余在数据库中聚合。
+    默认返回逐点 JSON；通过 format 参数或 Accept 头可选择列式 JSON、
+    紧凑二进制或 msgpack（需安装 msgpack）。
+    """
+    media = history_format.negotiate(accept, format)
+    if media is None:
+        raise HTTPException(
+            status_code=406,
+            detail=f"不支持的格式，可选: {history_format.supported_media_types()}"
+        )
+    delta, max_points = resolve_range(range)
+    until = utcnow()
+    since = until - delta
     
-    # 计算采样间隔
-    if total_count <= limit:
-        # 数据量不大，直接返回全部
-        records = db.query(MonitorHistory)\
-            .filter(MonitorHistory.recorded_at >= since)\
-            .order_by(MonitorHistory.recorded_at)\
-            .all()
-    else:
-        # 数据量大，进行采样
-        # 使用 SQL 的 ROW_NUMBER 进行均匀采样
-        step = total_count // limit
-        records = db.query(MonitorHistory)\
-            .filter(MonitorHistory.recorded_at >= since)\
-            .order_by(MonitorHistory.recorded_at)\
-            .all()
-        # 均匀采样
-        records = records[::step][:limit]
+    # 未指定主机时默认返回默认主机的数据
+    if host_id is None and monitor_service is not None and monitor_service.primary_host:
+        host_id = monitor_service.primary_host.host_id
     
-    return {
-        "data": [
-            {
-                "time": r.recorded_at.isoformat(),
-                "cpu_temp": r.cpu_temp,
-                "fan_speed": r.fan_speed,
-                "power": r.power_consumption
-            }
-            for r in records
-        ]
-    }
+    limit = limit or max_points
+    data = None
+    if host_id is not None and monitor_service is not None:
+        data = monitor_service.sample_buffer.query(host_id, since, until, limit)
+    if data is None:
+        data = query_history(db, since, until, limit, host_id)
+
+    if media == history_format.MEDIA_JSON:
+        return {"data": data}
+    columnar = history_format.to_columnar(data, bucket_seconds_for(delta, limit))
+    if media == history_format.MEDIA_COLUMNAR:
+        return JSONResponse({"data": columnar}, media_type=media)
+    if media == history_format.MEDIA_MSGPACK:
+        return Response(history_format.pack_msgpack(columnar), media_type=media)
+    return Response(history_format.pack_binary(columnar), media_type=media)
+
+
+# 导出时每次从数据库取出并输出的行数
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_COLUMNS = ("host_id", "recorded_at", "cpu_temp", "fan_speed", "power_consumption")
+
+
+def _export_rows(since: datetime, until: datetime, host_id: Optional[int], fmt: str) -> Iterator[str]:
+    """分块读取原始数据并逐块编码，内存占用与导出总行数无关"""
+    samples = get_history_store().select_samples(since, until, host_id)
+    stmt = samples.select().order_by(samples.c.recorded_at)
+    if fmt == "csv":
+        yield ",".join(EXPORT_COLUMNS) + "\n"
+    # 响应流式发送期间依赖注入的会话已关闭，这里单独使用只读连接
+    with read_engine.connect() as conn:
+        result = conn.execution_options(yield_per=EXPORT_CHUNK_ROWS).execute(stmt)
+        for rows in result.partitions():
+            buffer = io.StringIO()
+            if fmt == "csv":
+                writer = csv.writer(buffer, lineterminator="\n")
+                for row in rows:
+                    writer.writerow((row.host_id, row.recorded_at.isoformat(), row.cpu_temp,
+                                     row.fan_speed, row.power_consumption))
+            else:
+                for row in rows:
+                    buffer.write(json.dumps({
+                        "host_id": row.host_id,
+                        "recorded_at": row.recorded_at.isoformat(),
+                        "cpu_temp": row.cpu_temp,
+                        "fan_speed": row.fan_speed,
+                        "power_consumption": row.power_consumption,
+                    }) + "\n")
+            yield buffer.getvalue()
+
+
+@router.get("/history/export")
+def export_history(
+    since: Optional[datetime] = Query(None, description="起始时间（ISO 8601，默认 24 小时前）"),
+    until: Optional[datetime] = Query(None, description="结束时间（ISO 8601，默认当前时间）"),
+    host_id: Optional[int] = None,
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="导出格式: csv / ndjson")
+):
+    """流式导出原始历史数据（不做聚合），按时间顺序分块输出"""
+    # 未带时区按 UTC 处理，带时区的统一换算到 UTC（数据库中存的是 UTC 时间）
+    until = as_utc(until) if until else utcnow()
+    since = as_utc(since) if since else until - timedelta(hours=24)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="起始时间必须早于结束时间")
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"history_{since:%Y%m%d%H%M}_{until:%Y%m%d%H%M}.{format}"
+    return StreamingResponse(
+        _export_rows(since, until, host_id, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/sensors")
+def get_sensors(host_id: Optional[int] = None):
+    """主机最近一次读取到的全部传感器（各 CPU、进/出风口温度、风扇、功耗等）"""
+    if monitor_service is None:
+        raise HTTPException(status_code=500, detail="监控服务未启动")
+    if host_id is None and monitor_service.primary_host:
+        host_id = monitor_service.primary_host.host_id
+    readings = monitor_service.sensor_readings(host_id) if host_id is not None else None
+    if readings is None:
+        raise HTTPException(status_code=404, detail="主机不存在")
+    return readings
+
+@router.get("/sensors/history")
+def get_sensor_history(
+    host_id: Optional[int] = None,
+    range: str = "1h",
+    name: Optional[List[str]] = Query(None, description="只返回这些传感器（可重复），默认全部"),
+    limit: Optional[int] = Query(None, ge=10, le=5000, description="每个传感器的最大数据点数"),
+):
+    """逐传感器的历史读数（按时间桶聚合 avg/min/max）"""
+    if host_id is None and monitor_service is not None and monitor_service.primary_host:
+        host_id = monitor_service.primary_host.host_id
+    if host_id is None:
+        raise HTTPException(status_code=400, detail="请指定主机")
+    delta, max_points = resolve_range(range)
+    until = utcnow()
+    return query_sensor_history(host_id, until - delta, until, limit or max_points, name)
+
+@router.get("/health")
+def get_health():
+    """每台主机的 BMC 熔断器状态（closed / open / half_open）、健康分、错误率和调用延迟"""
+    if monitor_service is None:
+        raise HTTPException(status_code=500, detail="监控服务未启动")
+    return monitor_service.health_stats()
+
+@router.get("/control")
+def get_control_stats():
+    """风扇控制器配置及每台主机已发送 / 被跳过的转速命令数"""
+    if monitor_service is None:
+        raise HTTPException(status_code=500, detail="监控服务未启动")
+    return monitor_service.control_stats()
 
 @router.post("/restore-auto")
-async def restore_auto_control():
-    """恢复自动风扇控制"""
+async def restore_auto_control(host_id: Optional[int] = None):
+    """恢复自动风扇控制（未指定主机时恢复全部主机）"""
     if monitor_service is None:
         raise HTTPException(status_code=500, detail="监控服务未启动")
     
-    await monitor_service.restore_auto_control()
+    await monitor_service.restore_auto_control(host_id)
     return {"success": True}
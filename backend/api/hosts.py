@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import Optional, List
+
+from database import get_db, Host, PASSWORD_MASK
+from services.ipmi_transport import TRANSPORTS
+from services.sensor_backend import SENSOR_BACKENDS
+
+router = APIRouter()
+
+# 全局引用，将在 main.py 中设置
+monitor_service = None
+
+def set_monitor_service(service):
+    global monitor_service
+    monitor_service = service
+
+class HostResponse(BaseModel):
+    id: int
+    name: str
+    ip_address: str
+    username: str
+    password: str
+    enabled: bool
+    ipmi_transport: Optional[str]
+    sensor_backend: Optional[str]
+
+class HostCreateRequest(BaseModel):
+    name: str
+    ip_address: str
+    username: str = "root"
+    password: str = ""
+    enabled: bool = True
+    ipmi_transport: Optional[str] = None
+    sensor_backend: Optional[str] = None
+
+class HostUpdateRequest(BaseModel):
+    name: Optional[str] = None
+    ip_address: Optional[str] = None
+    username: Optional[str] = None
+    password: Optional[str] = None
+    enabled: Optional[bool] = None
+    ipmi_transport: Optional[str] = None
+    sensor_backend: Optional[str] = None
+
+def _to_response(host: Host) -> HostResponse:
+    return HostResponse(
+        id=host.id,
+        name=host.name,
+        ip_address=host.ip_address,
+        username=host.username,
+        password=PASSWORD_MASK if host.password else "",
+        enabled=host.enabled,
+        ipmi_transport=host.ipmi_transport,
+        sensor_backend=host.sensor_backend
+    )
+
+def _validate_backends(transport: Optional[str], sensor_backend: Optional[str]):
+    if transport is not None and transport not in TRANSPORTS:
+        raise HTTPException(status_code=400, detail=f"IPMI 传输方式必须是以下之一: {list(TRANSPORTS)}")
+    if sensor_backend is not None and sensor_backend not in SENSOR_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"传感器后端必须是以下之一: {list(SENSOR_BACKENDS)}")
+
+@router.get("", response_model=List[HostResponse])
+def list_hosts(db: Session = Depends(get_db)):
+    """获取受管主机列表"""
+    return [_to_response(h) for h in db.query(Host).order_by(Host.id).all()]
+
+@router.post("", response_model=HostResponse)
+async def create_host(request: HostCreateRequest, db: Session = Depends(get_db)):
+    """添加受管主机"""
+    if db.query(Host).filter(Host.name == request.name).first():
+        raise HTTPException(status_code=400, detail=f"主机名已存在: {request.name}")
+    _validate_backends(request.ipmi_transport, request.sensor_backend)
+
+    host = Host(**request.model_dump())
+    db.add(host)
+    db.commit()
+    db.refresh(host)
+
+    if monitor_service:
+        await monitor_service.reload_settings()
+
+    return _to_response(host)
+
+@router.put("/{host_id}", response_model=HostResponse)
+async def update_host(host_id: int, request: HostUpdateRequest, db: Session = Depends(get_db)):
+    """更新受管主机"""
+    host = db.query(Host).filter(Host.id == host_id).first()
+    if not host:
+        raise HTTPException(status_code=404, detail="主机不存在")
+
+    updates = request.model_dump(exclude_none=True)
+    # 回传的密码掩码或空密码表示不修改密码
+    if updates.get("password") in ("", PASSWORD_MASK):
+        del updates["password"]
+    _validate_backends(updates.get("ipmi_transport"), updates.get("sensor_backend"))
+    for key, value in updates.items():
+        setattr(host, key, value)
+    db.commit()
+    db.refresh(host)
+
+    if monitor_service:
+        await monitor_service.reload_settings()
+
+    return _to_response(host)
+
+@router.delete("/{host_id}")
+async def delete_host(host_id: int, db: Session = Depends(get_db)):
+    """删除受管主机（历史数据保留）"""
+    host = db.query(Host).filter(Host.id == host_id).first()
+    if not host:
+        raise HTTPException(status_code=404, detail="主机不存在")
+
+    db.delete(host)
+    db.commit()
+
+    if monitor_service:
+        # 移除主机时监控服务会先交还风扇自动控制
+        await monitor_service.reload_settings()
+
+    return {"success": True}
@@ -1,53 +1,29 @@
 from fastapi import APIRouter, Query
+from datetime import datetime
 from typing import Optional
-import re
-from pathlib import Path
-import os
 
-router = APIRouter()
+from services.log_query import query_logs
+from services.log_store import query_log_records
 
-# 日志文件路径
-LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "logs")
-LOG_FILE = Path(LOG_DIR) / "fan_controller.log"
+router = APIRouter()
 
 @router.get("")
 def get_logs(
     level: Optional[str] = Query(None, description="日志级别过滤"),
     limit: int = Query(100, ge=1, le=1000),
-    search: Optional[str] = Query(None, description="搜索关键词")
+    search: Optional[str] = Query(None, description="搜索关键词"),
+    since: Optional[datetime] = Query(None, description="起始时间（不含时区时按服务器本地时间）"),
+    until: Optional[datetime] = Query(None, description="结束时间（不含时区时按服务器本地时间）"),
+    host: Optional[str] = Query(None, description="主机名（消息前缀 [主机名]）"),
+    cursor: Optional[int] = Query(None, description="分页游标，取上一页返回的 next_cursor"),
+    source: str = Query("store", pattern="^(store|file)$",
+                        description="store: 数据库（全文索引）；file: 日志文件（含启用数据库之前的日志）")
 ):
-    """获取日志"""
-    if not LOG_FILE.exists():
-        return {"logs": []}
-    
-    logs = []
-    pattern = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (\w+) - (.+)")
-    
-    with open(LOG_FILE, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    
-    for line in reversed(lines):
-        match = pattern.match(line.strip())
-        if not match:
-            continue
-        
-        time_str, log_level, message = match.groups()
-        
-        # 级别过滤
-        if level and log_level != level.upper():
-            continue
-        
-        # 关键词搜索
-        if search and search.lower() not in message.lower():
-            continue
-        
-        logs.append({
-            "time": time_str,
-            "level": log_level,
-            "message": message
-        })
-        
-        if len(logs) >= limit:
-            break
-    
-    return {"logs": logs}
+    """获取日志（从新到旧）"""
+    if source == "file":
+        return {"logs": query_logs(level=level, limit=limit, search=search, since=since, until=until),
+                "next_cursor": None}
+    logs, next_cursor = query_log_records(
+        level=level, limit=limit, search=search, since=since, until=until, host=host, cursor=cursor
+    )
+    return {"logs": logs, "next_cursor": next_cursor}
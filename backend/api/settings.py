@@ -3,7 +3,14 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional, List
 
-from database import get_db, Settings
+from database import get_db, Settings, sync_default_host, PASSWORD_MASK
+from services.ipmi_transport import TRANSPORTS
+from services.sensor_backend import SENSOR_BACKENDS, CONTROL_TARGETS, DEFAULT_CONTROL_TARGET
+from services.history_store import HISTORY_STORES, get_history_store
+from services.log_store import DEFAULT_LOG_RETENTION_DAYS
+from services.temperature_trend import DEFAULT_PREDICT_HORIZON, DEFAULT_PREDICT_WINDOW
+from services.poll_interval import DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL
+from services.fan_controller import CONTROLLERS, DEFAULT_CONTROLLER, DEFAULT_SPEED_DEADBAND
 
 router = APIRouter()
 
@@ -14,6 +21,8 @@ cleanup_service = None
 # 允许的数据保留天数选项
 RETENTION_OPTIONS: List[int] = [7, 30, 90, 365]
 DEFAULT_RETENTION_DAYS = 30
+# 允许的日志保留天数选项
+LOG_RETENTION_OPTIONS: List[int] = [3, 7, 14, 30, 90]
 
 def set_monitor_service(service):
     global monitor_service
@@ -28,12 +37,54 @@ class SettingsResponse(BaseModel):
     username: str
     password: str
     interval: int
+    adaptive_interval: bool
+    min_interval: int
+    max_interval: int
+    max_concurrency: int
+    ipmi_transport: str
+    sensor_backend: str
+    sensor_history: bool
+    control_sensor: str
+    history_storage: str
+    history_storage_active: str
+    predictive_control: bool
+    predict_horizon: int
+    predict_window: int
+    fan_controller: str
+    speed_deadband: int
+    fan_hysteresis: float
+    pid_setpoint: float
+    pid_kp: float
+    pid_ki: float
+    pid_kd: float
 
 class SettingsUpdateRequest(BaseModel):
     ip_address: Optional[str] = None
     username: Optional[str] = None
     password: Optional[str] = None
     interval: Optional[int] = None
+    adaptive_interval: Optional[bool] = None
+    min_interval: Optional[int] = None
+    max_interval: Optional[int] = None
+    max_concurrency: Optional[int] = None
+    ipmi_transport: Optional[str] = None
+    sensor_backend: Optional[str] = None
+    sensor_history: Optional[bool] = None
+    control_sensor: Optional[str] = None
+    history_storage: Optional[str] = None
+    predictive_control: Optional[bool] = None
+    predict_horizon: Optional[int] = None
+    predict_window: Optional[int] = None
+    fan_controller: Optional[str] = None
+    speed_deadband: Optional[int] = None
+    fan_hysteresis: Optional[float] = None
+    pid_setpoint: Optional[float] = None
+    pid_kp: Optional[float] = None
+    pid_ki: Optional[float] = None
+    pid_kd: Optional[float] = None
+
+# 默认主机连接信息对应的配置项
+HOST_SETTING_KEYS = {"ip_address", "username", "password"}
 
 @router.get("", response_model=SettingsResponse)
 def get_settings(db: Session = Depends(get_db)):
@@ -42,8 +93,29 @@ def get_settings(db: Session = Depends(get_db)):
     return SettingsResponse(
         ip_address=settings.get("ip_address", ""),
         username=settings.get("username", ""),
-        password="******" if settings.get("password") else "",
-        interval=int(settings.get("interval", 30))
+        password=PASSWORD_MASK if settings.get("password") else "",
+        interval=int(settings.get("interval", 30)),
+        adaptive_interval=settings.get("adaptive_interval", "false") == "true",
+        min_interval=int(settings.get("min_interval", DEFAULT_MIN_INTERVAL)),
+        max_interval=int(settings.get("max_interval", DEFAULT_MAX_INTERVAL)),
+        max_concurrency=int(settings.get("max_concurrency", 16)),
+        ipmi_transport=settings.get("ipmi_transport", "shell"),
+        sensor_backend=settings.get("sensor_backend", "racadm"),
+        sensor_history=settings.get("sensor_history", "false") == "true",
+        control_sensor=settings.get("control_sensor", DEFAULT_CONTROL_TARGET),
+        history_storage=settings.get("history_storage", "table"),
+        # 存储方式在启动时确定，修改后需重启才会生效
+        history_storage_active=get_history_store().name,
+        predictive_control=settings.get("predictive_control", "false") == "true",
+        predict_horizon=int(settings.get("predict_horizon", DEFAULT_PREDICT_HORIZON)),
+        predict_window=int(settings.get("predict_window", DEFAULT_PREDICT_WINDOW)),
+        fan_controller=settings.get("fan_controller", DEFAULT_CONTROLLER),
+        speed_deadband=int(settings.get("speed_deadband", DEFAULT_SPEED_DEADBAND)),
+        fan_hysteresis=float(settings.get("fan_hysteresis", 3)),
+        pid_setpoint=float(settings.get("pid_setpoint", 65)),
+        pid_kp=float(settings.get("pid_kp", 2.0)),
+        pid_ki=float(settings.get("pid_ki", 0.02)),
+        pid_kd=float(settings.get("pid_kd", 20))
     )
 
 @router.put("")
@@ -55,6 +127,60 @@ async def update_settings(request: SettingsUpdateRequest, db: Session = Depends(
     if "interval" in updates and not (5 <= updates["interval"] <= 300):
         raise HTTPException(status_code=400, detail="间隔时间必须在5-300秒之间")
     
+    # 验证自适应轮询的间隔范围（未提交的一端取当前配置）
+    if "min_interval" in updates or "max_interval" in updates:
+        current = {s.key: s.value for s in db.query(Settings).filter(
+            Settings.key.in_(["min_interval", "max_interval"])
+        )}
+        min_interval = updates.get("min_interval", int(current.get("min_interval", DEFAULT_MIN_INTERVAL)))
+        max_interval = updates.get("max_interval", int(current.get("max_interval", DEFAULT_MAX_INTERVAL)))
+        if not (5 <= min_interval <= max_interval <= 300):
+            raise HTTPException(status_code=400, detail="轮询间隔范围必须满足 5 ≤ 最短间隔 ≤ 最长间隔 ≤ 300 秒")
+    if "adaptive_interval" in updates:
+        updates["adaptive_interval"] = "true" if updates["adaptive_interval"] else "false"
+    
+    # 验证并发上限
+    if "max_concurrency" in updates and not (1 <= updates["max_concurrency"] <= 256):
+        raise HTTPException(status_code=400, detail="并发上限必须在1-256之间")
+    
+    # 验证 IPMI 传输方式
+    if "ipmi_transport" in updates and updates["ipmi_transport"] not in TRANSPORTS:
+        raise HTTPException(status_code=400, detail=f"IPMI 传输方式必须是以下之一: {list(TRANSPORTS)}")
+    
+    # 验证传感器后端
+    if "sensor_backend" in updates and updates["sensor_backend"] not in SENSOR_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"传感器后端必须是以下之一: {list(SENSOR_BACKENDS)}")
+    
+    # 验证风扇控制依据的温度
+    if "control_sensor" in updates and updates["control_sensor"] not in CONTROL_TARGETS:
+        raise HTTPException(status_code=400, detail=f"控制温度必须是以下之一: {list(CONTROL_TARGETS)}")
+    if "sensor_history" in updates:
+        updates["sensor_history"] = "true" if updates["sensor_history"] else "false"
+    
+    # 验证历史存储方式（重启后生效）
+    if "history_storage" in updates and updates["history_storage"] not in HISTORY_STORES:
+        raise HTTPException(status_code=400, detail=f"历史存储方式必须是以下之一: {list(HISTORY_STORES)}")
+    
+    # 验证预测控制参数
+    if "predict_horizon" in updates and not (0 <= updates["predict_horizon"] <= 600):
+        raise HTTPException(status_code=400, detail="预测提前量必须在0-600秒之间")
+    if "predict_window" in updates and not (2 <= updates["predict_window"] <= 60):
+        raise HTTPException(status_code=400, detail="预测窗口必须在2-60个采样之间")
+    if "predictive_control" in updates:
+        updates["predictive_control"] = "true" if updates["predictive_control"] else "false"
+    
+    # 验证风扇控制器参数
+    if "fan_controller" in updates and updates["fan_controller"] not in CONTROLLERS:
+        raise HTTPException(status_code=400, detail=f"风扇控制器必须是以下之一: {list(CONTROLLERS)}")
+    if "speed_deadband" in updates and not (0 <= updates["speed_deadband"] <= 20):
+        raise HTTPException(status_code=400, detail="转速死区必须在0-20%之间")
+    if "fan_hysteresis" in updates and not (0 <= updates["fan_hysteresis"] <= 20):
+        raise HTTPException(status_code=400, detail="温度回差必须在0-20°C之间")
+    if "pid_setpoint" in updates and not (30 <= updates["pid_setpoint"] <= 95):
+        raise HTTPException(status_code=400, detail="PID 目标温度必须在30-95°C之间")
+    if any(updates.get(key, 0) < 0 for key in ("pid_kp", "pid_ki", "pid_kd")):
+        raise HTTPException(status_code=400, detail="PID 参数不能为负数")
+    
     for key, value in updates.items():
         setting = db.query(Settings).filter(Settings.key == key).first()
         if setting:
@@ -64,6 +190,10 @@ async def update_settings(request: SettingsUpdateRequest, db: Session = Depends(
     
     db.commit()
     
+    # 单机连接信息同步到默认主机
+    if HOST_SETTING_KEYS & updates.keys():
+        sync_default_host(db)
+    
     # 通知监控服务重新加载配置
     if monitor_service:
         await monitor_service.reload_settings()
@@ -75,10 +205,13 @@ async def update_settings(request: SettingsUpdateRequest, db: Session = Depends(
 class RetentionSettingsResponse(BaseModel):
     retention_days: int
     options: List[int]
+    log_retention_days: int
+    log_options: List[int]
 
 
 class RetentionUpdateRequest(BaseModel):
     retention_days: int
+    log_retention_days: Optional[int] = None
 
 
 @router.get("/retention", response_model=RetentionSettingsResponse)
@@ -86,10 +219,14 @@ def get_retention_settings(db: Session = Depends(get_db)):
     """获取数据保留配置"""
     setting = db.query(Settings).filter(Settings.key == "retention_days").first()
     retention_days = int(setting.value) if setting else DEFAULT_RETENTION_DAYS
+    log_setting = db.query(Settings).filter(Settings.key == "log_retention_days").first()
+    log_retention_days = int(log_setting.value) if log_setting else DEFAULT_LOG_RETENTION_DAYS
     
     return RetentionSettingsResponse(
         retention_days=retention_days,
-        options=RETENTION_OPTIONS
+        options=RETENTION_OPTIONS,
+        log_retention_days=log_retention_days,
+        log_options=LOG_RETENTION_OPTIONS
     )
 
 
@@ -101,17 +238,44 @@ async def update_retention_settings(request: RetentionUpdateRequest, db: Session
             status_code=400, 
             detail=f"保留天数必须是以下选项之一: {RETENTION_OPTIONS}"
         )
+    if request.log_retention_days is not None and request.log_retention_days not in LOG_RETENTION_OPTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"日志保留天数必须是以下选项之一: {LOG_RETENTION_OPTIONS}"
+        )
     
-    setting = db.query(Settings).filter(Settings.key == "retention_days").first()
-    if setting:
-        setting.value = str(request.retention_days)
-    else:
-        db.add(Settings(key="retention_days", value=str(request.retention_days)))
+    updates = request.model_dump(exclude_none=True)
+    for key, value in updates.items():
+        setting = db.query(Settings).filter(Settings.key == key).first()
+        if setting:
+            setting.value = str(value)
+        else:
+            db.add(Settings(key=key, value=str(value)))
     
     db.commit()
     
     # 通知清理服务更新保留期限
     if cleanup_service:
         cleanup_service.set_retention_days(request.retention_days)
+        if request.log_retention_days is not None:
+            cleanup_service.set_log_retention_days(request.log_retention_days)
     
-    return {"success": True, "retention_days": request.retention_days}
+    return {"success": True, **updates}
+
+
+@router.get("/retention/cleanup")
+def get_cleanup_progress():
+    """获取最近一次数据清理的进度"""
+    if not cleanup_service:
+        return {"running": False}
+    return cleanup_service.progress
+
+
+@router.post("/retention/cleanup")
+async def run_cleanup():
+    """立即在后台执行一次数据清理，进度通过 GET 查询"""
+    if not cleanup_service:
+        raise HTTPException(status_code=503, detail="数据清理服务未启动")
+    if not cleanup_service.trigger():
+        raise HTTPException(status_code=409, detail="数据清理正在进行中")
+    return {"success": True}
@@ -0,0 +1,212 @@
+"""BMC 熔断器基准测试
+
+模拟一组主机（其中 --bad 台 BMC 无响应，每次调用都要等到超时），在共享的并发上限下
+用真实的 MonitorService / IPMIService 轮询 --duration 秒，比较：
+
+- baseline: 不熔断（固定 15 秒超时、读取失败重试 3 次，连续 10 次错误后暂停 5 分钟），
+  相当于引入熔断器之前
+- breaker: 默认熔断器（连续失败熔断、半开探测、按 p99 自适应超时、失败只重试一次）
+
+统计正常主机每小时完成的轮询次数、单次轮询耗时（含等待并发名额）的 p50/p99，
+以及无响应主机占用并发名额的总时长。传感器读取和风扇命令都是模拟的（asyncio.sleep），
+事件循环使用虚拟时钟，1 小时的模拟在几秒内完成。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_circuit_breaker
+    python -m benchmarks.bench_circuit_breaker --hosts 100 --bad 10 --concurrency 8 --duration 7200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+
+# 必须在导入 database 之前设置，避免写入真实数据目录
+os.environ.setdefault("DFC_DATA_DIR", tempfile.mkdtemp(prefix="dfc-bench-"))
+
+import logging
+
+from database import init_db
+from services.circuit_breaker import CircuitBreaker
+from services.fan_controller import CompiledCurve
+from services.ipmi_service import IPMIService
+from services.ipmi_transport import IPMICommandError, IPMITransport
+from services.monitor_service import HostContext, MonitorService
+from services.sensor_backend import HardwareStatus, SensorBackend
+
+# 引入熔断器之前的固定超时、读取尝试次数，以及连续错误多少次后暂停多久
+LEGACY_TIMEOUT = 15.0
+LEGACY_ATTEMPTS = 3
+LEGACY_PAUSE_AFTER = 10
+LEGACY_PAUSE = 300.0
+
+
+class VirtualClock:
+    """事件循环的虚拟时钟：没有就绪事件时直接把时间拨到下一个定时器，而不是真的等待"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def install(self, loop: asyncio.AbstractEventLoop) -> None:
+        loop.time = lambda: self.now
+        selector = loop._selector
+        real_select = selector.select
+
+        def select(timeout=None):
+            events = real_select(0)
+            if events or timeout is None:
+                # 等待的是其他线程（如写入线程）的唤醒，只能真的等待
+                return events or real_select(timeout)
+            self.now += timeout
+            return []
+
+        selector.select = select
+
+
+class SimulatedState:
+    def __init__(self, dead: bool, latency: float, stats: dict):
+        self.dead = dead
+        self.latency = latency
+        self.stats = stats
+
+    async def call(self, timeout: float, latency: float) -> None:
+        """一次 BMC 调用：正常时耗时 latency ± 20%，无响应时耗时 timeout 后失败"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            if self.dead:
+                self.stats["dead_calls"] += 1
+                await asyncio.sleep(timeout)
+                raise RuntimeError("命令超时")
+            await asyncio.sleep(latency * random.uniform(0.8, 1.2))
+        finally:
+            if self.dead:
+                self.stats["dead_seconds"] += loop.time() - started
+
+
+class SimulatedTransport(IPMITransport):
+    def __init__(self, state: SimulatedState):
+        super().__init__("sim", "root", "")
+        self.state = state
+
+    async def raw(self, netfn: int, cmd: int, data: bytes = b"") -> bytes:
+        await self.state.call(self.timeout, 0.1)
+        return b""
+
+
+class SimulatedSensorBackend(SensorBackend):
+    """按 run_command 的方式重试：每次尝试最多等待 timeout 秒，失败后退避 1/2 秒"""
+
+    def __init__(self, state: SimulatedState):
+        super().__init__("sim", "root", "", SimulatedTransport(state))
+        self.state = state
+
+    async def read(self, all_sensors: bool = True) -> HardwareStatus:
+        for attempt in range(self.max_retries):
+            try:
+                await self.state.call(self.timeout, self.state.latency)
+                return HardwareStatus(cpu_temp=random.uniform(45, 75), power=random.randint(150, 350))
+            except RuntimeError:
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(2 ** attempt)
+        raise RuntimeError("命令执行失败: racadm getsensorinfo")
+
+
+class NullWebSocketManager:
+    async def broadcast(self, message: dict):
+        pass
+
+
+def make_ipmi(state: SimulatedState, mode: str) -> IPMIService:
+    ipmi = IPMIService(ip="sim", username="root", password="", transport="subprocess")
+    ipmi.transport = SimulatedTransport(state)
+    ipmi.sensors = SimulatedSensorBackend(state)
+    clock = asyncio.get_running_loop().time
+    if mode == "baseline":
+        ipmi.breaker = CircuitBreaker("sim", failure_threshold=10 ** 9, error_rate=2.0,
+                                      max_timeout=LEGACY_TIMEOUT, min_timeout=LEGACY_TIMEOUT, clock=clock)
+        ipmi.sensors.max_retries = LEGACY_ATTEMPTS
+    else:
+        ipmi.breaker = CircuitBreaker("sim", ignored=(IPMICommandError, ValueError), clock=clock)
+        ipmi.sensors.max_retries = 2
+    return ipmi
+
+
+async def run_mode(mode: str, args) -> dict:
+    random.seed(args.seed)
+    VirtualClock().install(asyncio.get_running_loop())
+    loop = asyncio.get_running_loop()
+
+    service = MonitorService(NullWebSocketManager())
+    service.interval = args.interval
+    service._poll_limiter.resize(args.concurrency)
+    service._fan_curve_cache = CompiledCurve([(50, 15), (60, 15), (70, 20), (80, 40)])
+
+    stats = {"dead_calls": 0, "dead_seconds": 0.0}
+    for host_id in range(1, args.hosts + 1):
+        state = SimulatedState(host_id <= args.bad, args.latency, stats)
+        service.hosts[host_id] = HostContext(host_id=host_id, name=f"sim-{host_id}", ipmi=make_ipmi(state, mode))
+
+    durations = {host_id: [] for host_id in service.hosts}
+    poll_host = service.poll_host
+
+    async def timed_poll(ctx: HostContext) -> float:
+        started = loop.time()
+        delay = await poll_host(ctx)
+        durations[ctx.host_id].append(loop.time() - started)
+        if mode == "baseline" and ctx.consecutive_errors >= LEGACY_PAUSE_AFTER:
+            ctx.consecutive_errors = 0
+            return LEGACY_PAUSE
+        return delay
+
+    service.poll_host = timed_poll
+    service.running = True
+    service.history_writer.start()
+    tasks = [asyncio.create_task(service._run_host(ctx)) for ctx in service.hosts.values()]
+    await asyncio.sleep(args.duration)
+    service.running = False
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await service.history_writer.stop()
+
+    healthy = [d for host_id, polls in durations.items() if host_id > args.bad for d in polls]
+    healthy.sort()
+    healthy_hosts = max(1, args.hosts - args.bad)
+    return {
+        "polls_per_hour": len(healthy) / healthy_hosts / args.duration * 3600,
+        "p50": statistics.median(healthy) if healthy else 0.0,
+        "p99": healthy[int(len(healthy) * 0.99) - 1] if len(healthy) > 1 else 0.0,
+        "dead_calls": stats["dead_calls"],
+        "dead_seconds": stats["dead_seconds"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--bad", type=int, default=5, help="无响应的 BMC 数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发轮询上限")
+    parser.add_argument("--latency", type=float, default=3.0, help="正常 BMC 一次传感器读取的耗时（秒）")
+    parser.add_argument("--interval", type=int, default=30, help="轮询间隔（秒）")
+    parser.add_argument("--duration", type=float, default=3600, help="模拟时长（秒）")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    init_db()
+
+    ideal = 3600 / (args.interval + args.latency)
+    print(f"{args.hosts} 台主机（{args.bad} 台无响应），并发上限 {args.concurrency}，读取耗时 {args.latency}s，"
+          f"间隔 {args.interval}s，模拟 {args.duration:g}s；正常主机理想轮询 {ideal:.0f} 次/小时")
+    print(f"{'方式':<10} {'正常主机轮询/小时':>16} {'轮询 p50(s)':>11} {'轮询 p99(s)':>11} "
+          f"{'无响应 BMC 调用':>14} {'占用名额(s)':>11}")
+    for mode in ("baseline", "breaker"):
+        result = asyncio.run(run_mode(mode, args))
+        print(f"{mode:<10} {result['polls_per_hour']:>16.1f} {result['p50']:>11.2f} {result['p99']:>11.2f} "
+              f"{result['dead_calls']:>14} {result['dead_seconds']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
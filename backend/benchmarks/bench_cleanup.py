@@ -0,0 +1,130 @@
+"""数据清理对写入延迟影响的基准测试
+
+预置 N 行已过期的 monitor_history（默认 100 万行），然后在清理期间运行一个
+模拟 HistoryWriter 的写线程（每 100ms 写入一批 50 条），对比：
+
+- single: 旧实现，一个事务内 DELETE ... WHERE recorded_at < cutoff
+- chunked: DataCleanupService 按主键范围分块删除，块间让出写锁
+
+输出清理耗时，以及清理期间写批次延迟的 p50 / p99 / 最大值。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_cleanup
+    python -m benchmarks.bench_cleanup --rows 5000000 --chunk-size 10000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+# 必须在导入 database 之前设置，避免写入真实数据目录
+os.environ.setdefault("DFC_DATA_DIR", tempfile.mkdtemp(prefix="dfc-bench-"))
+
+import logging
+
+from database import DATABASE_URL, MonitorHistory, engine, init_db
+from services.cleanup_service import DataCleanupService
+
+RETENTION_DAYS = 7
+
+
+def fill_expired(rows: int) -> None:
+    """用 sqlite3 直接批量写入早于保留期的数据"""
+    path = DATABASE_URL.replace("sqlite:///", "")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    start = datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS + 1, seconds=rows)
+    chunk = 100_000
+    for base in range(0, rows, chunk):
+        conn.executemany(
+            "INSERT INTO monitor_history (host_id, cpu_temp, fan_speed, power_consumption, recorded_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (1 + i % 10, 40 + i % 30, 15 + i % 25, 150 + i % 200,
+                 (start + timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S.%f"))
+                for i in range(base, min(base + chunk, rows))
+            )
+        )
+        conn.commit()
+    conn.close()
+
+
+def purge_single() -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)
+    with engine.begin() as conn:
+        result = conn.execute(MonitorHistory.__table__.delete().where(MonitorHistory.recorded_at < cutoff))
+    return result.rowcount
+
+
+def run(mode: str, args) -> dict:
+    with engine.begin() as conn:
+        conn.execute(MonitorHistory.__table__.delete())
+    fill_expired(args.rows)
+
+    insert = MonitorHistory.__table__.insert()
+    stop = threading.Event()
+    latencies = []
+
+    def write_loop():
+        while not stop.is_set():
+            now = datetime.now(timezone.utc)
+            batch = [
+                {"host_id": 1, "cpu_temp": 55.0, "fan_speed": 20, "power_consumption": 200, "recorded_at": now}
+                for _ in range(50)
+            ]
+            started = time.perf_counter()
+            with engine.begin() as conn:
+                conn.execute(insert, batch)
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.1)
+
+    writer = threading.Thread(target=write_loop)
+    writer.start()
+    started = time.perf_counter()
+    if mode == "single":
+        deleted = purge_single()
+    else:
+        service = DataCleanupService(
+            retention_days=RETENTION_DAYS, chunk_size=args.chunk_size,
+            chunk_pause=args.chunk_pause, incremental_vacuum=False,
+        )
+        deleted = asyncio.run(service.cleanup())
+    elapsed = time.perf_counter() - started
+    stop.set()
+    writer.join()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "deleted": deleted,
+        "elapsed": elapsed,
+        "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "p99": latencies[max(0, int(len(latencies) * 0.99) - 1)] if latencies else 0.0,
+        "max": latencies[-1] if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="预置的过期数据行数")
+    parser.add_argument("--chunk-size", type=int, default=DataCleanupService.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--chunk-pause", type=float, default=DataCleanupService.DEFAULT_CHUNK_PAUSE)
+    parser.add_argument("--modes", nargs="+", default=["single", "chunked"], choices=["single", "chunked"])
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    init_db()
+
+    print(f"{'方式':<8} {'删除行数':>10} {'清理耗时(s)':>12} {'写入p50(ms)':>12} {'写入p99(ms)':>12} {'写入最大(ms)':>12}")
+    for mode in args.modes:
+        r = run(mode, args)
+        print(f"{r['mode']:<8} {r['deleted']:>10} {r['elapsed']:>12.2f} {r['p50'] * 1000:>12.1f} "
+              f"{r['p99'] * 1000:>12.1f} {r['max'] * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
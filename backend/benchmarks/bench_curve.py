@@ -0,0 +1,92 @@
+"""风扇曲线查表基准测试
+
+对同一批温度比较几种计算方式的耗时，并校验结果与原实现逐点一致：
+
+- legacy: 原实现，每次调用先 sorted() 再逐段扫描
+- compiled: CompiledCurve.speed，曲线预先排序，二分定位分段
+- batch: CompiledCurve.evaluate，安装了 numpy 时向量化计算，否则逐点计算
+
+默认 259200 个温度，相当于 30 秒间隔下一台主机 90 天的采样。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_curve
+    python -m benchmarks.bench_curve --samples 1000000 --points 12
+"""
+import argparse
+import random
+import time
+
+from services.fan_controller import CompiledCurve, np
+
+
+def legacy_fan_speed(temp, curve):
+    """原 MonitorService.calculate_fan_speed"""
+    if not curve:
+        return 20
+
+    curve = sorted(curve, key=lambda x: x[0])
+
+    if temp <= curve[0][0]:
+        return curve[0][1]
+    if temp >= curve[-1][0]:
+        return curve[-1][1]
+
+    for i in range(len(curve) - 1):
+        t0, s0 = curve[i]
+        t1, s1 = curve[i + 1]
+        if t0 <= temp < t1:
+            return int(s0 + (temp - t0) * (s1 - s0) / (t1 - t0))
+
+    return curve[-1][1]
+
+
+def make_curve(points: int, rng: random.Random):
+    """points 个拐点，温度 30~90°C，转速单调不减；打乱顺序并带一个重复温度"""
+    temps = sorted(rng.sample(range(30, 91), points - 1))
+    temps.insert(rng.randrange(1, len(temps)), temps[0])
+    temps.sort()
+    speeds = sorted(rng.randint(10, 100) for _ in temps)
+    curve = list(zip(temps, speeds))
+    rng.shuffle(curve)
+    return curve
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=259200)
+    parser.add_argument("--points", type=int, default=4, help="曲线拐点数（至少 3）")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    curve = make_curve(max(3, args.points), rng)
+    # 温度为 0.1°C 精度的读数，覆盖曲线两端以外和恰好落在拐点上的情况
+    temps = [round(rng.uniform(20, 100), 1) for _ in range(args.samples)]
+    temps[:len(curve)] = [float(t) for t, _ in curve]
+
+    compiled, compile_time = timed(lambda: CompiledCurve(curve))
+    expected, legacy = timed(lambda: [legacy_fan_speed(t, curve) for t in temps])
+    single, single_time = timed(lambda: [compiled.speed(t) for t in temps])
+    batch, batch_time = timed(lambda: compiled.evaluate(temps))
+    batch = list(batch.tolist() if np is not None else batch)
+
+    print(f"{args.samples} 个温度，曲线 {len(curve)} 个拐点，numpy: {'是' if np is not None else '否（batch 为逐点计算）'}")
+    print(f"编译曲线 {compile_time * 1e6:.1f} us")
+    print(f"{'方式':<10} {'总耗时(ms)':>11} {'每点(ns)':>9} {'加速':>7} {'结果一致':>8}")
+    for name, result, elapsed in (
+        ("legacy", expected, legacy),
+        ("compiled", single, single_time),
+        ("batch", batch, batch_time),
+    ):
+        print(f"{name:<10} {elapsed * 1000:>11.1f} {elapsed / args.samples * 1e9:>9.0f} "
+              f"{legacy / elapsed:>6.1f}x {'是' if result == expected else '否':>8}")
+
+
+if __name__ == "__main__":
+    main()
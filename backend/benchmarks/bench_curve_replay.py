@@ -0,0 +1,92 @@
+"""曲线回放基准测试
+
+在临时数据库中生成 --days 天、每 --interval 秒一个采样的历史数据（温度随机游走），
+然后用 replay_curve 回放一条候选曲线，统计耗时、峰值内存（tracemalloc）和输出的命令数。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_curve_replay
+    python -m benchmarks.bench_curve_replay --days 365 --interval 30 --chunk-rows 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+# 必须在导入 database 之前设置，避免写入真实数据目录
+os.environ["DFC_DATA_DIR"] = tempfile.mkdtemp(prefix="dfc-bench-")
+
+import logging
+
+from database import MonitorHistory, engine, init_db, utcnow
+from services.curve_replay import replay_curve
+from services.fan_controller import CompiledCurve, np
+
+CANDIDATE_CURVE = [(45, 15), (55, 20), (65, 30), (75, 50), (85, 100)]
+INSERT_BATCH = 50000
+
+
+def populate(days: float, interval: int, seed: int):
+    """写入 [since, until) 内的采样，返回 (采样数, since, until)"""
+    rng = random.Random(seed)
+    until = utcnow()
+    since = t = until - timedelta(days=days)
+    step = timedelta(seconds=interval)
+    temp, count, batch = 55.0, 0, []
+    table = MonitorHistory.__table__
+    with engine.begin() as conn:
+        while t < until:
+            temp = min(90.0, max(35.0, temp + rng.gauss(0, 0.6)))
+            batch.append({"host_id": 1, "cpu_temp": round(temp, 1), "fan_speed": 20,
+                          "power_consumption": 200, "recorded_at": t})
+            t += step
+            if len(batch) == INSERT_BATCH:
+                conn.execute(table.insert(), batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            conn.execute(table.insert(), batch)
+            count += len(batch)
+    return count, since, until
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=365)
+    parser.add_argument("--interval", type=int, default=30)
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    parser.add_argument("--deadband", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    init_db()
+    started = time.perf_counter()
+    rows, since, until = populate(args.days, args.interval, args.seed)
+    print(f"生成 {rows} 个采样（{args.days:g} 天，{args.interval} 秒间隔）用时 {time.perf_counter() - started:.1f} 秒，"
+          f"numpy: {'是' if np is not None else '否'}")
+
+    # 回放与写入相同的窗口；若在写入后重新取当前时间，窗口起点会越过第一个采样
+    tracemalloc.start()
+    started = time.perf_counter()
+    commands = 0
+    summary = None
+    for item in replay_curve(CompiledCurve(CANDIDATE_CURVE), since, until, 1, args.deadband, args.chunk_rows):
+        if item["type"] == "commands":
+            commands += len(item["data"])
+        else:
+            summary = item
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"回放 {summary['samples']} 个采样：{elapsed:.2f} 秒（{summary['samples'] / elapsed / 1e6:.2f} M 采样/秒），"
+          f"峰值内存 {peak / 1024 / 1024:.1f} MB，块大小 {args.chunk_rows}")
+    print(f"下发命令 {commands} 条，转速变化 {summary['changes']} 次，平均转速 {summary['mean_speed']}%，"
+          f"死区 {args.deadband}%")
+
+
+if __name__ == "__main__":
+    main()
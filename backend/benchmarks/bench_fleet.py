@@ -0,0 +1,119 @@
+"""多主机控制循环延迟基准测试
+
+使用模拟的 iDRAC（固定延迟 + 抖动，部分主机故意很慢）测量一轮并发轮询的
+耗时，以及单台主机从发起到完成的延迟分布，观察主机数从 1 增长到 200 时的变化。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_fleet
+    python -m benchmarks.bench_fleet --hosts 1 10 50 200 --latency 0.2 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+# 必须在导入 database 之前设置，避免写入真实数据目录
+os.environ.setdefault("DFC_DATA_DIR", tempfile.mkdtemp(prefix="dfc-bench-"))
+
+import logging
+
+from database import init_db
+from services.ipmi_service import IPMIService, HardwareStatus
+from services.fan_controller import CompiledCurve
+from services.monitor_service import MonitorService, HostContext
+
+
+class SimulatedIPMIService(IPMIService):
+    """模拟 iDRAC：每次调用耗时 latency ± 20%，慢主机耗时 slow_latency"""
+
+    def __init__(self, ip: str, latency: float, slow: bool = False, slow_latency: float = 5.0):
+        super().__init__(ip=ip, username="root", password="")
+        self.latency = slow_latency if slow else latency
+
+    async def _delay(self):
+        await asyncio.sleep(self.latency * random.uniform(0.8, 1.2))
+
+    async def get_hardware_status(self, all_sensors: bool = True) -> HardwareStatus:
+        await self._delay()
+        return HardwareStatus(cpu_temp=random.uniform(45, 75), power=random.randint(150, 350))
+
+    async def set_fan_speed(self, percentage: int) -> bool:
+        await self._delay()
+        return True
+
+    async def enable_manual_control(self) -> bool:
+        return True
+
+    async def disable_manual_control(self) -> bool:
+        return True
+
+
+class NullWebSocketManager:
+    async def broadcast(self, message: dict):
+        pass
+
+
+async def run_round(host_count: int, args) -> dict:
+    service = MonitorService(NullWebSocketManager())
+    service._poll_limiter.resize(args.concurrency)
+    service._fan_curve_cache = CompiledCurve([(50, 15), (60, 15), (70, 20), (80, 40)])
+
+    slow_count = int(host_count * args.slow_ratio)
+    for host_id in range(1, host_count + 1):
+        service.hosts[host_id] = HostContext(
+            host_id=host_id,
+            name=f"sim-{host_id}",
+            ipmi=SimulatedIPMIService(
+                ip=f"10.0.{host_id // 256}.{host_id % 256}",
+                latency=args.latency,
+                slow=host_id <= slow_count,
+                slow_latency=args.slow_latency,
+            )
+        )
+
+    service.history_writer.start()
+    latencies = []
+
+    async def timed_poll(ctx: HostContext):
+        started = time.perf_counter()
+        await service.poll_host(ctx)
+        latencies.append((ctx.host_id <= slow_count, time.perf_counter() - started))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed_poll(ctx) for ctx in service.hosts.values()))
+    wall = time.perf_counter() - started
+    await service.history_writer.stop()
+
+    fast = sorted(lat for slow, lat in latencies if not slow)
+    return {
+        "hosts": host_count,
+        "wall": wall,
+        "p50": statistics.median(fast) if fast else 0.0,
+        "p99": fast[int(len(fast) * 0.99) - 1] if len(fast) > 1 else (fast[0] if fast else 0.0),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--latency", type=float, default=0.2, help="单次 IPMI 调用的模拟延迟（秒）")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发轮询上限")
+    parser.add_argument("--slow-ratio", type=float, default=0.02, help="慢主机比例")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="慢主机单次调用延迟（秒）")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    init_db()
+
+    print(f"模拟延迟 {args.latency}s/调用，并发上限 {args.concurrency}，慢主机比例 {args.slow_ratio:.0%}")
+    print(f"{'主机数':>6} {'整轮耗时(s)':>12} {'正常主机 p50(s)':>16} {'正常主机 p99(s)':>16}")
+    for count in args.hosts:
+        result = await run_round(count, args)
+        print(f"{result['hosts']:>6} {result['wall']:>12.3f} {result['p50']:>16.3f} {result['p99']:>16.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
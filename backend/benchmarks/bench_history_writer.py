@@ -0,0 +1,97 @@
+"""历史数据写入吞吐基准测试
+
+对比两种写入方式：
+- sync: 每个采样在事件循环线程上 SessionLocal().add() + commit()（旧实现）
+- writer: HistoryWriter 缓冲后由写入线程批量 executemany
+
+同时运行一个 10ms 的心跳任务，统计事件循环的最大卡顿时间。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_history_writer
+    python -m benchmarks.bench_history_writer --samples 50000 --hosts 200
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# 必须在导入 database 之前设置，避免写入真实数据目录
+os.environ.setdefault("DFC_DATA_DIR", tempfile.mkdtemp(prefix="dfc-bench-"))
+
+import logging
+
+from database import init_db, SessionLocal, MonitorHistory
+from services.history_writer import HistoryWriter
+
+
+async def heartbeat(stop: asyncio.Event, stalls: list):
+    """记录事件循环最大延迟"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        stalls.append(time.perf_counter() - started - 0.01)
+
+
+async def produce_sync(host_id: int, count: int):
+    for i in range(count):
+        db = SessionLocal()
+        try:
+            db.add(MonitorHistory(host_id=host_id, cpu_temp=50.0 + i % 20, fan_speed=20, power_consumption=200))
+            db.commit()
+        finally:
+            db.close()
+        await asyncio.sleep(0)
+
+
+async def produce_writer(writer: HistoryWriter, host_id: int, count: int):
+    for i in range(count):
+        await writer.submit(host_id, 50.0 + i % 20, 20, 200)
+        await asyncio.sleep(0)
+
+
+async def run(mode: str, args) -> dict:
+    per_host = args.samples // args.hosts
+    stop = asyncio.Event()
+    stalls: list = []
+    beat = asyncio.create_task(heartbeat(stop, stalls))
+
+    started = time.perf_counter()
+    if mode == "sync":
+        await asyncio.gather(*(produce_sync(h, per_host) for h in range(args.hosts)))
+    else:
+        writer = HistoryWriter(batch_size=args.batch_size)
+        writer.start()
+        await asyncio.gather(*(produce_writer(writer, h, per_host) for h in range(args.hosts)))
+        await writer.stop()
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await beat
+    return {
+        "mode": mode,
+        "samples": per_host * args.hosts,
+        "rate": per_host * args.hosts / elapsed,
+        "max_stall": max(stalls) if stalls else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=5000, help="总采样数")
+    parser.add_argument("--hosts", type=int, default=50, help="并发生产者（模拟主机）数")
+    parser.add_argument("--batch-size", type=int, default=HistoryWriter.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--modes", nargs="+", default=["sync", "writer"], choices=["sync", "writer"])
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    init_db()
+
+    print(f"{'方式':<8} {'采样数':>8} {'吞吐(条/秒)':>14} {'事件循环最大卡顿(ms)':>22}")
+    for mode in args.modes:
+        result = await run(mode, args)
+        print(f"{result['mode']:<8} {result['samples']:>8} {result['rate']:>14.0f} {result['max_stall'] * 1000:>22.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
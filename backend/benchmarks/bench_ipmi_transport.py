@@ -0,0 +1,77 @@
+"""IPMI 传输层单条命令延迟基准测试
+
+启动本地模拟 BMC（benchmarks.fake_bmc），分别用单次进程模式（subprocess）
+和常驻 ipmitool shell 会话模式（shell）发送 Dell 风扇转速命令，比较单条命令延迟。
+需要本机安装 ipmitool。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_ipmi_transport
+    python -m benchmarks.bench_ipmi_transport --commands 200 --bmc-delay 0.005
+"""
+import argparse
+import asyncio
+import shutil
+import statistics
+import time
+
+from benchmarks.fake_bmc import start_fake_bmc
+from services.ipmi_transport import TRANSPORTS, create_transport
+
+
+async def bench_transport(kind: str, port: int, args) -> dict:
+    transport = create_transport(
+        kind, "127.0.0.1", args.username, args.password,
+        port=port, cipher_suite=args.cipher_suite
+    )
+    latencies = []
+    try:
+        # 预热：shell 模式在这里建立会话
+        await transport.raw(0x30, 0x30, bytes([0x01, 0x00]))
+        for i in range(args.commands):
+            started = time.perf_counter()
+            await transport.raw(0x30, 0x30, bytes([0x02, 0xff, 10 + i % 50]))
+            latencies.append(time.perf_counter() - started)
+    finally:
+        await transport.close()
+
+    latencies.sort()
+    return {
+        "transport": kind,
+        "mean": statistics.fmean(latencies),
+        "p50": statistics.median(latencies),
+        "p99": latencies[max(0, int(len(latencies) * 0.99) - 1)],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=100, help="每种传输方式发送的命令数")
+    parser.add_argument("--cipher-suite", type=int, default=2, choices=[0, 1, 2])
+    parser.add_argument("--bmc-delay", type=float, default=0.0, help="模拟 BMC 的处理延迟（秒）")
+    parser.add_argument("--username", default="root")
+    parser.add_argument("--password", default="calvin")
+    args = parser.parse_args()
+
+    if not shutil.which("ipmitool"):
+        print("未找到 ipmitool，无法运行传输层基准测试")
+        return
+
+    udp, bmc = await start_fake_bmc(username=args.username, password=args.password, delay=args.bmc_delay)
+    port = udp.get_extra_info("sockname")[1]
+    try:
+        print(f"模拟 BMC 127.0.0.1:{port}，加密套件 {args.cipher_suite}，每种方式 {args.commands} 条命令")
+        print(f"{'传输方式':<12} {'平均(ms)':>10} {'p50(ms)':>10} {'p99(ms)':>10}")
+        for kind in TRANSPORTS:
+            sessions_before = bmc.state.sessions_opened
+            result = await bench_transport(kind, port, args)
+            print(
+                f"{result['transport']:<12} {result['mean'] * 1000:>10.2f} "
+                f"{result['p50'] * 1000:>10.2f} {result['p99'] * 1000:>10.2f}"
+                f"   (建立会话 {bmc.state.sessions_opened - sessions_before} 次)"
+            )
+    finally:
+        udp.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
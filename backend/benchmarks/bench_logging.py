@@ -0,0 +1,113 @@
+"""日志调用对事件循环的阻塞时间基准测试
+
+在事件循环中以监控循环的节奏连续调用 logger.info，统计每次调用的耗时：
+
+- direct: 旧配置，RotatingFileHandler + StreamHandler 直接挂在根日志器上，
+  文件写入和轮转改名都发生在调用线程（即事件循环）中
+- queued: BoundedQueueHandler 入队，由 QueueListener 线程写文件和控制台
+
+默认使用较小的 --max-bytes 让测试期间多次轮转。控制台输出写到 /dev/null。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_logging
+    python -m benchmarks.bench_logging --calls 50000 --max-bytes 1048576 --fsync
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import QueueListener
+from pathlib import Path
+
+from logging_config import BoundedQueueHandler, create_output_handlers
+
+
+class FsyncFileHandlerMixin:
+    """模拟慢磁盘：每条记录写入后 fsync"""
+
+    def emit(self, record):
+        super().emit(record)
+        self.stream.flush()
+        os.fsync(self.stream.fileno())
+
+
+def build(mode: str, log_dir: Path, args):
+    devnull = open(os.devnull, "w")
+    handlers = create_output_handlers(log_dir / "bench.log", max_bytes=args.max_bytes, stream=devnull)
+    if args.fsync:
+        file_handler = handlers[0]
+        file_handler.__class__ = type("FsyncRotatingFileHandler", (FsyncFileHandlerMixin, type(file_handler)), {})
+    logger = logging.getLogger(f"bench.{mode}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers.clear()
+    listener = None
+    if mode == "direct":
+        for handler in handlers:
+            logger.addHandler(handler)
+    else:
+        queue_handler = BoundedQueueHandler(maxsize=args.queue_size, overflow=args.overflow)
+        logger.addHandler(queue_handler)
+        listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        listener.start()
+    return logger, listener, handlers, devnull
+
+
+async def run(mode: str, args) -> dict:
+    log_dir = Path(tempfile.mkdtemp(prefix="dfc-bench-log-"))
+    logger, listener, handlers, devnull = build(mode, log_dir, args)
+    durations = []
+    for i in range(args.calls):
+        started = time.perf_counter()
+        logger.info(f"[host{i % 50}] 状态监测 - CPU: {40 + i % 30:.1f}°C | 风扇: {20 + i % 40}% | 功耗: {150 + i % 100}W")
+        durations.append(time.perf_counter() - started)
+        if i % args.yield_every == 0:
+            await asyncio.sleep(0)
+    drain_started = time.perf_counter()
+    if listener:
+        listener.stop()
+    drain = time.perf_counter() - drain_started
+    dropped = 0
+    for handler in logger.handlers:
+        dropped = getattr(handler, "dropped", 0)
+    for handler in handlers:
+        handler.close()
+    devnull.close()
+    durations.sort()
+    n = len(durations)
+    return {
+        "mode": mode,
+        "p50": durations[n // 2],
+        "p99": durations[min(n - 1, int(n * 0.99))],
+        "max": durations[-1],
+        "total": sum(durations),
+        "drain": drain,
+        "dropped": dropped,
+        "files": len(list(log_dir.iterdir())),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--max-bytes", type=int, default=512 * 1024, help="日志轮转大小")
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--overflow", default="block", choices=BoundedQueueHandler.OVERFLOW_POLICIES)
+    parser.add_argument("--yield-every", type=int, default=50, help="每多少次调用让出一次事件循环")
+    parser.add_argument("--fsync", action="store_true", help="每条记录 fsync，模拟慢磁盘")
+    args = parser.parse_args()
+
+    print(f"{args.calls} 次 logger.info，轮转大小 {args.max_bytes // 1024} KB，溢出策略 {args.overflow}"
+          f"{'，每条 fsync' if args.fsync else ''}")
+    print(f"{'方式':<8} {'p50(us)':>9} {'p99(us)':>9} {'最大(ms)':>9} {'合计阻塞(ms)':>13} "
+          f"{'排空(ms)':>9} {'丢弃':>6} {'文件数':>6}")
+    for mode in ("direct", "queued"):
+        r = await run(mode, args)
+        print(f"{r['mode']:<8} {r['p50'] * 1e6:>9.1f} {r['p99'] * 1e6:>9.1f} {r['max'] * 1000:>9.2f} "
+              f"{r['total'] * 1000:>13.1f} {r['drain'] * 1000:>9.1f} {r['dropped']:>6} {r['files']:>6}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""内存采样缓冲的内存占用和查询延迟基准测试
+
+按 30 秒间隔为 1 台和 100 台主机填满 6 小时的采样，用 tracemalloc 统计：
+
+- buffer: SampleBuffer 列式环形缓冲（services/sample_buffer.py）
+- dicts: 每个采样一个 dict（datetime + 三个数值）的列表，作为对照
+
+并对比从缓冲与从 SQLite（1h 查原始数据，6h 查 1 分钟预聚合）计算历史曲线的耗时。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_sample_buffer
+    python -m benchmarks.bench_sample_buffer --hosts 1 100 --interval 10
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+# 必须在导入 database 之前设置，避免写入真实数据目录
+os.environ.setdefault("DFC_DATA_DIR", tempfile.mkdtemp(prefix="dfc-bench-"))
+
+import logging
+
+from database import init_db, engine, MonitorHistory, SessionLocal, utcnow
+from services.history_query import query_history, resolve_range
+from services.history_rollup import apply_rollups
+from services.sample_buffer import SampleBuffer, DEFAULT_WINDOW
+
+
+def make_samples(hosts: int, interval: int):
+    now = utcnow()
+    count = int(DEFAULT_WINDOW.total_seconds() // interval)
+    return now, [
+        (host_id, now - timedelta(seconds=interval * i), round(random.uniform(40, 75), 1),
+         random.randint(10, 60), random.randint(120, 350))
+        for host_id in range(1, hosts + 1)
+        for i in range(count, 0, -1)
+    ]
+
+
+def measure_buffer(samples, interval: int):
+    tracemalloc.start()
+    buffer = SampleBuffer(interval=interval)
+    for host_id, recorded_at, cpu, fan, power in samples:
+        buffer.append(host_id, recorded_at, cpu, fan, power)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return buffer, size
+
+
+def measure_dicts(samples):
+    tracemalloc.start()
+    # 复制 datetime，避免与输入共享对象导致少算
+    rows = [
+        {"recorded_at": recorded_at + timedelta(0), "cpu_temp": cpu + 0.0, "fan_speed": fan, "power": power}
+        for _, recorded_at, cpu, fan, power in samples
+    ]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return size
+
+
+def time_queries(buffer: SampleBuffer, now, repeat: int = 20):
+    results = {}
+    db = SessionLocal()
+    try:
+        for key in ("1h", "6h"):
+            delta, points = resolve_range(key)
+            until = now + timedelta(seconds=1)
+            since = until - delta
+            started = time.perf_counter()
+            for _ in range(repeat):
+                assert buffer.query(1, since, until, points) is not None
+            buffer_ms = (time.perf_counter() - started) / repeat * 1000
+            started = time.perf_counter()
+            for _ in range(repeat):
+                query_history(db, since, until, points, 1)
+            db_ms = (time.perf_counter() - started) / repeat * 1000
+            results[key] = (buffer_ms, db_ms)
+    finally:
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, nargs="+", default=[1, 100])
+    parser.add_argument("--interval", type=int, default=30, help="采样间隔（秒）")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    init_db()
+
+    print(f"窗口 {DEFAULT_WINDOW}，采样间隔 {args.interval}秒")
+    print(f"{'主机数':>6} {'采样数':>8} {'缓冲(KB)':>10} {'字节/采样':>10} {'dict(KB)':>10} {'字节/采样':>10}")
+    for hosts in args.hosts:
+        now, samples = make_samples(hosts, args.interval)
+        buffer, buffer_bytes = measure_buffer(samples, args.interval)
+        dict_bytes = measure_dicts(samples)
+        n = len(samples)
+        print(f"{hosts:>6} {n:>8} {buffer_bytes / 1024:>10.1f} {buffer_bytes / n:>10.1f} "
+              f"{dict_bytes / 1024:>10.1f} {dict_bytes / n:>10.1f}")
+
+    # 查询延迟：用最后一组数据写入数据库（含预聚合，与 HistoryWriter 一致）后对比
+    rows = [
+        {"host_id": h, "recorded_at": t, "cpu_temp": c, "fan_speed": f, "power_consumption": p}
+        for h, t, c, f, p in samples
+    ]
+    with engine.begin() as conn:
+        conn.execute(MonitorHistory.__table__.insert(), rows)
+        apply_rollups(conn, rows)
+    print(f"\n{'范围':<6} {'缓冲(ms)':>10} {'SQLite(ms)':>12}")
+    for key, (buffer_ms, db_ms) in time_queries(buffer, now).items():
+        print(f"{key:<6} {buffer_ms:>10.2f} {db_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""racadm getsensorinfo 解析基准测试
+
+解析吞吐量：对 fixtures/getsensorinfo/ 下的各代 iDRAC 输出（以及一份按 --copies 放大的
+合成输出，模拟传感器很多的大型机箱）比较：
+
+- legacy: 原实现，整段输出上用两个正则只取 CPU 温度和整机功耗
+- full: parse_getsensorinfo，整段输出上一次 findall 取全部带数值读数的传感器
+  （开启 sensor_history 时的读取方式）
+- lines: SensorInfoParser 逐行解析全部传感器（对照，流式读取时的做法）
+- control: SensorInfoParser(all_sensors=False)，只解析控制需要的分组，读到功耗后提前结束
+  （关闭 sensor_history 时的读取方式）
+
+并校验各方式得到的 CPU 平均温度和功耗一致，full 与 lines 的读数完全相同。
+
+端到端延迟（--stream）：用一个逐行输出语料、每行间隔 --line-delay 秒的子进程模拟远程
+racadm，比较 run_command 等待全部输出后再整段解析，与 stream_command 边读边解析
+（lines / control，control 提前结束子进程）的耗时。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_sensor_parser
+    python -m benchmarks.bench_sensor_parser --cpus 4 --fans 16 --dimms 48 --copies 10
+    python -m benchmarks.bench_sensor_parser --stream --line-delay 0.002
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+from services.ipmi_transport import run_command, stream_command
+from services.sensor_backend import HardwareStatus, SensorInfoParser, parse_getsensorinfo, summarize_sensors
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "getsensorinfo"
+ROW = "{:<38}{:<16}{:<12}{:<10}{:<10}{}"
+
+# 模拟 racadm：逐行输出文件内容，每行之间等待 delay 秒
+EMITTER = """
+import sys, time
+delay = float(sys.argv[2])
+for line in open(sys.argv[1], newline=""):
+    sys.stdout.write(line)
+    sys.stdout.flush()
+    time.sleep(delay)
+"""
+
+
+def section(title: str, header: str, rows) -> str:
+    return "\n".join([f"Sensor Type : {title}", header, *rows, ""])
+
+
+def make_output(cpus: int, fans: int, dimms: int, rng: random.Random) -> str:
+    """生成一份 iDRAC 格式的 getsensorinfo 输出"""
+    parts = [
+        section("POWER", ROW.format("<Sensor Name>", "<Status>", "<Type>", "", "", "").rstrip(), [
+            ROW.format(f"PS{i} Status", "Present", "AC", "", "", "").rstrip() for i in (1, 2)
+        ]),
+        section("TEMPERATURE", ROW.format("<Sensor Name>", "<Status>", "<Reading>", "<lc>", "<uc>",
+                                          "<lnc>[R/W] <unc>[R/W]"), [
+            ROW.format("System Board Inlet Temp", "Ok", f"{rng.randint(18, 30)}C", "-7C", "47C", "3C [Y] 42C [Y]"),
+            ROW.format("System Board Exhaust Temp", "Ok", f"{rng.randint(30, 45)}C", "3C", "75C", "8C [N] 70C [N]"),
+            *(ROW.format(f"CPU{i} Temp", "Ok", f"{rng.randint(35, 80)}C", "3C", "98C", "8C [N] 93C [N]")
+              for i in range(1, cpus + 1)),
+        ]),
+        section("FAN", ROW.format("<Sensor Name>", "<Status>", "<Reading>", "<lc>", "<uc>", "<PWM %>"), [
+            ROW.format(f"System Board Fan{i}", "Ok", f"{rng.randrange(3000, 9000, 120)}RPM", "480RPM", "NA",
+                       f"{rng.randint(15, 60)}%")
+            for i in range(1, fans + 1)
+        ]),
+        section("VOLTAGE", ROW.format("<Sensor Name>", "<Status>", "<Reading>", "<lc>", "<uc>", ""), [
+            *(ROW.format(f"CPU{i} VCORE PG", "Ok", "Good", "NA", "NA", "") for i in range(1, cpus + 1)),
+            ROW.format("System Board 3.3V PG", "Ok", "Good", "NA", "NA", ""),
+            *(ROW.format(f"PS{i} Voltage 1", "Ok", f"{rng.randint(220, 240)}Volts", "NA", "NA", "") for i in (1, 2)),
+        ]),
+        section("CURRENT", ROW.format("<Sensor Name>", "<Status>", "<Reading>", "<lc>", "<uc>", ""), [
+            *(ROW.format(f"PS{i} Current 1", "Ok", f"{rng.uniform(0.4, 1.5):.1f}Amps", "NA", "NA", "") for i in (1, 2)),
+            ROW.format("System Board Pwr Consumption", "Ok", f"{rng.randint(120, 600)}Watts", "NA", "1904Watts", ""),
+        ]),
+        section("PROCESSOR", ROW.format("<Sensor Name>", "<Status>", "<State>", "<lc>", "<uc>", ""), [
+            ROW.format(f"CPU{i} Status", "Ok", "Presence Detected", "NA", "NA", "") for i in range(1, cpus + 1)
+        ]),
+        section("MEMORY", ROW.format("<Sensor Name>", "<Status>", "<State>", "", "", "").rstrip(), [
+            ROW.format(f"DIMM.Socket.{chr(65 + i // 12)}{i % 12 + 1}", "Ok", "Presence Detected", "", "", "").rstrip()
+            for i in range(dimms)
+        ]),
+        section("BATTERY", ROW.format("<Sensor Name>", "<Status>", "<Reading>", "", "", "").rstrip(), [
+            ROW.format("System Board CMOS Battery", "Ok", "Present", "", "", "").rstrip()
+        ]),
+    ]
+    return "\n".join(parts)
+
+
+def legacy_read(data: str) -> HardwareStatus:
+    """原 RacadmSensorBackend.read 的解析部分"""
+    cpu_temps = [int(m.group(1)) for m in re.finditer(r"CPU\d Temp\s+Ok\s+(\d+)C", data)]
+    if not cpu_temps:
+        raise ValueError("未找到有效的CPU温度数据")
+
+    power_match = re.search(r"System Board Pwr Consumption\s+Ok\s+(\d+)Watts", data)
+
+    return HardwareStatus(
+        cpu_temp=sum(cpu_temps) / len(cpu_temps),
+        power=int(power_match.group(1)) if power_match else 0
+    )
+
+
+def timed(fn, rounds: int):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return result, (time.perf_counter() - started) / rounds
+
+
+def load_corpus(args) -> dict:
+    corpus = {path.stem: path.read_bytes().decode() for path in sorted(FIXTURE_DIR.glob("*.txt"))}
+    synthetic = make_output(args.cpus, args.fans, args.dimms, random.Random(args.seed))
+    corpus[f"synthetic x{args.copies}"] = "\n".join([synthetic] * args.copies)
+    return corpus
+
+
+def bench_parse(corpus: dict, rounds: int) -> None:
+    print(f"{'语料':<14} {'大小':>8} {'方式':<8} {'每次(us)':>9} {'吞吐(MB/s)':>10} {'传感器':>6} {'读取行':>6} {'一致':>4}")
+    for name, data in corpus.items():
+        size = len(data.encode())
+        n = max(1, rounds * 4096 // size)
+        lines = data.count("\n") + 1
+
+        def parse(all_sensors: bool):
+            parser = SensorInfoParser(all_sensors)
+            for line in data.splitlines():
+                if parser.feed(line):
+                    break
+            return parser
+
+        legacy, legacy_time = timed(lambda: legacy_read(data), n)
+        full, full_time = timed(lambda: parse_getsensorinfo(data), n)
+        by_line, by_line_time = timed(lambda: parse(True), n)
+        control, control_time = timed(lambda: parse(False), n)
+        for label, elapsed, readings, read in (
+            ("legacy", legacy_time, None, lines),
+            ("full", full_time, full, lines),
+            ("lines", by_line_time, by_line.readings, by_line.lines),
+            ("control", control_time, control.readings, control.lines),
+        ):
+            status = legacy if readings is None else summarize_sensors(readings)
+            same = abs(status.cpu_temp - legacy.cpu_temp) < 1e-9 and status.power == legacy.power
+            if label == "full":
+                same = same and full == by_line.readings
+            sensors = "-" if readings is None else len(readings)
+            print(f"{name:<14} {size / 1024:>6.1f}KB {label:<8} {elapsed * 1e6:>9.1f} {size / elapsed / 1e6:>10.1f} "
+                  f"{sensors:>6} {read:>6} {'是' if same else '否':>4}")
+
+
+async def bench_stream(corpus: dict, line_delay: float, rounds: int) -> None:
+    print(f"\n模拟 racadm 子进程逐行输出，每行间隔 {line_delay * 1000:g} ms，每种方式 {rounds} 次取平均")
+    print(f"{'语料':<14} {'缓冲后解析(ms)':>14} {'流式 lines(ms)':>14} {'流式 control(ms)':>16}")
+    work = Path(os.environ.get("TMPDIR", "/tmp"))
+    for name, data in corpus.items():
+        if name.startswith("synthetic"):
+            continue
+        path = work / f"dfc-bench-{name}.txt"
+        path.write_text(data, newline="")
+        command = [sys.executable, "-c", EMITTER, str(path), str(line_delay)]
+
+        async def buffered():
+            return summarize_sensors(parse_getsensorinfo(await run_command(command, max_retries=1)))
+
+        async def streamed(all_sensors: bool):
+            return (await stream_command(command, lambda: SensorInfoParser(all_sensors), max_retries=1)).result()
+
+        results = []
+        for fn in (buffered, lambda: streamed(True), lambda: streamed(False)):
+            started = time.perf_counter()
+            for _ in range(rounds):
+                await fn()
+            results.append((time.perf_counter() - started) / rounds)
+        path.unlink()
+        print(f"{name:<14} {results[0] * 1000:>14.1f} {results[1] * 1000:>14.1f} {results[2] * 1000:>16.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cpus", type=int, default=4)
+    parser.add_argument("--fans", type=int, default=16)
+    parser.add_argument("--dimms", type=int, default=48)
+    parser.add_argument("--copies", type=int, default=10, help="合成输出重复拼接的份数")
+    parser.add_argument("--rounds", type=int, default=500, help="每 4KB 输出解析的轮数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stream", action="store_true", help="同时测量子进程流式读取的端到端延迟")
+    parser.add_argument("--line-delay", type=float, default=0.002)
+    parser.add_argument("--stream-rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args)
+    bench_parse(corpus, args.rounds)
+    if args.stream:
+        asyncio.run(bench_stream(corpus, args.line_delay, args.stream_rounds))
+
+
+if __name__ == "__main__":
+    main()
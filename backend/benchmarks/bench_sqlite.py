@@ -0,0 +1,137 @@
+"""SQLite 调优前后的并发读写吞吐基准测试
+
+先生成一个含 N 行 monitor_history 的数据库（默认 100 万行，``--rows 10000000``
+即 1000 万行），然后分别用 SQLite 默认配置（回滚日志、synchronous=FULL）和
+database.SQLITE_PRAGMAS（WAL 等）各复制一份，在同一时间段内运行：
+
+- 1 个写线程：模拟 HistoryWriter，每批 50 条 executemany + 提交
+- K 个读线程：模拟仪表盘，查询最近 24 小时的数据并聚合
+
+输出每种配置的写入条数/秒、写批次 p99 延迟和读查询次数/秒。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_sqlite
+    python -m benchmarks.bench_sqlite --rows 10000000 --duration 20 --readers 4
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+# 必须在导入 database 之前设置，避免写入真实数据目录
+os.environ.setdefault("DFC_DATA_DIR", tempfile.mkdtemp(prefix="dfc-bench-"))
+
+from sqlalchemy import text
+
+from database import Base, MonitorHistory, SQLITE_PRAGMAS, create_engines
+
+SAMPLE_INTERVAL = 30  # 生成数据的采样间隔（秒）
+
+
+def build_database(path: str, rows: int) -> None:
+    """用 sqlite3 直接批量生成历史数据（回滚日志模式）"""
+    writer, _ = create_engines(f"sqlite:///{path}", pragmas={})
+    Base.metadata.create_all(bind=writer)
+    writer.dispose()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    start = datetime.now(timezone.utc) - timedelta(seconds=rows * SAMPLE_INTERVAL)
+    chunk = 100_000
+    for base in range(0, rows, chunk):
+        conn.executemany(
+            "INSERT INTO monitor_history (host_id, cpu_temp, fan_speed, power_consumption, recorded_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (1, 40 + i % 30, 15 + i % 25, 150 + i % 200,
+                 (start + timedelta(seconds=i * SAMPLE_INTERVAL)).strftime("%Y-%m-%d %H:%M:%S.%f"))
+                for i in range(base, min(base + chunk, rows))
+            )
+        )
+        conn.commit()
+    conn.close()
+
+
+def run_profile(path: str, pragmas: dict, args) -> dict:
+    writer, reader = create_engines(f"sqlite:///{path}", pragmas=pragmas)
+    insert = MonitorHistory.__table__.insert()
+    stop = threading.Event()
+    write_latencies = []
+    reads = [0] * args.readers
+    written = [0]
+
+    def write_loop():
+        while not stop.is_set():
+            now = datetime.now(timezone.utc)
+            batch = [
+                {"host_id": 1, "cpu_temp": 55.0, "fan_speed": 20, "power_consumption": 200, "recorded_at": now}
+                for _ in range(50)
+            ]
+            started = time.perf_counter()
+            with writer.begin() as conn:
+                conn.execute(insert, batch)
+            write_latencies.append(time.perf_counter() - started)
+            written[0] += len(batch)
+
+    def read_loop(index: int):
+        query = text(
+            "SELECT count(*), avg(cpu_temp), max(fan_speed) FROM monitor_history "
+            "WHERE recorded_at >= :since"
+        )
+        while not stop.is_set():
+            since = (datetime.now(timezone.utc) - timedelta(hours=24)).strftime("%Y-%m-%d %H:%M:%S.%f")
+            with reader.connect() as conn:
+                conn.execute(query, {"since": since}).fetchall()
+            reads[index] += 1
+
+    threads = [threading.Thread(target=write_loop)]
+    threads += [threading.Thread(target=read_loop, args=(i,)) for i in range(args.readers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    writer.dispose()
+    reader.dispose()
+
+    write_latencies.sort()
+    return {
+        "write_rate": written[0] / args.duration,
+        "write_p99": write_latencies[max(0, int(len(write_latencies) * 0.99) - 1)] if write_latencies else 0.0,
+        "read_rate": sum(reads) / args.duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="预置的 monitor_history 行数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每种配置的测试时长（秒）")
+    parser.add_argument("--readers", type=int, default=4, help="并发读线程数")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="dfc-sqlite-")
+    base = os.path.join(workdir, "base.db")
+    print(f"生成 {args.rows} 行测试数据...")
+    started = time.perf_counter()
+    build_database(base, args.rows)
+    print(f"完成，用时 {time.perf_counter() - started:.1f}s，文件 {os.path.getsize(base) / 1e6:.0f} MB")
+
+    profiles = {"default": {}, "tuned": SQLITE_PRAGMAS}
+    print(f"{'配置':<8} {'写入(条/秒)':>12} {'写批次p99(ms)':>14} {'读查询(次/秒)':>14}")
+    try:
+        for name, pragmas in profiles.items():
+            path = os.path.join(workdir, f"{name}.db")
+            shutil.copyfile(base, path)
+            result = run_profile(path, pragmas, args)
+            print(f"{name:<8} {result['write_rate']:>12.0f} {result['write_p99'] * 1000:>14.1f} {result['read_rate']:>14.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
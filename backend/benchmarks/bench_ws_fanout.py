@@ -0,0 +1,148 @@
+"""WebSocket 广播扇出基准测试
+
+模拟数百个客户端（部分很慢，部分完全卡死），以固定频率广播主机状态和日志，对比：
+
+- legacy: 旧实现，对每个连接依次 await send_text（旧实现没有超时，卡死的客户端会
+  永远阻塞广播；这里给它加上与新实现相同的发送超时，否则测试无法结束）
+- queued: WebSocketManager 每连接有界队列 + 写任务
+
+输出单次 broadcast 调用耗时（即监控循环被阻塞的时间）、正常客户端的
+消息送达延迟，以及被断开的客户端数。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_ws_fanout
+    python -m benchmarks.bench_ws_fanout --clients 500 --slow-ratio 0.05 --stuck-ratio 0.01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+
+from services.websocket_service import WebSocketManager
+
+
+class FakeWebSocket:
+    """模拟浏览器连接：send_text 耗时 delay 秒，stuck 时永不返回"""
+
+    def __init__(self, delay: float = 0.0, stuck: bool = False):
+        self.delay = delay
+        self.stuck = stuck
+        self.latencies = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+    async def send_text(self, data: str):
+        if self.stuck:
+            await asyncio.Event().wait()
+        if self.delay:
+            await asyncio.sleep(self.delay * random.uniform(0.5, 1.5))
+        else:
+            await asyncio.sleep(0)
+        sent_at = json.loads(data).get("sent_at")
+        if sent_at is not None:
+            self.latencies.append(time.perf_counter() - sent_at)
+
+
+class LegacyWebSocketManager:
+    """旧实现：逐个 await 发送"""
+
+    def __init__(self, send_timeout: float):
+        self.send_timeout = send_timeout
+        self.active_connections = []
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.active_connections.append(websocket)
+
+    async def broadcast(self, message: dict):
+        data = json.dumps(message)
+        for connection in list(self.active_connections):
+            try:
+                await asyncio.wait_for(connection.send_text(data), timeout=self.send_timeout)
+            except Exception:
+                self.active_connections.remove(connection)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(mode: str, args) -> dict:
+    if mode == "legacy":
+        manager = LegacyWebSocketManager(args.send_timeout)
+    else:
+        manager = WebSocketManager(send_timeout=args.send_timeout)
+    sockets = []
+    slow = int(args.clients * args.slow_ratio)
+    stuck = int(args.clients * args.stuck_ratio)
+    for i in range(args.clients):
+        ws = FakeWebSocket(delay=args.slow_delay if i < slow else 0.0, stuck=slow <= i < slow + stuck)
+        await manager.connect(ws)
+        sockets.append(ws)
+
+    broadcast_times = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+    tick = 0
+    while time.perf_counter() < deadline:
+        tick += 1
+        t0 = time.perf_counter()
+        await manager.broadcast({"type": "host_status", "host_id": tick % args.hosts,
+                                 "data": {"cpu_temp": 55.0, "fan_speed": 20}, "sent_at": t0})
+        await manager.broadcast({"type": "log", "data": {"level": "INFO", "message": f"tick {tick}"},
+                                 "sent_at": time.perf_counter()})
+        broadcast_times.append(time.perf_counter() - t0)
+        await asyncio.sleep(args.period)
+    await asyncio.sleep(0.5)
+
+    normal = [lat for ws in sockets[slow + stuck:] for lat in ws.latencies]
+    connected = len(manager.active_connections)
+    if mode == "queued":
+        for ws in list(manager.clients):
+            manager.disconnect(ws)
+    return {
+        "mode": mode,
+        "ticks": tick,
+        "bcast_p99": percentile(broadcast_times, 0.99),
+        "bcast_max": max(broadcast_times) if broadcast_times else 0.0,
+        "deliver_p50": percentile(normal, 0.5),
+        "deliver_p99": percentile(normal, 0.99),
+        "evicted": args.clients - connected,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--hosts", type=int, default=20, help="轮流广播状态的主机数")
+    parser.add_argument("--slow-ratio", type=float, default=0.05, help="慢客户端比例")
+    parser.add_argument("--slow-delay", type=float, default=0.2, help="慢客户端每条消息耗时（秒）")
+    parser.add_argument("--stuck-ratio", type=float, default=0.01, help="卡死客户端比例")
+    parser.add_argument("--send-timeout", type=float, default=2.0)
+    parser.add_argument("--period", type=float, default=0.05, help="广播间隔（秒）")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--modes", nargs="+", default=["legacy", "queued"], choices=["legacy", "queued"])
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print(f"{args.clients} 个客户端，慢 {args.slow_ratio:.0%}（{args.slow_delay}s/条），卡死 {args.stuck_ratio:.0%}")
+    print(f"{'方式':<8} {'广播轮数':>8} {'broadcast p99(ms)':>18} {'最大(ms)':>10} "
+          f"{'送达p50(ms)':>12} {'送达p99(ms)':>12} {'断开数':>6}")
+    for mode in args.modes:
+        r = await run(mode, args)
+        print(f"{r['mode']:<8} {r['ticks']:>8} {r['bcast_p99'] * 1000:>18.2f} {r['bcast_max'] * 1000:>10.1f} "
+              f"{r['deliver_p50'] * 1000:>12.2f} {r['deliver_p99'] * 1000:>12.2f} {r['evicted']:>6}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,372 @@
+"""本地 UDP 模拟 BMC（IPMI v2.0 / RMCP+）
+
+足以让 ``ipmitool -I lanplus`` 建立会话并执行 raw 命令，用于在没有真实 iDRAC
+的环境下测量传输层的单条命令延迟。支持的加密套件：
+
+- 0: 无认证 / 无完整性校验 / 无加密
+- 1: RAKP-HMAC-SHA1 / 无完整性校验 / 无加密
+- 2: RAKP-HMAC-SHA1 / HMAC-SHA1-96 / 无加密
+
+（真实 iDRAC 默认使用套件 3，其 AES 加密部分不在模拟范围内，基准测试请用 ``-C 2``。）
+
+已实现的命令：Get Device ID、Get Channel Authentication Capabilities、
+Set Session Privilege Level、Close Session、Get Sensor Reading、
+Get SDR Repository Info / Reserve SDR Repository / Get SDR（``ipmitool sdr dump`` 可用）、
+Dell OEM 风扇控制 (0x30 0x30)。其他命令返回 0xC1（Invalid Command）。
+
+单独运行（在 backend 目录下）：
+    python -m benchmarks.fake_bmc --port 16230
+    ipmitool -I lanplus -H 127.0.0.1 -p 16230 -U root -P calvin -C 2 raw 0x30 0x30 0x01 0x00
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+RMCP_HEADER = b"\x06\x00\xff\x07"
+AUTH_TYPE_RMCPP = 0x06
+
+PAYLOAD_IPMI = 0x00
+PAYLOAD_OPEN_SESSION_REQUEST = 0x10
+PAYLOAD_OPEN_SESSION_RESPONSE = 0x11
+PAYLOAD_RAKP1 = 0x12
+PAYLOAD_RAKP2 = 0x13
+PAYLOAD_RAKP3 = 0x14
+PAYLOAD_RAKP4 = 0x15
+
+BMC_GUID = bytes(range(0x10, 0x20))
+DELL_MANUFACTURER_ID = b"\xa2\x02\x00"
+
+
+def checksum(data: bytes) -> int:
+    return (-sum(data)) & 0xFF
+
+
+def full_sensor_record(record_id: int, number: int, name: str, entity_id: int, entity_instance: int,
+                       sensor_type: int, base_unit: int, m: int = 1, analog_format: int = 2) -> bytes:
+    """构造一条 SDR 全传感器记录（Type 01h），线性换算 y = M * x"""
+    body = bytearray(43)
+    body[0] = 0x20                      # 传感器所有者 (BMC)
+    body[2] = number
+    body[3] = entity_id
+    body[4] = entity_instance
+    body[7] = sensor_type
+    body[8] = 0x01                      # 阈值型读数
+    body[15] = analog_format << 6
+    body[16] = base_unit
+    body[19] = m & 0xFF
+    body[20] = (m >> 2) & 0xC0
+    body[42] = 0xC0 | len(name)         # ID 字符串：8 位 ASCII
+    body += name.encode()
+    return struct.pack("<HBBB", record_id, 0x51, 0x01, len(body)) + bytes(body)
+
+
+# 与 BMCState.sensors 中的传感器编号对应，布局参照 Dell 14G
+DEFAULT_SDR = [
+    full_sensor_record(1, 0x01, "Exhaust Temp", 0x07, 1, 0x01, 0x01),
+    full_sensor_record(2, 0x04, "Inlet Temp", 0x07, 1, 0x01, 0x01),
+    full_sensor_record(3, 0x0e, "Temp", 0x03, 1, 0x01, 0x01),
+    full_sensor_record(4, 0x0f, "Temp", 0x03, 2, 0x01, 0x01),
+    full_sensor_record(5, 0x77, "Pwr Consumption", 0x07, 1, 0x0b, 0x06, m=14, analog_format=0),
+]
+
+
+@dataclass
+class Session:
+    console_id: int
+    bmc_id: int
+    auth_alg: int
+    integrity_alg: int
+    conf_alg: int
+    console_random: bytes = b""
+    bmc_random: bytes = b""
+    role: int = 0
+    username: bytes = b""
+    sik: bytes = b""
+    k1: bytes = b""
+    active: bool = False
+    outbound_seq: int = 0
+
+
+@dataclass
+class BMCState:
+    """模拟 BMC 的可观测状态"""
+    manual_fan: bool = False
+    fan_speed: int = 0
+    commands: int = 0
+    sessions_opened: int = 0
+    sensors: Dict[int, int] = field(default_factory=lambda: {
+        0x0e: 45,   # CPU1 Temp
+        0x0f: 47,   # CPU2 Temp
+        0x04: 24,   # Inlet Temp
+        0x01: 34,   # Exhaust Temp
+        0x77: 12,   # Pwr Consumption（M=14 时约 168W）
+    })
+
+
+class FakeBMC(asyncio.DatagramProtocol):
+    def __init__(self, username: str = "root", password: str = "calvin",
+                 delay: float = 0.0, state: Optional[BMCState] = None):
+        self.username = username.encode()
+        self.kuid = password.encode()[:20].ljust(20, b"\x00")
+        self.delay = delay
+        self.state = state or BMCState()
+        self.sdr = list(DEFAULT_SDR)
+        self.sessions: Dict[int, Session] = {}
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        if self.delay:
+            asyncio.get_running_loop().call_later(self.delay, self._handle, data, addr)
+        else:
+            self._handle(data, addr)
+
+    def _handle(self, data: bytes, addr):
+        if not data.startswith(RMCP_HEADER):
+            return
+        try:
+            if data[4] == AUTH_TYPE_RMCPP:
+                reply = self._handle_v2(data[4:])
+            else:
+                reply = self._handle_v15(data[4:])
+        except (IndexError, struct.error, KeyError):
+            return
+        if reply:
+            self.transport.sendto(RMCP_HEADER + reply, addr)
+
+    # ---- IPMI 1.5 会话外报文（仅 Get Channel Auth Capabilities）----
+
+    def _handle_v15(self, packet: bytes) -> Optional[bytes]:
+        auth_type = packet[0]
+        offset = 9 + (16 if auth_type else 0)
+        length = packet[offset]
+        msg = packet[offset + 1:offset + 1 + length]
+        response = self._dispatch(msg, None)
+        return struct.pack("<BII", 0, 0, 0) + bytes([len(response)]) + response
+
+    # ---- IPMI 2.0 / RMCP+ ----
+
+    def _handle_v2(self, packet: bytes) -> Optional[bytes]:
+        payload_type = packet[1] & 0x3F
+        authenticated = bool(packet[1] & 0x40)
+        session_id, seq, length = struct.unpack("<IIH", packet[2:12])
+        payload = packet[12:12 + length]
+
+        if payload_type == PAYLOAD_OPEN_SESSION_REQUEST:
+            return self._v2_packet(PAYLOAD_OPEN_SESSION_RESPONSE, self._open_session(payload))
+        if payload_type == PAYLOAD_RAKP1:
+            return self._v2_packet(PAYLOAD_RAKP2, self._rakp1(payload))
+        if payload_type == PAYLOAD_RAKP3:
+            return self._v2_packet(PAYLOAD_RAKP4, self._rakp3(payload))
+        if payload_type != PAYLOAD_IPMI:
+            return None
+
+        if session_id == 0:
+            # 会话外的 IPMI 请求（如 Get Channel Cipher Suites）
+            return self._v2_packet(PAYLOAD_IPMI, self._dispatch(payload, None))
+
+        session = self.sessions.get(session_id)
+        if session is None or not session.active:
+            return None
+        if session.integrity_alg:
+            if not authenticated:
+                return None
+            body_end = len(packet) - 12
+            expected = hmac.new(session.k1, packet[:body_end], hashlib.sha1).digest()[:12]
+            if not hmac.compare_digest(expected, packet[body_end:]):
+                return None
+
+        response = self._dispatch(payload, session)
+        return self._v2_packet(PAYLOAD_IPMI, response, session)
+
+    def _v2_packet(self, payload_type: int, payload: bytes, session: Optional[Session] = None) -> bytes:
+        if session is None:
+            header = struct.pack("<BBIIH", AUTH_TYPE_RMCPP, payload_type, 0, 0, len(payload))
+            return header + payload
+
+        session.outbound_seq += 1
+        signed = bool(session.integrity_alg)
+        header = struct.pack(
+            "<BBIIH", AUTH_TYPE_RMCPP, payload_type | (0x40 if signed else 0),
+            session.console_id, session.outbound_seq, len(payload)
+        )
+        packet = header + payload
+        if signed:
+            pad = (4 - (len(packet) + 2) % 4) % 4
+            packet += b"\xff" * pad + bytes([pad, 0x07])
+            packet += hmac.new(session.k1, packet, hashlib.sha1).digest()[:12]
+        return packet
+
+    def _open_session(self, payload: bytes) -> bytes:
+        tag, max_priv = payload[0], payload[1]
+        console_id = struct.unpack("<I", payload[4:8])[0]
+        auth_alg, integrity_alg, conf_alg = payload[12] & 0x3F, payload[20] & 0x3F, payload[28] & 0x3F
+        if auth_alg > 1 or integrity_alg > 1 or conf_alg != 0:
+            # 0x11: 无匹配的完整性/加密算法
+            return bytes([tag, 0x11, 0, 0]) + struct.pack("<I", console_id)
+
+        bmc_id = int.from_bytes(os.urandom(4), "little") | 1
+        self.sessions[bmc_id] = Session(console_id, bmc_id, auth_alg, integrity_alg, conf_alg)
+        self.state.sessions_opened += 1
+        return (
+            bytes([tag, 0x00, max_priv or 0x04, 0])
+            + struct.pack("<II", console_id, bmc_id)
+            + bytes([0x00, 0, 0, 0x08, auth_alg, 0, 0, 0])
+            + bytes([0x01, 0, 0, 0x08, integrity_alg, 0, 0, 0])
+            + bytes([0x02, 0, 0, 0x08, conf_alg, 0, 0, 0])
+        )
+
+    def _rakp1(self, payload: bytes) -> bytes:
+        tag = payload[0]
+        bmc_id = struct.unpack("<I", payload[4:8])[0]
+        session = self.sessions[bmc_id]
+        session.console_random = payload[8:24]
+        session.role = payload[24]
+        name_len = payload[27]
+        session.username = payload[28:28 + name_len]
+        session.bmc_random = os.urandom(16)
+
+        if session.username != self.username:
+            # 0x0D: 未授权的用户名
+            return bytes([tag, 0x0D, 0, 0]) + struct.pack("<I", session.console_id)
+
+        auth_code = b""
+        if session.auth_alg:
+            auth_code = hmac.new(
+                self.kuid,
+                struct.pack("<II", session.console_id, session.bmc_id)
+                + session.console_random + session.bmc_random + BMC_GUID
+                + bytes([session.role, len(session.username)]) + session.username,
+                hashlib.sha1
+            ).digest()
+        return (
+            bytes([tag, 0x00, 0, 0]) + struct.pack("<I", session.console_id)
+            + session.bmc_random + BMC_GUID + auth_code
+        )
+
+    def _rakp3(self, payload: bytes) -> bytes:
+        tag = payload[0]
+        bmc_id = struct.unpack("<I", payload[4:8])[0]
+        session = self.sessions[bmc_id]
+        role_user = bytes([session.role, len(session.username)]) + session.username
+
+        icv = b""
+        if session.auth_alg:
+            expected = hmac.new(
+                self.kuid,
+                session.bmc_random + struct.pack("<I", session.console_id) + role_user,
+                hashlib.sha1
+            ).digest()
+            if not hmac.compare_digest(expected, payload[8:28]):
+                # 0x0F: 无效的完整性校验值
+                return bytes([tag, 0x0F, 0, 0]) + struct.pack("<I", session.console_id)
+            session.sik = hmac.new(
+                self.kuid, session.console_random + session.bmc_random + role_user, hashlib.sha1
+            ).digest()
+            session.k1 = hmac.new(session.sik, b"\x01" * 20, hashlib.sha1).digest()
+            icv = hmac.new(
+                session.sik,
+                session.console_random + struct.pack("<I", session.bmc_id) + BMC_GUID,
+                hashlib.sha1
+            ).digest()[:12]
+
+        session.active = True
+        return bytes([tag, 0x00, 0, 0]) + struct.pack("<I", session.console_id) + icv
+
+    # ---- IPMI 消息 ----
+
+    def _dispatch(self, msg: bytes, session: Optional[Session]) -> bytes:
+        rs_addr, netfn_lun, rq_addr, rq_seq, cmd = msg[0], msg[1], msg[3], msg[4], msg[5]
+        netfn = netfn_lun >> 2
+        data = msg[6:-1]
+        cc, body = self._execute(netfn, cmd, data, session)
+
+        header = bytes([rq_addr, ((netfn + 1) << 2) | (rq_seq & 0x03)])
+        tail = bytes([rs_addr, rq_seq, cmd, cc]) + body
+        return header + bytes([checksum(header)]) + tail + bytes([checksum(tail)])
+
+    def _execute(self, netfn: int, cmd: int, data: bytes, session: Optional[Session]) -> Tuple[int, bytes]:
+        self.state.commands += 1
+        if netfn == 0x06 and cmd == 0x38:
+            # Get Channel Authentication Capabilities：声明支持 IPMI v2.0
+            return 0x00, bytes([0x01, 0x80 | 0x01, 0x04, 0x02, 0x00, 0x00, 0x00, 0x00])
+        if netfn == 0x06 and cmd == 0x01:
+            # Get Device ID
+            return 0x00, bytes([0x20, 0x81, 0x02, 0x40, 0x02, 0xdf]) + DELL_MANUFACTURER_ID + b"\x00\x01" + b"\x00\x00\x00\x00"
+        if netfn == 0x06 and cmd == 0x3b:
+            # Set Session Privilege Level
+            return 0x00, bytes([data[0] & 0x0F or 0x04])
+        if netfn == 0x06 and cmd == 0x3c:
+            # Close Session
+            if session:
+                self.sessions.pop(session.bmc_id, None)
+            return 0x00, b""
+        if netfn == 0x0a and cmd == 0x20:
+            # Get SDR Repository Info
+            return 0x00, struct.pack("<BHHIIB", 0x51, len(self.sdr), 0x0800, 0x5f000000, 0, 0x02)
+        if netfn == 0x0a and cmd == 0x22:
+            # Reserve SDR Repository
+            return 0x00, b"\x01\x00"
+        if netfn == 0x0a and cmd == 0x23:
+            # Get SDR：按记录序号取 offset 起的若干字节
+            record_id, offset, count = struct.unpack("<2xHBB", data[:6])
+            index = 0 if record_id == 0 else record_id - 1
+            if index >= len(self.sdr):
+                return 0xCB, b""
+            next_id = index + 2 if index + 1 < len(self.sdr) else 0xFFFF
+            record = self.sdr[index]
+            return 0x00, struct.pack("<H", next_id) + record[offset:offset + (len(record) if count == 0xFF else count)]
+        if netfn == 0x04 and cmd == 0x2d:
+            # Get Sensor Reading
+            reading = self.state.sensors.get(data[0])
+            if reading is None:
+                return 0xCB, b""
+            return 0x00, bytes([reading, 0xC0, 0x00, 0x00])
+        if netfn == 0x30 and cmd == 0x30 and data:
+            # Dell OEM 风扇控制
+            if data[0] == 0x01 and len(data) >= 2:
+                self.state.manual_fan = data[1] == 0x00
+                return 0x00, b""
+            if data[0] == 0x02 and len(data) >= 3:
+                self.state.fan_speed = data[2]
+                return 0x00, b""
+        return 0xC1, b""
+
+
+async def start_fake_bmc(host: str = "127.0.0.1", port: int = 0, **kwargs) -> Tuple[asyncio.DatagramTransport, FakeBMC]:
+    """启动模拟 BMC，port=0 时由系统分配端口"""
+    loop = asyncio.get_running_loop()
+    return await loop.create_datagram_endpoint(lambda: FakeBMC(**kwargs), local_addr=(host, port))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=16230)
+    parser.add_argument("--username", default="root")
+    parser.add_argument("--password", default="calvin")
+    parser.add_argument("--delay", type=float, default=0.0, help="模拟 BMC 的处理延迟（秒）")
+    args = parser.parse_args()
+
+    transport, bmc = await start_fake_bmc(
+        args.host, args.port, username=args.username, password=args.password, delay=args.delay
+    )
+    print(f"模拟 BMC 已监听 {args.host}:{transport.get_extra_info('sockname')[1]}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
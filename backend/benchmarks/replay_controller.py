@@ -0,0 +1,271 @@
+"""风扇控制器回放：在历史温度曲线上对比当前（按当前温度查曲线）与预测控制器
+
+历史数据中的温度是在当时的风扇转速下测得的，不能直接用来评价另一个控制器。
+这里用一阶热模型从记录中反推每个采样区间的发热量：
+
+    dT/dt = q(t) - k(fan) * (T - T_amb)，k(fan) = a + b * fan%
+
+区间内 q 和 fan 不变时有解析解，按记录的 (T_i, T_{i+1}, fan_i) 可精确解出 q_i。
+然后对每个控制器从同一起点重新模拟：每个采样点控制器读取模拟温度并给出转速，
+按 q_i 和该转速推进到下一个采样点。输出峰值温度、超过 --hot 的时长、
+平均转速、转速变化次数 / 累计变化量（churn），以及按 --deadband 过滤后
+实际需要下发的命令数。--controller 可额外对比 hysteresis、pid 等控制策略。
+
+不指定 --data-dir 时使用合成负载（基础负载 + 随机的突发负载）。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.replay_controller
+    python -m benchmarks.replay_controller --data-dir ../data --host-id 1 --hours 24
+    python -m benchmarks.replay_controller --horizon 30 60 90 --window 3 5 8
+    python -m benchmarks.replay_controller --controller hysteresis pid --deadband 3
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+DEFAULT_CURVE = [(50, 15), (60, 15), (70, 20), (80, 40)]
+
+
+@dataclass
+class ThermalModel:
+    ambient: float = 25.0
+    a: float = 0.002    # 风扇停转时的散热系数（1/秒）
+    b: float = 0.0003   # 每 1% 转速增加的散热系数（1/秒）
+
+    def k(self, fan: float) -> float:
+        return self.a + self.b * fan
+
+    def step(self, temp: float, load: float, fan: float, dt: float) -> float:
+        """load、fan 不变时 dt 秒后的温度"""
+        k = self.k(fan)
+        equilibrium = self.ambient + load / k
+        return equilibrium + (temp - equilibrium) * math.exp(-k * dt)
+
+    def infer_load(self, temp: float, next_temp: float, fan: float, dt: float) -> float:
+        """step 的逆运算：由相邻两个采样和该区间的转速解出发热量"""
+        k = self.k(fan)
+        decay = math.exp(-k * dt)
+        equilibrium = (next_temp - temp * decay) / (1 - decay)
+        return k * (equilibrium - self.ambient)
+
+
+@dataclass
+class Trace:
+    """回放输入：采样时刻、每个区间的发热量和起始温度（按数据间断分段）"""
+    times: List[float]
+    loads: List[float]
+    starts: List[Tuple[int, float]]   # (采样下标, 该段起始温度)
+
+
+def trace_from_samples(samples: Sequence[Tuple[float, float, float]], model: ThermalModel,
+                       max_gap: float) -> Trace:
+    """(epoch, cpu_temp, fan_speed) 序列 -> Trace，间隔超过 max_gap 处重新开始一段"""
+    times, loads, starts = [], [], []
+    for i, (t, temp, fan) in enumerate(samples):
+        times.append(t)
+        if i == 0 or t - samples[i - 1][0] > max_gap:
+            starts.append((i, temp))
+        if i + 1 < len(samples) and samples[i + 1][0] - t <= max_gap:
+            loads.append(model.infer_load(temp, samples[i + 1][1], fan, samples[i + 1][0] - t))
+        else:
+            loads.append(0.0)
+    return Trace(times, loads, starts)
+
+
+def synthetic_trace(hours: float, interval: float, model: ThermalModel, seed: int) -> Trace:
+    """基础负载缓慢漂移，叠加随机出现、持续 2~10 分钟的突发负载"""
+    rng = random.Random(seed)
+    count = int(hours * 3600 / interval)
+    base, burst_left, burst = 0.22, 0, 0.0
+    times, loads = [], []
+    for i in range(count):
+        base = min(0.3, max(0.15, base + rng.gauss(0, 0.004)))
+        if burst_left <= 0 and rng.random() < 0.02:
+            burst_left = rng.randint(int(120 / interval) or 1, int(600 / interval) or 1)
+            burst = rng.uniform(0.2, 0.5)
+        load = base + (burst if burst_left > 0 else 0.0)
+        burst_left -= 1
+        times.append(i * interval)
+        loads.append(load)
+    return Trace(times, loads, [(0, 50.0)])
+
+
+def simulate(trace: Trace, model: ThermalModel, controller, noise: float, seed: int):
+    """返回每个采样点的 (模拟温度, 转速)"""
+    rng = random.Random(seed)
+    starts = dict(trace.starts)
+    temps, fans = [], []
+    temp = 0.0
+    for i, t in enumerate(trace.times):
+        if i in starts:
+            temp = starts[i]
+            controller.reset()
+        measured = temp + (rng.gauss(0, noise) if noise else 0.0)
+        fan = controller(t, measured)
+        temps.append(temp)
+        fans.append(fan)
+        if i + 1 < len(trace.times) and (i + 1) not in starts:
+            temp = model.step(temp, trace.loads[i], fan, trace.times[i + 1] - t)
+    return temps, fans
+
+
+class ReactiveController:
+    """当前控制器：按读数查曲线"""
+
+    def __init__(self, service, curve):
+        from services.fan_controller import CompiledCurve
+        self.service, self.curve = service, CompiledCurve(curve)
+        self.name = "reactive"
+
+    def reset(self):
+        pass
+
+    def __call__(self, t: float, temp: float) -> int:
+        return self.service.calculate_fan_speed(temp, self.curve)
+
+
+class PredictiveController(ReactiveController):
+    """预测控制器：按温度趋势外推 horizon 秒后的温度查曲线"""
+
+    def __init__(self, service, curve, horizon: float, window: int):
+        super().__init__(service, curve)
+        self.horizon, self.window = horizon, window
+        self.name = f"predict h={horizon:g}s w={window}"
+        self.reset()
+
+    def reset(self):
+        from services.temperature_trend import TemperatureTrend
+        self.trend = TemperatureTrend(self.window)
+
+    def __call__(self, t: float, temp: float) -> int:
+        self.trend.add(t, temp)
+        return self.service.calculate_fan_speed(self.trend.project(self.horizon), self.curve)
+
+
+class StrategyController(ReactiveController):
+    """services.fan_controller 中的控制策略"""
+
+    def __init__(self, service, curve, kind: str):
+        from services.fan_controller import create_controller
+        super().__init__(service, curve)
+        self.controller = create_controller(kind)
+        self.name = kind
+
+    def reset(self):
+        self.controller.reset()
+
+    def __call__(self, t: float, temp: float) -> int:
+        return self.controller.compute(temp, self.curve, t)
+
+
+def count_commands(fans: List[int], deadband: int) -> int:
+    """与 MonitorService 相同的下发规则：变化小于 deadband 时跳过（升到 100% 除外）"""
+    sent, last = 0, None
+    for fan in fans:
+        if last is None or abs(fan - last) >= deadband or fan >= 100 > last:
+            sent, last = sent + 1, fan
+    return sent
+
+
+def summarize(trace: Trace, temps: List[float], fans: List[int], hot: float, deadband: int) -> dict:
+    above = 0.0
+    for i in range(len(trace.times) - 1):
+        if temps[i] >= hot:
+            above += trace.times[i + 1] - trace.times[i]
+    ordered = sorted(temps)
+    changes = sum(1 for a, b in zip(fans, fans[1:]) if a != b)
+    churn = sum(abs(a - b) for a, b in zip(fans, fans[1:]))
+    return {
+        "peak": max(temps),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "above": above,
+        "mean_fan": sum(fans) / len(fans),
+        "changes": changes,
+        "churn": churn,
+        "commands": count_commands(fans, deadband),
+    }
+
+
+def load_samples(host_id: Optional[int], hours: float):
+    """从 monitor_history（及分区表）读取最近 hours 小时的 (epoch, 温度, 转速)"""
+    from datetime import timedelta
+    from database import SessionLocal, FanCurve, Settings, utcnow
+    from services.history_store import configure_history_store, get_history_store, DEFAULT_HISTORY_STORE
+    from services.sample_buffer import _epoch
+
+    db = SessionLocal()
+    try:
+        storage = db.query(Settings).filter(Settings.key == "history_storage").first()
+        configure_history_store(storage.value if storage else DEFAULT_HISTORY_STORE)
+        until = utcnow()
+        samples = get_history_store().select_samples(until - timedelta(hours=hours), until, host_id)
+        rows = db.query(samples.c.recorded_at, samples.c.cpu_temp, samples.c.fan_speed)\
+            .order_by(samples.c.recorded_at).all()
+        curve = [(p.temperature, p.fan_speed) for p in db.query(FanCurve).order_by(FanCurve.temperature)]
+    finally:
+        db.close()
+    return [(_epoch(t), temp, fan) for t, temp, fan in rows], curve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", help="数据目录（含 fan_controller.db），不指定时使用合成负载")
+    parser.add_argument("--host-id", type=int, help="只回放该主机的数据")
+    parser.add_argument("--hours", type=float, default=6.0)
+    parser.add_argument("--interval", type=float, default=30.0, help="合成负载的采样间隔（秒）")
+    parser.add_argument("--horizon", type=float, nargs="+", default=[30.0], help="预测提前量（秒）")
+    parser.add_argument("--window", type=int, nargs="+", default=[5], help="斜率估计的采样数")
+    parser.add_argument("--controller", nargs="*", default=[], help="额外对比的控制策略（如 hysteresis pid）")
+    parser.add_argument("--deadband", type=int, default=2, help="转速死区（%%），用于统计下发命令数")
+    parser.add_argument("--hot", type=float, default=75.0, help="统计超过该温度的时长")
+    parser.add_argument("--noise", type=float, default=0.5, help="温度读数噪声标准差（°C）")
+    parser.add_argument("--ambient", type=float, default=ThermalModel.ambient)
+    parser.add_argument("--k-idle", type=float, default=ThermalModel.a, help="热模型参数 a")
+    parser.add_argument("--k-fan", type=float, default=ThermalModel.b, help="热模型参数 b")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # 必须在导入 database 之前设置
+    os.environ["DFC_DATA_DIR"] = os.path.abspath(args.data_dir) if args.data_dir \
+        else tempfile.mkdtemp(prefix="dfc-bench-")
+    import logging
+    logging.disable(logging.INFO)
+    from services.monitor_service import MonitorService
+
+    class NullWebSocketManager:
+        async def broadcast(self, message: dict):
+            pass
+
+    model = ThermalModel(args.ambient, args.k_idle, args.k_fan)
+    if args.data_dir:
+        samples, curve = load_samples(args.host_id, args.hours)
+        if len(samples) < 2:
+            sys.exit("所选范围内没有足够的历史数据")
+        trace = trace_from_samples(samples, model, max_gap=max(120.0, args.interval * 5))
+        source = f"{args.data_dir}，{len(samples)} 个采样"
+    else:
+        curve = DEFAULT_CURVE
+        trace = synthetic_trace(args.hours, args.interval, model, args.seed)
+        source = f"合成负载，{len(trace.times)} 个采样"
+
+    service = MonitorService(NullWebSocketManager())
+    controllers = [ReactiveController(service, curve)] + [
+        PredictiveController(service, curve, h, w) for h in args.horizon for w in args.window
+    ] + [StrategyController(service, curve, kind) for kind in args.controller]
+    print(f"{source}，曲线 {curve}，读数噪声 {args.noise}°C")
+    print(f"{'控制器':<20} {'峰值(°C)':>9} {'P95(°C)':>8} {f'≥{args.hot:g}°C(秒)':>12} "
+          f"{'平均转速(%)':>11} {'变化次数':>8} {'累计变化(%)':>11} {'下发命令':>8}")
+    for controller in controllers:
+        temps, fans = simulate(trace, model, controller, args.noise, args.seed)
+        r = summarize(trace, temps, fans, args.hot, args.deadband)
+        print(f"{controller.name:<20} {r['peak']:>9.1f} {r['p95']:>8.1f} {r['above']:>12.0f} "
+              f"{r['mean_fan']:>11.1f} {r['changes']:>8} {r['churn']:>11} {r['commands']:>8}")
+
+
+if __name__ == "__main__":
+    main()
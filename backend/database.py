@@ -1,7 +1,9 @@
-from sqlalchemy import create_engine, Column, Integer, Float, String, DateTime
+from sqlalchemy import create_engine, event, Column, Integer, Float, String, Text, DateTime, Boolean, Index, PrimaryKeyConstraint, UniqueConstraint, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
 import os
 
 
@@ -9,14 +11,89 @@ def utcnow():
     """返回当前 UTC 时间（timezone-aware）"""
     return datetime.now(timezone.utc)
 
-# 确保数据目录存在
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
+def as_utc(value: datetime, naive_local: bool = False) -> datetime:
+    """转换为 UTC（timezone-aware）
+
+    不含时区的时间默认按 UTC 处理（与数据库中的时间一致）；naive_local 为 True 时
+    按服务器本地时间处理（如日志查询，与日志显示的时间一致）。
+    """
+    if value.tzinfo is None and not naive_local:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+# 确保数据目录存在（可通过 DFC_DATA_DIR 环境变量覆盖，便于基准测试使用临时目录）
+DATA_DIR = os.environ.get(
+    "DFC_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+)
 os.makedirs(DATA_DIR, exist_ok=True)
 
 DATABASE_URL = f"sqlite:///{os.path.join(DATA_DIR, 'fan_controller.db')}"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# SQLite 调优参数，在每个新连接建立时生效
+# - WAL: 读写互不阻塞，提交只追加 WAL 文件
+# - synchronous=NORMAL: WAL 模式下只在检查点时 fsync，掉电最多丢失最近的提交
+# - mmap/cache: 历史查询走内存映射和 64MB 页缓存
+SQLITE_PRAGMAS: Dict[str, object] = {
+    # 必须在 journal_mode 之前：只对新建的数据库生效，数据清理后可分批归还空间
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # 负数单位为 KiB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+# 写连接池：监控写入线程、配置修改、数据清理
+WRITER_POOL_SIZE = 4
+# 读连接池：仪表盘等只读查询，连接设为 query_only，不会持有写锁
+READER_POOL_SIZE = 8
+
+
+def _install_pragmas(target: Engine, pragmas: Dict[str, object], query_only: bool = False) -> None:
+    """为引擎注册连接事件，对每个新连接执行 PRAGMA"""
+    @event.listens_for(target, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            if query_only:
+                cursor.execute("PRAGMA query_only=ON")
+        finally:
+            cursor.close()
+
+
+def create_engines(url: str, pragmas: Optional[Dict[str, object]] = None) -> Tuple[Engine, Engine]:
+    """创建写引擎和只读引擎（各自独立的连接池）
+
+    Args:
+        url: SQLite 数据库 URL。
+        pragmas: 连接级 PRAGMA，默认使用 SQLITE_PRAGMAS；传入空字典即 SQLite 默认配置。
+    """
+    if pragmas is None:
+        pragmas = SQLITE_PRAGMAS
+    connect_args = {"check_same_thread": False}
+
+    writer = create_engine(
+        url, connect_args=connect_args,
+        pool_size=WRITER_POOL_SIZE, max_overflow=WRITER_POOL_SIZE
+    )
+    _install_pragmas(writer, pragmas)
+
+    reader = create_engine(
+        url, connect_args=connect_args,
+        pool_size=READER_POOL_SIZE, max_overflow=READER_POOL_SIZE
+    )
+    _install_pragmas(reader, pragmas, query_only=True)
+    return writer, reader
+
+
+engine, read_engine = create_engines(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
 class Settings(Base):
@@ -26,6 +103,23 @@ class Settings(Base):
     value = Column(String, nullable=False)
     updated_at = Column(DateTime, default=utcnow)
 
+class Host(Base):
+    """受管服务器（iDRAC）"""
+    __tablename__ = "hosts"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, unique=True, nullable=False)
+    ip_address = Column(String, nullable=False)
+    username = Column(String, nullable=False, default="root")
+    password = Column(String, nullable=False, default="")
+    enabled = Column(Boolean, nullable=False, default=True)
+    # IPMI 传输方式，为空时使用全局配置 ipmi_transport
+    ipmi_transport = Column(String)
+    # 传感器读取后端，为空时使用全局配置 sensor_backend
+    sensor_backend = Column(String)
+    # 由旧版单机配置生成的默认主机，设置页的连接信息只同步到它
+    legacy = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, default=utcnow)
+
 class FanCurve(Base):
     __tablename__ = "fan_curve"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -36,33 +130,224 @@ class FanCurve(Base):
 class MonitorHistory(Base):
     __tablename__ = "monitor_history"
     id = Column(Integer, primary_key=True, autoincrement=True)
+    host_id = Column(Integer, index=True)
     cpu_temp = Column(Float, nullable=False)
     fan_speed = Column(Integer, nullable=False)
     power_consumption = Column(Integer)
     recorded_at = Column(DateTime, default=utcnow, index=True)
 
+class MonitorRollup(Base):
+    """历史数据预聚合（按档位、主机、时间桶），存 sum 以便增量合并"""
+    __tablename__ = "monitor_rollup"
+    tier = Column(Integer, nullable=False)           # 桶宽度（秒）
+    host_id = Column(Integer, nullable=False)        # 未归属主机的旧数据记为 0
+    bucket_start = Column(Integer, nullable=False)   # 桶起始 Unix 时间戳
+    samples = Column(Integer, nullable=False)
+    cpu_temp_sum = Column(Float, nullable=False)
+    cpu_temp_min = Column(Float, nullable=False)
+    cpu_temp_max = Column(Float, nullable=False)
+    fan_speed_sum = Column(Integer, nullable=False)
+    fan_speed_min = Column(Integer, nullable=False)
+    fan_speed_max = Column(Integer, nullable=False)
+    power_samples = Column(Integer, nullable=False, default=0)
+    power_sum = Column(Integer)
+    power_min = Column(Integer)
+    power_max = Column(Integer)
+    __table_args__ = (PrimaryKeyConstraint("tier", "host_id", "bucket_start"),)
+
+class Sensor(Base):
+    """传感器字典：每台主机的每个传感器一行，采样表只引用其 id"""
+    __tablename__ = "sensors"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    host_id = Column(Integer, nullable=False)   # 未归属主机的记为 0
+    name = Column(String, nullable=False)       # 如 "CPU1 Temp"、"System Board Fan1 RPM"
+    kind = Column(String, nullable=False)       # temperature / fan / power / current / voltage / percent
+    unit = Column(String, nullable=False)       # C / RPM / W / A / V / %
+    __table_args__ = (UniqueConstraint("host_id", "name", name="uq_sensors_host_name"),)
+
+class SensorSample(Base):
+    """传感器读数窄表：每个读数一行，时间为 Unix 秒整数，保持行尽量短"""
+    __tablename__ = "sensor_samples"
+    id = Column(Integer, primary_key=True)
+    sensor_id = Column(Integer, nullable=False)
+    recorded_at = Column(Integer, nullable=False)
+    value = Column(Float, nullable=False)
+    __table_args__ = (Index("ix_sensor_samples_sensor_time", "sensor_id", "recorded_at"),)
+
+class LogRecord(Base):
+    """结构化日志（与日志文件并行写入），message 由 FTS5 表 log_records_fts 索引"""
+    __tablename__ = "log_records"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    recorded_at = Column(DateTime, nullable=False, index=True)
+    level = Column(String, nullable=False)
+    logger = Column(String)
+    host = Column(String)                 # 消息前缀 [主机名] 中的主机名
+    message = Column(Text, nullable=False)
+    __table_args__ = (
+        Index("ix_log_records_level_id", "level", "id"),
+        Index("ix_log_records_host_id", "host", "id"),
+    )
+
+
+# 日志全文索引：外部内容 FTS5 表，由触发器与 log_records 同步。
+# trigram 分词支持任意子串（含中文）匹配；SQLite 不支持 trigram 时不建索引，搜索用 LIKE
+# （unicode61 按词匹配，中文整段为一个词，会改变子串搜索的结果）
+LOG_FTS_TABLE = "log_records_fts"
+LOG_FTS_TOKENIZERS = ("trigram",)
+_LOG_FTS_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS log_records_ai AFTER INSERT ON log_records BEGIN
+        INSERT INTO {LOG_FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS log_records_ad AFTER DELETE ON log_records BEGIN
+        INSERT INTO {LOG_FTS_TABLE}({LOG_FTS_TABLE}, rowid, message) VALUES ('delete', old.id, old.message);
+    END""",
+]
+
+
+def _create_log_fts(conn) -> None:
+    """创建日志全文索引表和同步触发器（已存在时跳过）"""
+    existing = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {"name": LOG_FTS_TABLE}).scalar()
+    if existing and "trigram" not in existing:
+        # 旧版本建的 unicode61 索引不再用于搜索，删除以免每条日志多一次索引写入
+        conn.execute(text("DROP TRIGGER IF EXISTS log_records_ai"))
+        conn.execute(text("DROP TRIGGER IF EXISTS log_records_ad"))
+        conn.execute(text(f"DROP TABLE {LOG_FTS_TABLE}"))
+        existing = None
+    if not existing:
+        for tokenizer in LOG_FTS_TOKENIZERS:
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {LOG_FTS_TABLE} USING fts5("
+                    f"message, content='log_records', content_rowid='id', tokenize='{tokenizer}')"
+                ))
+                break
+            except Exception:
+                continue
+        else:
+            return  # SQLite 未编译 FTS5，搜索退回 LIKE
+        conn.execute(text(f"INSERT INTO {LOG_FTS_TABLE}({LOG_FTS_TABLE}) VALUES ('rebuild')"))
+    for ddl in _LOG_FTS_TRIGGERS:
+        conn.execute(text(ddl))
+
+
+# 默认配置项，已有数据库升级时会补齐缺失的键
+DEFAULT_SETTINGS = {
+    "ip_address": "",
+    "username": "root",
+    "password": "",
+    "interval": "30",
+    "adaptive_interval": "false",
+    "min_interval": "10",
+    "max_interval": "120",
+    "retention_days": "30",
+    "max_concurrency": "16",
+    "ipmi_transport": "shell",
+    "sensor_backend": "racadm",
+    "history_storage": "table",
+    "log_retention_days": "14",
+    "predictive_control": "false",
+    "predict_horizon": "30",
+    "predict_window": "5",
+    "fan_controller": "curve",
+    "speed_deadband": "2",
+    "fan_hysteresis": "3",
+    "pid_setpoint": "65",
+    "pid_kp": "2.0",
+    "pid_ki": "0.02",
+    "pid_kd": "20",
+    "sensor_history": "false",
+    "control_sensor": "cpu_avg",
+}
+
+# 旧版本数据库中缺失的列（表名 -> {列名: 列定义}）
+_COLUMN_MIGRATIONS = {
+    "monitor_history": {"host_id": "INTEGER"},
+    "hosts": {"ipmi_transport": "VARCHAR", "sensor_backend": "VARCHAR", "legacy": "BOOLEAN NOT NULL DEFAULT 0"},
+}
+
+# 补列后需执行的数据迁移（(表名, 列名) -> SQL）
+_COLUMN_BACKFILLS = {
+    # 此前由单机配置生成的默认主机固定命名为 default
+    ("hosts", "legacy"): "UPDATE hosts SET legacy = 1 WHERE name = 'default'",
+}
+
+
+# 已有数据库需补建的索引
+_INDEX_MIGRATIONS = [
+    # 按主机 + 时间范围查询历史数据
+    "CREATE INDEX IF NOT EXISTS ix_monitor_history_host_time ON monitor_history (host_id, recorded_at)",
+]
+
+
+def _migrate_schema():
+    """为已有数据库补充新增的列和索引（create_all 不会修改已存在的表）"""
+    with engine.begin() as conn:
+        for table, columns in _COLUMN_MIGRATIONS.items():
+            existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_{table}_{name} ON {table} ({name})"
+                    ))
+                    backfill = _COLUMN_BACKFILLS.get((table, name))
+                    if backfill:
+                        conn.execute(text(backfill))
+        for ddl in _INDEX_MIGRATIONS:
+            conn.execute(text(ddl))
+        _create_log_fts(conn)
+
+
+# 由单机配置生成的默认主机的名称
+DEFAULT_HOST_NAME = "default"
+# 接口返回的密码掩码，提交回来时表示不修改密码
+PASSWORD_MASK = "******"
+
+
+def sync_default_host(db) -> None:
+    """将单机配置（settings 中的 ip_address/username/password）同步到默认主机
+
+    默认主机是由单机配置生成、带 legacy 标记的主机，通过主机接口添加的主机不受影响；
+    空值和密码掩码不会写入，避免清空默认主机的连接信息。
+    首次创建默认主机时，未归属任何主机的历史数据会归到它名下。
+    """
+    settings = {s.key: s.value for s in db.query(Settings).all()}
+    values = {
+        key: settings.get(key, "")
+        for key in ("ip_address", "username", "password")
+        if settings.get(key) and settings.get(key) != PASSWORD_MASK
+    }
+    host = db.query(Host).filter(Host.legacy.is_(True)).first()
+
+    if host is None:
+        # 只在主机表为空时由单机配置生成默认主机（默认主机被删除后不再自动重建）
+        if "ip_address" not in values or db.query(Host).first():
+            return
+        host = Host(name=DEFAULT_HOST_NAME, legacy=True, **values)
+        db.add(host)
+        db.flush()
+        db.query(MonitorHistory).filter(MonitorHistory.host_id.is_(None))\
+            .update({MonitorHistory.host_id: host.id}, synchronize_session=False)
+    else:
+        for key, value in values.items():
+            setattr(host, key, value)
+    db.commit()
+
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _migrate_schema()
     
     db = SessionLocal()
     try:
-        # 初始化默认配置
-        if not db.query(Settings).first():
-            defaults = [
-                Settings(key="ip_address", value=""),
-                Settings(key="username", value="root"),
-                Settings(key="password", value=""),
-                Settings(key="interval", value="30"),
-                Settings(key="retention_days", value="30"),
-            ]
-            db.add_all(defaults)
+        # 初始化默认配置，并补齐已有数据库中缺失的配置项（用于升级）
+        existing = {s.key for s in db.query(Settings).all()}
+        missing = [Settings(key=k, value=v) for k, v in DEFAULT_SETTINGS.items() if k not in existing]
+        if missing:
+            db.add_all(missing)
             db.commit()
-        else:
-            # 确保 retention_days 设置存在（用于已有数据库的升级）
-            if not db.query(Settings).filter(Settings.key == "retention_days").first():
-                db.add(Settings(key="retention_days", value="30"))
-                db.commit()
         
         # 初始化默认风扇曲线
         if not db.query(FanCurve).first():
@@ -74,6 +359,10 @@ def init_db():
             ]
             db.add_all(default_curve)
             db.commit()
+        
+        # 旧版单机配置迁移为默认主机
+        if not db.query(Host).first():
+            sync_default_host(db)
     finally:
         db.close()
 
@@ -83,3 +372,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """只读会话（独立连接池），用于不修改数据的查询接口"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,15 +1,113 @@
+import asyncio
 import logging
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from collections import Counter, deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import List, Optional
 import os
+import queue
 
 LOG_DIR = Path(os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "logs"))
 LOG_FILE = LOG_DIR / "fan_controller.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB
+LOG_BACKUP_COUNT = 7
 
-def setup_logging(ws_manager=None):
-    """配置日志系统"""
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# 日志队列容量和溢出策略（环境变量可覆盖）
+LOG_QUEUE_SIZE = int(os.environ.get("DFC_LOG_QUEUE_SIZE", "10000"))
+LOG_OVERFLOW = os.environ.get("DFC_LOG_OVERFLOW", "drop_new")
+
+_listener: Optional[QueueListener] = None
+
+
+class BoundedQueueHandler(QueueHandler):
+    """把日志记录放入有界队列，由 QueueListener 线程写文件和控制台
+
+    队列满时按 overflow 处理：
+    - drop_new: 丢弃新记录（保留风暴开始时的日志）
+    - drop_oldest: 丢弃队列中最旧的记录
+    - block: 最多等待 block_timeout 秒，仍然满则丢弃新记录
+    丢弃的条数在队列恢复空位后以一条 WARNING 记录补记。
+    """
+
+    OVERFLOW_POLICIES = ("drop_new", "drop_oldest", "block")
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE, overflow: str = LOG_OVERFLOW,
+                 block_timeout: float = 0.1):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"日志队列溢出策略必须是以下之一: {self.OVERFLOW_POLICIES}")
+        super().__init__(queue.Queue(maxsize))
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._unreported = 0
+        self._drop_lock = threading.Lock()
+
+    def enqueue(self, record):
+        if self._unreported and not self.queue.full():
+            with self._drop_lock:
+                count, self._unreported = self._unreported, 0
+            if count:
+                self._put(logging.makeLogRecord({
+                    "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"日志队列已满，丢弃了 {count} 条日志",
+                }))
+        self._put(record)
+
+    def _put(self, record):
+        try:
+            if self.overflow == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == "drop_oldest":
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        with self._drop_lock:
+            self.dropped += 1
+            self._unreported += 1
+
+
+def create_output_handlers(log_file: Path = LOG_FILE, max_bytes: int = LOG_MAX_BYTES,
+                           stream=None) -> List[logging.Handler]:
+    """文件（带轮转）和控制台处理器"""
+    file_handler = RotatingFileHandler(
+        log_file,
+        maxBytes=max_bytes,
+        backupCount=LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    
+    console_handler = logging.StreamHandler(stream or sys.stdout)
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return [file_handler, console_handler]
+
+
+def setup_logging(ws_manager=None, log_store: bool = False):
+    """配置日志系统
+
+    根日志器上只有一个 BoundedQueueHandler，调用方（包括事件循环线程）只做一次
+    入队；文件、控制台、数据库和 WebSocket 处理器都在 QueueListener 线程中执行，
+    文件写入和轮转改名不会阻塞事件循环。
+
+    Args:
+        ws_manager: 传入时把日志推送到 WebSocket 客户端。
+        log_store: 同时把日志写入数据库（结构化查询和全文搜索），需在 init_db 之后调用。
+    """
+    global _listener
     LOG_DIR.mkdir(parents=True, exist_ok=True)
+    stop_logging()
     
     # 创建根日志器
     logger = logging.getLogger()
@@ -18,61 +116,154 @@ def setup_logging(ws_manager=None):
     # 清除已有的处理器
     logger.handlers.clear()
     
-    # 文件处理器 - 带轮转
-    file_handler = RotatingFileHandler(
-        LOG_FILE,
-        maxBytes=10 * 1024 * 1024,  # 10MB
-        backupCount=7,
-        encoding='utf-8'
-    )
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s'
-    ))
-    logger.addHandler(file_handler)
+    handlers = create_output_handlers()
     
-    # 控制台处理器
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s'
-    ))
-    logger.addHandler(console_handler)
+    # 数据库处理器（可选）
+    if log_store:
+        from services.log_store import LogStoreHandler
+        store_handler = LogStoreHandler()
+        store_handler.setLevel(logging.INFO)
+        handlers.append(store_handler)
+        store_handler.start()
     
     # WebSocket 处理器（可选）
     if ws_manager:
         ws_handler = WebSocketLogHandler(ws_manager)
         ws_handler.setLevel(logging.INFO)
-        logger.addHandler(ws_handler)
+        handlers.append(ws_handler)
+        try:
+            ws_handler.start()
+        except RuntimeError:
+            pass  # 没有运行中的事件循环，不推送日志
+    
+    queue_handler = BoundedQueueHandler()
+    logger.addHandler(queue_handler)
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
     
     return logger
 
+
+def stop_logging():
+    """停止日志线程，写完队列中剩余的记录并关闭各输出处理器
+
+    关闭数据库处理器会等待其写入线程把缓冲中的记录写入数据库。
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+async def shutdown_logging():
+    """应用关闭时在事件循环中调用：停止日志线程，再推送 WebSocket 最后不足一批的日志"""
+    handlers = list(_listener.handlers) if _listener is not None else []
+    stop_logging()
+    for handler in handlers:
+        if isinstance(handler, WebSocketLogHandler):
+            try:
+                await handler.flush_batch()
+            except Exception:
+                pass
+
+def _levelno(name: str) -> int:
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else 0
+
+
 class WebSocketLogHandler(logging.Handler):
-    """将日志推送到 WebSocket 客户端"""
-    
-    def __init__(self, ws_manager):
+    """将日志批量推送到 WebSocket 客户端
+
+    emit 可在任意线程调用，只把记录放入有界队列；事件循环中的刷新任务每个
+    刷新窗口把队列中的记录合并成一条 log_batch 消息广播。超出速率的记录和
+    队列溢出的记录不推送，只在批次末尾附加一条“已抑制 N 条”的汇总。
+    """
+
+    def __init__(self, ws_manager, flush_interval: float = 0.5, max_queue: int = 1000,
+                 rate: float = 20.0, burst: int = 100):
         super().__init__()
         self.ws_manager = ws_manager
-    
+        self.flush_interval = flush_interval
+        self.rate = rate        # 每秒允许推送的记录数
+        self.burst = burst      # 突发上限（令牌桶容量）
+        self._queue = deque(maxlen=max_queue)
+        self._queue_lock = threading.Lock()
+        self._overflow = Counter()      # 队列满时被挤掉的记录，按级别计数
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._task = None
+
+    def start(self):
+        """在事件循环中启动刷新任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    def close(self):
+        """取消刷新任务（剩余的记录由 shutdown_logging 推送）"""
+        if self._task is not None:
+            try:
+                self._task.cancel()
+            except RuntimeError:
+                pass  # 事件循环已关闭（如退出时由 logging.shutdown 调用）
+            self._task = None
+        super().close()
+
     def emit(self, record):
         try:
-            import asyncio
-            message = {
-                "type": "log",
-                "data": {
-                    "time": self.formatTime(record),
-                    "level": record.levelname,
-                    "message": record.getMessage()
-                }
+            entry = {
+                "time": self.formatTime(record),
+                "level": record.levelname,
+                "message": record.getMessage()
             }
-            # 异步发送
-            try:
-                loop = asyncio.get_running_loop()
-                asyncio.create_task(self.ws_manager.broadcast(message))
-            except RuntimeError:
-                pass  # 没有运行中的事件循环
+            with self._queue_lock:
+                if len(self._queue) == self._queue.maxlen:
+                    self._overflow[self._queue[0]["level"]] += 1
+                self._queue.append(entry)
         except Exception:
-            pass
-    
+            self.handleError(record)
+
+    def _take(self):
+        """取出本窗口要推送的记录和被抑制的记录数（按级别）"""
+        with self._queue_lock:
+            entries = list(self._queue)
+            self._queue.clear()
+            suppressed = self._overflow
+            self._overflow = Counter()
+
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        allowed = min(len(entries), int(self._tokens))
+        self._tokens -= allowed
+        for entry in entries[allowed:]:
+            suppressed[entry["level"]] += 1
+        return entries[:allowed], suppressed
+
+    async def flush_batch(self):
+        entries, suppressed = self._take()
+        total = sum(suppressed.values())
+        if total:
+            detail = ", ".join(f"{level} {n}" for level, n in suppressed.most_common())
+            # 汇总使用被抑制记录中的最高级别，按级别订阅的客户端也能看到
+            level = max(suppressed, key=_levelno)
+            entries.append({
+                "time": self.formatTime(logging.makeLogRecord({})),
+                "level": level,
+                "message": f"日志过多，已抑制 {total} 条（{detail}）"
+            })
+        if entries:
+            await self.ws_manager.broadcast({"type": "log_batch", "data": entries, "suppressed": total})
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_batch()
+            except Exception:
+                pass
+
     def formatTime(self, record):
-        import time
         ct = time.localtime(record.created)
         return time.strftime("%Y-%m-%d %H:%M:%S", ct) + f",{int(record.msecs):03d}"
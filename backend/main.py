@@ -3,14 +3,18 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import asyncio
+import logging
 import os
 
-from api import dashboard, curve, logs, settings
+from api import dashboard, curve, logs, settings, hosts
 from services.monitor_service import MonitorService
 from services.websocket_service import WebSocketManager
 from services.cleanup_service import DataCleanupService
-from database import init_db, SessionLocal, Settings
-from logging_config import setup_logging
+from database import init_db, SessionLocal, Settings, engine, utcnow
+from services.history_rollup import backfill_rollups
+from services.history_store import configure_history_store, DEFAULT_HISTORY_STORE
+from services.log_store import DEFAULT_LOG_RETENTION_DAYS
+from logging_config import setup_logging, shutdown_logging
 from version import __version__
 
 ws_manager = WebSocketManager()
@@ -21,6 +25,7 @@ cleanup_service: DataCleanupService = None
 dashboard.set_monitor_service(monitor_service)
 settings.set_monitor_service(monitor_service)
 curve.set_monitor_service(monitor_service)
+hosts.set_monitor_service(monitor_service)
 
 def get_retention_days_from_db() -> int:
     """从数据库获取保留天数配置"""
@@ -32,21 +37,56 @@ def get_retention_days_from_db() -> int:
         db.close()
 
 
+def get_log_retention_days_from_db() -> int:
+    """从数据库获取日志保留天数配置"""
+    db = SessionLocal()
+    try:
+        setting = db.query(Settings).filter(Settings.key == "log_retention_days").first()
+        return int(setting.value) if setting else DEFAULT_LOG_RETENTION_DAYS
+    finally:
+        db.close()
+
+
+def get_history_storage_from_db() -> str:
+    """从数据库获取历史存储方式配置"""
+    db = SessionLocal()
+    try:
+        setting = db.query(Settings).filter(Settings.key == "history_storage").first()
+        return setting.value if setting else DEFAULT_HISTORY_STORE
+    finally:
+        db.close()
+
+
+async def run_rollup_backfill(until) -> None:
+    """用已有原始数据回填预聚合表（只在首次升级时有实际工作量）"""
+    try:
+        await asyncio.to_thread(backfill_rollups, engine, until)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"历史数据预聚合回填失败: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global cleanup_service
     
     # 启动时初始化
-    setup_logging(ws_manager)
     init_db()
+    setup_logging(ws_manager, log_store=True)
+    configure_history_store(get_history_storage_from_db())
     
     # 初始化数据清理服务，从数据库读取保留期限配置
     retention_days = get_retention_days_from_db()
-    cleanup_service = DataCleanupService(retention_days=retention_days)
+    cleanup_service = DataCleanupService(
+        retention_days=retention_days,
+        log_retention_days=get_log_retention_days_from_db()
+    )
     
     # 设置 settings API 的清理服务引用
     settings.set_cleanup_service(cleanup_service)
     
+    # 预聚合回填在后台线程执行，不阻塞启动；截止点需在写入线程启动前确定
+    asyncio.create_task(run_rollup_backfill(utcnow()))
+
     # 启动服务
     asyncio.create_task(monitor_service.start())
     await cleanup_service.start()
@@ -56,6 +96,7 @@ async def lifespan(app: FastAPI):
     # 关闭时清理
     await monitor_service.stop()
     await cleanup_service.stop()
+    await shutdown_logging()
 
 app = FastAPI(
     title="Dell Fan Controller",
@@ -75,6 +116,7 @@ app.include_router(dashboard.router, prefix="/api/dashboard", tags=["Dashboard"]
 app.include_router(curve.router, prefix="/api/curve", tags=["Curve"])
 app.include_router(logs.router, prefix="/api/logs", tags=["Logs"])
 app.include_router(settings.router, prefix="/api/settings", tags=["Settings"])
+app.include_router(hosts.router, prefix="/api/hosts", tags=["Hosts"])
 
 @app.get("/api/version", tags=["System"])
 async def get_version():
@@ -86,8 +128,12 @@ async def websocket_endpoint(websocket: WebSocket):
     await ws_manager.connect(websocket)
     try:
         while True:
-            await websocket.receive_text()
+            ws_manager.handle_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
+        pass
+    except RuntimeError:
+        pass  # 连接已被服务端因发送超时关闭
+    finally:
         ws_manager.disconnect(websocket)
 
 
@@ -0,0 +1,231 @@
+"""
+Per-host circuit breaker with latency / error-rate tracking and adaptive timeouts.
+"""
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, Type, TypeVar
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 连续失败这么多次后熔断
+DEFAULT_FAILURE_THRESHOLD = 3
+# 最近 ERROR_WINDOW 次调用中失败比例达到该值（且至少 MIN_CALLS_FOR_RATE 次调用）时熔断
+DEFAULT_ERROR_RATE = 0.5
+ERROR_WINDOW = 20
+MIN_CALLS_FOR_RATE = 10
+# 熔断时长（秒）：半开探测失败后翻倍，最长 MAX_OPEN_SECONDS
+DEFAULT_OPEN_SECONDS = 30.0
+MAX_OPEN_SECONDS = 300.0
+# 自适应超时 = p99 延迟 × TIMEOUT_MULTIPLIER，限制在 [MIN_TIMEOUT, MAX_TIMEOUT] 内；
+# 样本不足 MIN_LATENCY_SAMPLES 个时使用 MAX_TIMEOUT
+DEFAULT_MAX_TIMEOUT = 15.0
+DEFAULT_MIN_TIMEOUT = 2.0
+TIMEOUT_MULTIPLIER = 3.0
+MIN_LATENCY_SAMPLES = 10
+LATENCY_WINDOW = 100
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断中，调用未发出"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"[{name}] BMC 连续失败，已熔断，{retry_in:.0f} 秒后重新探测")
+        self.retry_in = retry_in
+
+
+class LatencyTracker:
+    """一类调用最近 LATENCY_WINDOW 次的耗时"""
+
+    __slots__ = ("samples",)
+
+    def __init__(self):
+        self.samples: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """一台 BMC 的熔断器
+
+    - closed：正常调用；连续失败 failure_threshold 次，或最近的错误率达到
+      error_rate 时转为 open；
+    - open：直接拒绝调用（抛出 CircuitOpenError），open_seconds 后转为 half_open；
+    - half_open：只放行一个探测调用，成功则恢复 closed，失败则重新 open 且熔断时长翻倍。
+
+    每类调用（op，如 sensors / command）单独统计耗时，timeout(op) 按其 p99 给出自适应超时。
+    ignored 中的异常表示 BMC 有响应但返回了错误（如完成码错误），不计为故障。
+    """
+
+    def __init__(self, name: str,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 error_rate: float = DEFAULT_ERROR_RATE,
+                 open_seconds: float = DEFAULT_OPEN_SECONDS,
+                 max_timeout: float = DEFAULT_MAX_TIMEOUT,
+                 min_timeout: float = DEFAULT_MIN_TIMEOUT,
+                 ignored: Tuple[Type[BaseException], ...] = (),
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate
+        self.base_open_seconds = open_seconds
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.ignored = ignored
+        self._clock = clock
+        self._latency: Dict[str, LatencyTracker] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """恢复为 closed 并清空错误统计（耗时统计保留）"""
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self.open_seconds = self.base_open_seconds
+        self._probing = False
+        self._outcomes: Deque[bool] = deque(maxlen=ERROR_WINDOW)
+        self.consecutive_failures = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+        return self._state
+
+    def retry_in(self) -> float:
+        """距下一次允许调用的秒数（0 表示现在即可调用）"""
+        state = self.state
+        if state == OPEN:
+            return max(0.0, self._opened_at + self.open_seconds - self._clock())
+        if state == HALF_OPEN and self._probing:
+            return self.min_timeout
+        return 0.0
+
+    @property
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def check(self) -> None:
+        """熔断中（且还没到探测时间）时抛出 CircuitOpenError，不占用半开探测名额"""
+        retry_in = self.retry_in()
+        if retry_in > 0:
+            self.rejected += 1
+            raise CircuitOpenError(self.name, retry_in)
+
+    def timeout(self, op: str) -> float:
+        """op 类调用的自适应超时（秒）"""
+        tracker = self._latency.get(op)
+        if tracker is None or len(tracker.samples) < MIN_LATENCY_SAMPLES:
+            return self.max_timeout
+        return max(self.min_timeout, min(self.max_timeout, tracker.percentile(0.99) * TIMEOUT_MULTIPLIER))
+
+    async def call(self, op: str, fn: Callable[..., Awaitable[T]], *args) -> T:
+        """经熔断器执行一次调用并记录结果和耗时"""
+        self.check()
+        if self.state == HALF_OPEN:
+            self._probing = True
+        started = self._clock()
+        succeeded = None
+        try:
+            result = await fn(*args)
+            succeeded = True
+            return result
+        except self.ignored:
+            succeeded = True
+            raise
+        except Exception:
+            succeeded = False
+            raise
+        finally:
+            if succeeded is None:
+                # 调用被取消：不计结果，释放探测名额
+                self._probing = False
+            else:
+                self._record(op, self._clock() - started, succeeded)
+
+    def _record(self, op: str, seconds: float, succeeded: bool) -> None:
+        self.calls += 1
+        # 失败的耗时同样计入：BMC 变慢导致超时后，超时会随之放宽
+        self._latency.setdefault(op, LatencyTracker()).add(seconds)
+        self._outcomes.append(succeeded)
+        was_probe, self._probing = self._probing, False
+        if succeeded:
+            self.consecutive_failures = 0
+            if was_probe:
+                self._state = CLOSED
+                self.open_seconds = self.base_open_seconds
+                self._outcomes.clear()
+            return
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        if was_probe:
+            self._trip(min(MAX_OPEN_SECONDS, self.open_seconds * 2))
+        elif self._state == CLOSED and (
+            self.consecutive_failures >= self.failure_threshold
+            or (len(self._outcomes) >= MIN_CALLS_FOR_RATE and self.error_rate >= self.error_rate_threshold)
+        ):
+            self._trip(self.base_open_seconds)
+
+    def _trip(self, open_seconds: float) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self.open_seconds = open_seconds
+        self.trips += 1
+
+    @property
+    def health(self) -> int:
+        """0~100 的健康分：按错误率扣分，再按传感器读取 p99 接近超时上限的程度最多扣一半；
+        熔断中为 0，半开时最高 50"""
+        state = self.state
+        if state == OPEN:
+            return 0
+        score = 100.0 * (1.0 - self.error_rate)
+        tracker = self._latency.get("sensors")
+        p99 = tracker.percentile(0.99) if tracker else None
+        if p99 is not None:
+            score *= 1.0 - 0.5 * min(1.0, p99 / self.max_timeout)
+        if state == HALF_OPEN:
+            score = min(score, 50.0)
+        return int(round(score))
+
+    def snapshot(self) -> Dict:
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return round(value, 3) if value is not None else None
+
+        return {
+            "state": self.state,
+            "health": self.health,
+            "retry_in": round(self.retry_in(), 1),
+            "open_seconds": self.open_seconds,
+            "consecutive_failures": self.consecutive_failures,
+            "error_rate": round(self.error_rate, 3),
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "trips": self.trips,
+            "ops": {
+                op: {
+                    "samples": len(tracker.samples),
+                    "p50": rounded(tracker.percentile(0.5)),
+                    "p99": rounded(tracker.percentile(0.99)),
+                    "timeout": round(self.timeout(op), 2),
+                }
+                for op, tracker in self._latency.items()
+            },
+        }
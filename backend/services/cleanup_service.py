@@ -1,12 +1,20 @@
 """
-Data Cleanup Service for automatic removal of old MonitorHistory records.
+Data Cleanup Service for automatic removal of old MonitorHistory and log records.
+
+Expired samples are removed through the active history store from a worker
+thread: small primary-key range deletes, or whole-partition drops.
 """
 import asyncio
 import logging
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Dict, Optional
 
-from database import SessionLocal, MonitorHistory, Settings, utcnow
+from database import engine, utcnow
+from services.history_rollup import purge_rollups
+from services.history_store import get_history_store
+from services.sensor_store import purge_sensor_samples
+from services.log_store import DEFAULT_LOG_RETENTION_DAYS, purge_log_records
 
 logger = logging.getLogger(__name__)
 
@@ -15,16 +23,45 @@ class DataCleanupService:
     """Service responsible for periodic cleanup of expired historical data."""
     
     DEFAULT_RETENTION_DAYS = 30
+    # 每个删除事务覆盖的主键范围，以及两块之间的让出时间（秒），
+    # 让监控写入线程有机会拿到写锁
+    DEFAULT_CHUNK_SIZE = 5000
+    DEFAULT_CHUNK_PAUSE = 0.05
+    # 每次 PRAGMA incremental_vacuum 归还的页数
+    VACUUM_PAGES_PER_STEP = 2000
+    # 每隔多少块输出一次进度日志
+    LOG_EVERY_CHUNKS = 100
     
-    def __init__(self, retention_days: int = DEFAULT_RETENTION_DAYS):
+    def __init__(self, retention_days: int = DEFAULT_RETENTION_DAYS,
+                 log_retention_days: int = DEFAULT_LOG_RETENTION_DAYS,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 chunk_pause: float = DEFAULT_CHUNK_PAUSE,
+                 incremental_vacuum: bool = True):
         """Initialize cleanup service with retention period.
         
         Args:
             retention_days: Number of days to retain data. Default is 30.
+            log_retention_days: Number of days to retain structured log records.
+            chunk_size: Primary-key range deleted per transaction.
+            chunk_pause: Seconds to sleep between chunks so inserts can take the write lock.
+            incremental_vacuum: Reclaim freed pages with PRAGMA incremental_vacuum after a purge
+                (only effective when the database was created with auto_vacuum=INCREMENTAL).
         """
         self._retention_days = retention_days
+        self._log_retention_days = log_retention_days
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.incremental_vacuum = incremental_vacuum
         self._running = False
         self._task: Optional[asyncio.Task] = None
+        self._manual_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.progress: Dict = {"running": False}
+    
+    @property
+    def is_cleaning(self) -> bool:
+        """Whether a cleanup is currently in progress."""
+        return self._lock.locked()
     
     @property
     def retention_days(self) -> int:
@@ -40,32 +77,112 @@ class DataCleanupService:
         self._retention_days = days
         logger.info(f"数据保留期限已更新为 {days} 天")
     
+    @property
+    def log_retention_days(self) -> int:
+        """Get current log retention period in days."""
+        return self._log_retention_days
+    
+    def set_log_retention_days(self, days: int) -> None:
+        """Update the log retention period for subsequent cleanups."""
+        self._log_retention_days = days
+        logger.info(f"日志保留期限已更新为 {days} 天")
+    
     async def cleanup(self) -> int:
         """Execute cleanup operation, deleting records older than retention period.
         
+        Runs in a worker thread as short transactions; concurrent calls wait for the running one.
+        
         Returns:
             Number of deleted records.
         """
         cutoff_date = utcnow() - timedelta(days=self._retention_days)
-        
-        db = SessionLocal()
+        async with self._lock:
+            try:
+                return await asyncio.to_thread(self._purge, cutoff_date)
+            except Exception as e:
+                self.progress.update(running=False, error=str(e))
+                logger.error(f"数据清理失败: {e}")
+                raise
+    
+    def trigger(self) -> bool:
+        """Start a cleanup in the background. Returns False if one is already running."""
+        if self.is_cleaning:
+            return False
+        self._manual_task = asyncio.create_task(self._cleanup_quietly())
+        return True
+    
+    async def _cleanup_quietly(self) -> None:
         try:
-            # Query and delete old records
-            old_records = db.query(MonitorHistory).filter(
-                MonitorHistory.recorded_at < cutoff_date
-            )
-            deleted_count = old_records.count()
-            old_records.delete(synchronize_session=False)
-            db.commit()
-            
-            logger.info(f"数据清理完成，删除了 {deleted_count} 条过期记录")
-            return deleted_count
-        except Exception as e:
-            db.rollback()
-            logger.error(f"数据清理失败: {e}")
-            raise
-        finally:
-            db.close()
+            await self.cleanup()
+        except Exception:
+            pass  # cleanup() 已记录日志和进度
+    
+    def _purge(self, cutoff_date: datetime) -> int:
+        """Delete expired samples through the history store (runs in a worker thread)."""
+        started = time.monotonic()
+        store = get_history_store()
+        self.progress = {
+            "running": True,
+            "store": store.name,
+            "cutoff": cutoff_date.isoformat(),
+            "started_at": utcnow().isoformat(),
+            "deleted": 0,
+            "partitions_dropped": 0,
+            "chunks": 0,
+            "percent": 0.0,
+        }
+        
+        def on_progress(deleted: int, percent: float) -> None:
+            self.progress.update(deleted=deleted, partitions_dropped=store.partitions_dropped,
+                                 chunks=self.progress["chunks"] + 1, percent=percent)
+            if self.progress["chunks"] % self.LOG_EVERY_CHUNKS == 0:
+                logger.info(f"数据清理进行中: {percent}%，已删除 {deleted} 条")
+        
+        deleted_count = store.purge(cutoff_date, self.chunk_size, self.chunk_pause, on_progress)
+        
+        # 逐传感器历史与原始数据使用同一保留期
+        sensor_count = purge_sensor_samples(cutoff_date, self.chunk_size, self.chunk_pause)
+        # 预聚合数据按各自档位的保留期清理
+        rollup_count = purge_rollups(engine)
+        # 结构化日志按独立的保留期清理
+        log_cutoff = utcnow() - timedelta(days=self._log_retention_days)
+        log_count = purge_log_records(log_cutoff, self.chunk_size, self.chunk_pause)
+        reclaimed = self._incremental_vacuum() if self.incremental_vacuum else 0
+        
+        elapsed = time.monotonic() - started
+        self.progress.update(
+            running=False, percent=100.0, partitions_dropped=store.partitions_dropped,
+            sensors_deleted=sensor_count,
+            rollups_deleted=rollup_count, logs_deleted=log_count,
+            pages_reclaimed=reclaimed, elapsed=round(elapsed, 2),
+        )
+        logger.info(
+            f"数据清理完成，删除了 {deleted_count} 条过期记录，{store.partitions_dropped} 个过期分区，"
+            f"{sensor_count} 条过期传感器读数，"
+            f"{rollup_count} 条过期聚合数据，"
+            f"{log_count} 条过期日志，"
+            f"归还 {reclaimed} 页，用时 {elapsed:.1f}秒"
+        )
+        return deleted_count
+    
+    def _incremental_vacuum(self) -> int:
+        """Return free pages to the OS in small steps; returns pages reclaimed."""
+        with engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                logger.debug("数据库未启用 auto_vacuum=INCREMENTAL，跳过空间回收")
+                return 0
+            before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            remaining = before
+            while remaining > 0:
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({self.VACUUM_PAGES_PER_STEP})")
+                conn.commit()
+                current = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+                if current >= remaining:
+                    break
+                remaining = current
+                if self.chunk_pause > 0:
+                    time.sleep(self.chunk_pause)
+            return before - remaining
     
     async def start(self) -> None:
         """Start the periodic cleanup task (runs daily at 3:00 AM)."""
@@ -0,0 +1,191 @@
+"""
+Replay a candidate fan curve over stored history, streaming in chunks.
+"""
+import time
+from bisect import bisect_right
+from datetime import datetime
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+
+from database import read_engine
+from services.fan_controller import CompiledCurve, np
+from services.history_store import get_history_store
+
+# 每次从数据库取出并计算的行数
+DEFAULT_CHUNK_ROWS = 50000
+# 相邻采样间隔超过该值视为数据中断，中断前的采样只计这么多秒
+MAX_SAMPLE_GAP = 600.0
+# 主机为空的旧数据按 0 号主机处理（与预聚合表一致）
+_NO_HOST = 0
+
+
+def _change_points(values: Sequence, include_first: bool) -> List[int]:
+    """与前一个值不同的位置；include_first 时位置 0 总算作变化"""
+    if np is not None and isinstance(values, np.ndarray):
+        points = (np.flatnonzero(values[1:] != values[:-1]) + 1).tolist()
+    else:
+        points = [i for i in range(1, len(values)) if values[i] != values[i - 1]]
+    if include_first and len(values):
+        points.insert(0, 0)
+    return points
+
+
+class SpeedTrack:
+    """一个转速序列的累计统计：每个转速的累计时长（秒）和变化次数"""
+
+    __slots__ = ("value", "seconds", "changes")
+
+    def __init__(self):
+        self.value: Optional[int] = None
+        self.seconds: Dict[int, float] = {}
+        self.changes = 0
+
+    def add(self, seconds: float) -> None:
+        if self.value is not None and seconds > 0:
+            self.seconds[self.value] = self.seconds.get(self.value, 0.0) + seconds
+
+    def advance(self, positions: List[int], values: List[int], cum: List[float]) -> None:
+        """按变化位置推进；cum[k] 为前 k 个采样的累计时长，最后一个采样的时长尚未确定"""
+        start = 0
+        for p, v in zip(positions, values):
+            self.add(cum[p] - cum[start])
+            if self.value is not None:
+                self.changes += 1
+            self.value, start = v, p
+        self.add(cum[-1] - cum[start])
+
+    def summary(self) -> Dict:
+        total = sum(self.seconds.values())
+        return {
+            "changes": self.changes,
+            "mean_speed": round(sum(s * t for s, t in self.seconds.items()) / total, 1) if total else None,
+            "histogram": {str(s): round(self.seconds[s], 1) for s in sorted(self.seconds)},
+        }
+
+
+class CurveReplay:
+    """把按 (主机, 时间) 排序的采样分块输入，计算候选曲线会下发的转速命令
+
+    与 MonitorService 的下发规则一致：目标转速与上次下发的转速相差小于 deadband 时
+    不发送（升到 100% 除外），生效转速保持上次下发的值。同时统计历史上实际的转速，
+    便于对比。
+    """
+
+    def __init__(self, curve: CompiledCurve, deadband: int, until_epoch: float):
+        self.curve = curve
+        self.deadband = deadband
+        self.until_epoch = until_epoch
+        self.samples = 0
+        self.commands = 0
+        self.candidate = SpeedTrack()
+        self.recorded = SpeedTrack()
+        self._host: Optional[int] = None
+        # 当前主机最后一个采样 (时间, 温度, 实际转速)，其时长要等下一个采样才能确定
+        self._pending: Optional[Tuple[float, float, int]] = None
+
+    def _end_host(self) -> None:
+        if self._pending is not None:
+            seconds = min(max(0.0, self.until_epoch - self._pending[0]), MAX_SAMPLE_GAP)
+            self.candidate.add(seconds)
+            self.recorded.add(seconds)
+        self._pending = None
+        self.candidate.value = self.recorded.value = None
+
+    def feed(self, hosts: Sequence[int], times: Sequence[float], temps: Sequence[float],
+             recorded: Sequence[int]) -> List[Tuple[int, float, int]]:
+        """输入一块采样，返回其中下发的命令 [(主机, 时间, 转速)]"""
+        commands = []
+        start, n = 0, len(times)
+        self.samples += n
+        while start < n:
+            host = hosts[start]
+            # 按主机排序，二分查找本主机这一段的结尾
+            stop = bisect_right(hosts, host, start)
+            if host != self._host:
+                self._end_host()
+                self._host = host
+            commands.extend((host, t, s) for t, s in self._feed_host(
+                times[start:stop], temps[start:stop], recorded[start:stop]
+            ))
+            start = stop
+        return commands
+
+    def _feed_host(self, times, temps, recorded) -> List[Tuple[float, int]]:
+        pending = self._pending
+        if pending is not None:
+            # 接上一块的最后一个采样：它已处理过，只补上时长
+            times = [pending[0], *times]
+            temps = [pending[1], *temps]
+            recorded = [pending[2], *recorded]
+        self._pending = (times[-1], temps[-1], recorded[-1])
+        if np is not None:
+            gaps = np.minimum(np.diff(np.asarray(times, dtype=np.float64)), MAX_SAMPLE_GAP)
+            cum = np.concatenate(([0.0], np.cumsum(gaps))).tolist()
+        else:
+            cum = [0.0, *accumulate(min(b - a, MAX_SAMPLE_GAP) for a, b in zip(times, times[1:]))]
+
+        speeds = self.curve.evaluate(temps)
+        commanded = self.candidate.value
+        positions, values = [], []
+        for p in _change_points(speeds, pending is None):
+            target = int(speeds[p])
+            if commanded is None or abs(target - commanded) >= self.deadband or target >= 100 > commanded:
+                positions.append(p)
+                values.append(target)
+                commanded = target
+        self.candidate.advance(positions, values, cum)
+        self.commands += len(positions)
+
+        if np is not None:
+            recorded = np.asarray(recorded)
+        recorded_positions = _change_points(recorded, pending is None)
+        self.recorded.advance(recorded_positions, [int(recorded[p]) for p in recorded_positions], cum)
+        return [(times[p], v) for p, v in zip(positions, values)]
+
+    def summary(self) -> Dict:
+        self._end_host()
+        candidate = self.candidate.summary()
+        return {
+            "samples": self.samples,
+            "commands": self.commands,
+            **candidate,
+            "recorded": self.recorded.summary(),
+        }
+
+
+def replay_curve(curve: CompiledCurve, since: datetime, until: datetime, host_id: Optional[int] = None,
+                 deadband: int = 0, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Dict]:
+    """在 [since, until) 的历史采样上回放曲线（与 query_history 的范围相同），逐块产出命令，最后产出汇总
+
+    产出 ``{"type": "commands", "data": [[主机, Unix 秒, 转速], ...]}``（只含有命令的块）
+    和最后一条 ``{"type": "summary", ...}``。内存占用只与块大小有关。
+    """
+    started = time.perf_counter()
+    samples = get_history_store().select_samples(since, until, host_id)
+    host = func.coalesce(samples.c.host_id, _NO_HOST)
+    epoch = (func.julianday(samples.c.recorded_at) - 2440587.5) * 86400.0
+    stmt = select(host, epoch, samples.c.cpu_temp, samples.c.fan_speed)
+    # 单台主机时按时间排序可直接沿 (host_id, recorded_at) 索引读取，无需额外排序
+    stmt = stmt.order_by(samples.c.recorded_at) if host_id is not None \
+        else stmt.order_by(host, samples.c.recorded_at)
+
+    replay = CurveReplay(curve, deadband, until.timestamp())
+    with read_engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_rows).execute(stmt)
+        for rows in result.partitions():
+            hosts, times, temps, recorded = zip(*rows)
+            commands = replay.feed(hosts, times, temps, recorded)
+            if commands:
+                yield {"type": "commands", "data": [[h, round(t, 3), s] for h, t, s in commands]}
+
+    yield {
+        "type": "summary",
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "host_id": host_id,
+        "deadband": deadband,
+        **replay.summary(),
+        "elapsed": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,197 @@
+"""
+Pluggable fan control strategies: plain curve, curve with hysteresis, PID.
+"""
+import inspect
+import logging
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, Union
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖，批量计算回落到逐点计算
+    np = None
+
+logger = logging.getLogger(__name__)
+
+Curve = List[Tuple[int, int]]
+
+DEFAULT_CONTROLLER = "curve"
+DEFAULT_SAFE_SPEED = 20  # 没有曲线时的默认安全转速
+
+# 转速变化小于该值（%）时不发送命令
+DEFAULT_SPEED_DEADBAND = 2
+# 即使转速不变，也至少每隔这么久重发一次，防止 BMC 自行恢复自动控制后失去控制
+COMMAND_REFRESH_INTERVAL = 300.0
+
+
+class CompiledCurve:
+    """编译后的风扇曲线（不可变）：按温度排序的拐点，单点查询用二分定位分段
+
+    结果与逐段扫描的线性插值完全一致（同样的浮点运算顺序和截断）：
+    两端取端点转速，温度为 NaN 时取最高温度点的转速。
+    """
+
+    __slots__ = ("points", "temps", "speeds", "_arrays")
+
+    def __init__(self, curve: Iterable[Tuple[float, int]]):
+        # sorted 是稳定排序，温度相同的拐点保持原顺序
+        self.points: Tuple[Tuple[float, int], ...] = tuple(sorted(curve, key=lambda p: p[0]))
+        self.temps = tuple(t for t, _ in self.points)
+        self.speeds = tuple(s for _, s in self.points)
+        self._arrays = None
+
+    def __iter__(self) -> Iterator[Tuple[float, int]]:
+        return iter(self.points)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CompiledCurve) and self.points == other.points
+
+    def __hash__(self) -> int:
+        return hash(self.points)
+
+    def __repr__(self) -> str:
+        return f"CompiledCurve({list(self.points)})"
+
+    def speed(self, temp: float) -> int:
+        """单个温度对应的转速"""
+        temps = self.temps
+        if not temps:
+            return DEFAULT_SAFE_SPEED
+        if temp <= temps[0]:
+            return self.speeds[0]
+        if not temp < temps[-1]:
+            return self.speeds[-1]
+        # temps[i] <= temp < temps[i + 1]，温度相同的拐点取最后一个
+        i = bisect_right(temps, temp) - 1
+        t0, t1 = temps[i], temps[i + 1]
+        s0, s1 = self.speeds[i], self.speeds[i + 1]
+        return int(s0 + (temp - t0) * (s1 - s0) / (t1 - t0))
+
+    __call__ = speed
+
+    def evaluate(self, temps: Iterable[float]) -> Sequence[int]:
+        """批量计算转速：安装了 numpy 时向量化计算并返回整数 ndarray，否则返回 list"""
+        if np is None or len(self.temps) < 2:
+            speed = self.speed
+            return [speed(t) for t in temps]
+        if self._arrays is None:
+            self._arrays = (np.asarray(self.temps, dtype=np.float64), np.asarray(self.speeds, dtype=np.float64))
+        t, s = self._arrays
+        x = np.asarray(temps, dtype=np.float64)
+        i = np.clip(np.searchsorted(t, x, side="right") - 1, 0, len(t) - 2)
+        t0, t1, s0, s1 = t[i], t[i + 1], s[i], s[i + 1]
+        # 超出两端的温度分段可能落在重复拐点上（除零），结果随后被端点值替换
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out = np.trunc(s0 + (x - t0) * (s1 - s0) / (t1 - t0))
+        out = np.where(x < t[-1], out, s[-1])
+        out = np.where(x <= t[0], s[0], out)
+        return out.astype(np.int64)
+
+
+def interpolate_curve(temp: float, curve: Union[CompiledCurve, Curve]) -> int:
+    """根据温度曲线计算风扇转速（线性插值，两端取端点值）"""
+    if not isinstance(curve, CompiledCurve):
+        curve = CompiledCurve(curve)
+    return curve.speed(temp)
+
+
+class FanController:
+    """风扇控制策略：每个采样给出目标转速；每台主机一个实例，可保存内部状态"""
+
+    name = ""
+
+    def compute(self, temp: float, curve: CompiledCurve, now: float) -> int:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """重新接管风扇或参数变化后清除内部状态"""
+
+
+class CurveController(FanController):
+    """按曲线插值（原有行为）"""
+
+    name = "curve"
+
+    def compute(self, temp: float, curve: CompiledCurve, now: float) -> int:
+        return curve.speed(temp)
+
+
+class HysteresisController(CurveController):
+    """曲线 + 回差：升速立即生效，降速要等温度比上次定速时低 hysteresis °C
+
+    温度在曲线拐点附近小幅抖动时转速不会来回跳变。
+    """
+
+    name = "hysteresis"
+
+    def __init__(self, hysteresis: float = 3.0):
+        self.hysteresis = hysteresis
+        self.reset()
+
+    def reset(self) -> None:
+        self._speed: Optional[int] = None
+        self._set_temp = 0.0
+
+    def compute(self, temp: float, curve: CompiledCurve, now: float) -> int:
+        target = curve.speed(temp)
+        if self._speed is None or target > self._speed or temp <= self._set_temp - self.hysteresis:
+            self._speed = target
+            self._set_temp = temp
+        return self._speed
+
+
+class PIDController(FanController):
+    """PID 控制：把温度稳定在 setpoint，输出限制在曲线最低转速到 100% 之间
+
+    积分项在输出饱和时停止累积（抗积分饱和）；微分项基于温度而非误差，
+    setpoint 修改时不会产生冲击。
+    """
+
+    name = "pid"
+
+    def __init__(self, setpoint: float = 65.0, kp: float = 2.0, ki: float = 0.02, kd: float = 20.0):
+        self.setpoint = setpoint
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.reset()
+
+    def reset(self) -> None:
+        self._integral = 0.0
+        self._last: Optional[Tuple[float, float]] = None  # (时间, 温度)
+
+    def compute(self, temp: float, curve: CompiledCurve, now: float) -> int:
+        low = min(curve.speeds, default=DEFAULT_SAFE_SPEED)
+        error = temp - self.setpoint
+        derivative = 0.0
+        dt = 0.0
+        if self._last is not None:
+            dt = max(0.0, now - self._last[0])
+            if dt > 0:
+                derivative = (temp - self._last[1]) / dt
+        self._last = (now, temp)
+
+        integral = self._integral + error * dt
+        output = low + self.kp * error + self.ki * integral + self.kd * derivative
+        # 输出未饱和，或积分变化使输出回到范围内时才累积
+        if low < output < 100 or (output >= 100 and error < 0) or (output <= low and error > 0):
+            self._integral = integral
+        return int(round(min(100.0, max(float(low), output))))
+
+
+CONTROLLERS: Dict[str, Type[FanController]] = {
+    CurveController.name: CurveController,
+    HysteresisController.name: HysteresisController,
+    PIDController.name: PIDController,
+}
+
+
+def create_controller(kind: Optional[str], **params) -> FanController:
+    """按名称创建控制器，未知名称使用默认控制器；params 中不属于该控制器的参数被忽略"""
+    controller_cls = CONTROLLERS.get(kind or DEFAULT_CONTROLLER)
+    if controller_cls is None:
+        logger.warning(f"未知的风扇控制器: {kind}，使用 {DEFAULT_CONTROLLER}")
+        controller_cls = CONTROLLERS[DEFAULT_CONTROLLER]
+    accepted = inspect.signature(controller_cls).parameters
+    return controller_cls(**{k: v for k, v in params.items() if k in accepted})
@@ -0,0 +1,122 @@
+"""
+Compact encodings for history responses: columnar JSON, packed binary, msgpack.
+"""
+import struct
+import sys
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from services.history_rollup import to_epoch
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+# 值列的顺序（二进制格式按此顺序排列；新列只追加在末尾，头部记录列数，
+# 只认识前几列的客户端仍可按列数跳过）
+VALUE_COLUMNS = (
+    "cpu_temp", "cpu_temp_min", "cpu_temp_max",
+    "fan_speed", "fan_speed_min", "fan_speed_max",
+    "power", "power_min", "power_max",
+    "poll_interval",
+)
+
+MEDIA_JSON = "application/json"
+MEDIA_COLUMNAR = "application/vnd.dfc.history+json"
+MEDIA_BINARY = "application/vnd.dfc.history+binary"
+MEDIA_MSGPACK = "application/msgpack"
+
+# format 查询参数 -> 媒体类型（浏览器中不便设置 Accept 时使用）
+FORMATS = {
+    "json": MEDIA_JSON,
+    "columnar": MEDIA_COLUMNAR,
+    "binary": MEDIA_BINARY,
+    "msgpack": MEDIA_MSGPACK,
+}
+
+# 二进制头：魔数、版本、值列数、保留、起始时间（Unix 秒）、点数；均为小端
+BINARY_MAGIC = b"DFCH"
+BINARY_VERSION = 1
+_BINARY_HEADER = struct.Struct("<4sBBHqI")
+
+
+def supported_media_types() -> List[str]:
+    types = [MEDIA_JSON, MEDIA_COLUMNAR, MEDIA_BINARY]
+    if msgpack is not None:
+        types.append(MEDIA_MSGPACK)
+    return types
+
+
+def negotiate(accept: Optional[str], fmt: Optional[str] = None) -> Optional[str]:
+    """选择响应格式：format 参数优先，其次按 Accept 中出现的顺序取第一个支持的类型
+
+    未指定或都不支持时返回 application/json（原有的逐点格式）；
+    显式 format 参数不受支持（如未安装 msgpack）时返回 None。
+    """
+    supported = supported_media_types()
+    if fmt:
+        media = FORMATS.get(fmt)
+        return media if media in supported else None
+    for part in (accept or "").split(","):
+        media = part.split(";", 1)[0].strip().lower()
+        if media in supported:
+            return media
+    return MEDIA_JSON
+
+
+def to_columnar(points: List[Dict], bucket_seconds: Optional[int] = None) -> Dict:
+    """逐点列表 -> 列式结构：时间为相对 start 的整数秒偏移，每个指标一个数组"""
+    epochs = [to_epoch(datetime.fromisoformat(p["time"])) for p in points]
+    start = epochs[0] if epochs else 0
+    columnar = {
+        "start": start,
+        "t": [e - start for e in epochs],
+    }
+    if bucket_seconds is not None:
+        columnar["bucket_seconds"] = bucket_seconds
+    for name in VALUE_COLUMNS:
+        columnar[name] = [p[name] for p in points]
+    return columnar
+
+
+def pack_binary(columnar: Dict) -> bytes:
+    """列式结构 -> 二进制
+
+    布局：头部（见 _BINARY_HEADER）、int32 时间偏移 × n、
+    然后 VALUE_COLUMNS 顺序的 float32 × n 各一列，缺失值为 NaN。
+    """
+    n = len(columnar["t"])
+    offsets = array("i", columnar["t"])
+    parts = [_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(VALUE_COLUMNS), 0, columnar["start"], n)]
+    columns = [offsets] + [
+        array("f", (float("nan") if v is None else v for v in columnar[name]))
+        for name in VALUE_COLUMNS
+    ]
+    for column in columns:
+        if sys.byteorder == "big":
+            column.byteswap()
+        parts.append(column.tobytes())
+    return b"".join(parts)
+
+
+def unpack_binary(data: bytes) -> Dict:
+    """pack_binary 的逆操作（供客户端参考和自检）"""
+    magic, version, column_count, _, start, n = _BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("不是受支持的历史数据二进制格式")
+    offset = _BINARY_HEADER.size
+    result = {"start": start}
+    for name, code in [("t", "i")] + [(name, "f") for name in VALUE_COLUMNS[:column_count]]:
+        column = array(code)
+        column.frombytes(data[offset:offset + n * column.itemsize])
+        if sys.byteorder == "big":
+            column.byteswap()
+        offset += n * column.itemsize
+        result[name] = column.tolist() if code == "i" else [None if v != v else v for v in column]
+    return result
+
+
+def pack_msgpack(columnar: Dict) -> bytes:
+    return msgpack.packb(columnar, use_bin_type=True)
@@ -0,0 +1,149 @@
+"""
+History queries with downsampling done inside SQLite.
+"""
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, cast, func
+from sqlalchemy.orm import Session
+
+from database import MonitorRollup
+from services.history_rollup import RollupTier, from_epoch, select_tier, to_epoch
+from services.history_store import get_history_store
+
+# 时间范围 -> (时长, 最大数据点数)
+HISTORY_RANGES: Dict[str, Tuple[timedelta, int]] = {
+    "1h": (timedelta(hours=1), 120),      # 约30秒一个点
+    "6h": (timedelta(hours=6), 180),      # 约2分钟一个点
+    "24h": (timedelta(hours=24), 288),    # 约5分钟一个点
+    "7d": (timedelta(days=7), 336),       # 约30分钟一个点
+    "30d": (timedelta(days=30), 360),     # 约2小时一个点
+    "90d": (timedelta(days=90), 360),     # 约6小时一个点
+    "365d": (timedelta(days=365), 365),   # 约1天一个点
+}
+DEFAULT_RANGE = "1h"
+
+
+def resolve_range(range_key: str) -> Tuple[timedelta, int]:
+    """返回时间范围对应的时长和默认点数，未知范围按 1h 处理"""
+    return HISTORY_RANGES.get(range_key, HISTORY_RANGES[DEFAULT_RANGE])
+
+
+def bucket_seconds_for(delta: timedelta, limit: int) -> int:
+    """按点数预算计算时间桶宽度（秒）"""
+    return max(1, math.ceil(delta.total_seconds() / max(1, limit)))
+
+
+def query_history(db: Session, since: datetime, until: datetime, limit: int,
+                  host_id: Optional[int] = None) -> List[Dict]:
+    """按时间桶聚合历史数据，最多返回 limit 个点
+
+    在 SQLite 中按 ``(epoch - since) // bucket`` 分组，每个桶返回首个采样时间和
+    各指标的 avg/min/max 以及平均轮询间隔，内存占用只与桶数有关，与窗口内的原始行数无关。
+    目标桶宽不小于某个预聚合档位时改查该档位（选最粗的一档），扫描行数再降一到两个数量级。
+    """
+    bucket_seconds = bucket_seconds_for(until - since, limit)
+    tier = select_tier(since, bucket_seconds, now=until)
+    if tier is not None:
+        return _query_rollup(db, tier, since, until, bucket_seconds, limit, host_id)
+
+    samples = get_history_store().select_samples(since, until, host_id)
+    epoch = cast(func.strftime('%s', samples.c.recorded_at), Integer)
+    bucket = ((epoch - int(since.timestamp())) // bucket_seconds).label("bucket")
+
+    query = db.query(
+        bucket,
+        func.min(samples.c.recorded_at).label("time"),
+        func.avg(samples.c.cpu_temp), func.min(samples.c.cpu_temp), func.max(samples.c.cpu_temp),
+        func.avg(samples.c.fan_speed), func.min(samples.c.fan_speed), func.max(samples.c.fan_speed),
+        func.avg(samples.c.power_consumption), func.min(samples.c.power_consumption),
+        func.max(samples.c.power_consumption),
+        func.count(), func.count(func.distinct(samples.c.host_id)),
+    )
+
+    rows = query.group_by(bucket).order_by(bucket).limit(limit).all()
+    span = bucket_span(since, until, bucket_seconds)
+    return [
+        {
+            "time": row[1].isoformat(),
+            "cpu_temp": _round(row[2]),
+            "cpu_temp_min": row[3],
+            "cpu_temp_max": row[4],
+            "fan_speed": _round(row[5]),
+            "fan_speed_min": row[6],
+            "fan_speed_max": row[7],
+            "power": _round(row[8]),
+            "power_min": row[9],
+            "power_max": row[10],
+            "poll_interval": poll_interval(span(row[0]), row[11], row[12]),
+        }
+        for row in rows
+    ]
+
+
+def _query_rollup(db: Session, tier: RollupTier, since: datetime, until: datetime,
+                  bucket_seconds: int, limit: int, host_id: Optional[int]) -> List[Dict]:
+    """在预聚合档位上再按目标桶宽合并；avg 由 sum/count 计算，保证与原始数据一致"""
+    since_epoch = to_epoch(since)
+    bucket = ((MonitorRollup.bucket_start - since_epoch) // bucket_seconds).label("bucket")
+    samples = func.sum(MonitorRollup.samples)
+    power_samples = func.sum(MonitorRollup.power_samples)
+
+    query = db.query(
+        bucket,
+        func.min(MonitorRollup.bucket_start),
+        func.sum(MonitorRollup.cpu_temp_sum) * 1.0 / samples,
+        func.min(MonitorRollup.cpu_temp_min), func.max(MonitorRollup.cpu_temp_max),
+        func.sum(MonitorRollup.fan_speed_sum) * 1.0 / samples,
+        func.min(MonitorRollup.fan_speed_min), func.max(MonitorRollup.fan_speed_max),
+        func.sum(MonitorRollup.power_sum) * 1.0 / func.nullif(power_samples, 0),
+        func.min(MonitorRollup.power_min), func.max(MonitorRollup.power_max),
+        samples, func.count(func.distinct(MonitorRollup.host_id)),
+    ).filter(
+        MonitorRollup.tier == tier.seconds,
+        # 只取完整落在窗口内的档位桶
+        MonitorRollup.bucket_start >= since_epoch,
+        MonitorRollup.bucket_start < to_epoch(until),
+    )
+    if host_id is not None:
+        query = query.filter(MonitorRollup.host_id == host_id)
+
+    rows = query.group_by(bucket).order_by(bucket).limit(limit).all()
+    span = bucket_span(since, until, bucket_seconds)
+    return [
+        {
+            "time": from_epoch(row[1]).isoformat(),
+            "cpu_temp": _round(row[2]),
+            "cpu_temp_min": row[3],
+            "cpu_temp_max": row[4],
+            "fan_speed": _round(row[5]),
+            "fan_speed_min": row[6],
+            "fan_speed_max": row[7],
+            "power": _round(row[8]),
+            "power_min": row[9],
+            "power_max": row[10],
+            "poll_interval": poll_interval(span(row[0]), row[11], row[12]),
+        }
+        for row in rows
+    ]
+
+
+def bucket_span(since: datetime, until: datetime, bucket_seconds: int):
+    """桶序号 -> 该桶在查询窗口内的时长（最后一个桶可能被 until 截断）"""
+    remaining = (until - since).total_seconds()
+    return lambda bucket: max(1.0, min(bucket_seconds, remaining - bucket * bucket_seconds))
+
+
+def poll_interval(span: float, samples: int, hosts: int) -> Optional[float]:
+    """桶内每台主机的平均轮询间隔（秒）：时长 * 主机数 / 采样数
+
+    自适应轮询时反映该时段实际的采样密度；主机离线的时段会使间隔偏大。
+    """
+    if not samples:
+        return None
+    return round(span * max(1, hosts) / samples, 1)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
@@ -0,0 +1,239 @@
+"""
+Pre-aggregated history rollups (1m / 5m / 1h) kept alongside the raw samples.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+
+from database import MonitorRollup, as_utc, utcnow
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RollupTier:
+    name: str
+    seconds: int          # 桶宽度
+    retention_days: int   # 该档位数据保留天数
+
+
+# 从细到粗排列；原始数据的保留期由 retention_days 设置决定
+ROLLUP_TIERS: Tuple[RollupTier, ...] = (
+    RollupTier("1m", 60, 30),
+    RollupTier("5m", 300, 180),
+    RollupTier("1h", 3600, 3650),
+)
+
+# 回填进度保存在 settings 表：截止点（之后的数据由写入线程增量聚合）和当前游标
+BACKFILL_UNTIL_KEY = "rollup_backfill_until"
+BACKFILL_CURSOR_KEY = "rollup_backfill_cursor"
+# 回填时每条 INSERT ... SELECT 覆盖的时间跨度，避免长时间持有写锁
+BACKFILL_CHUNK = timedelta(days=7)
+
+
+def to_epoch(value: datetime) -> int:
+    """datetime -> Unix 秒；数据库读出的无时区时间按 UTC 处理"""
+    return int(as_utc(value).timestamp())
+
+
+def from_epoch(epoch: int) -> datetime:
+    """Unix 秒 -> 无时区 UTC 时间，与 monitor_history 读出的格式一致"""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _upsert_statement():
+    """按 (tier, host_id, bucket_start) 合并：sum/count 累加，min/max 取极值"""
+    stmt = sqlite_insert(MonitorRollup.__table__)
+    ex = stmt.excluded
+    table = MonitorRollup.__table__.c
+
+    def least(column, new):
+        # SQLite 的多参数 min()/max() 遇到 NULL 返回 NULL，功率可能缺失，需先 coalesce
+        return func.min(func.coalesce(column, new), func.coalesce(new, column))
+
+    def greatest(column, new):
+        return func.max(func.coalesce(column, new), func.coalesce(new, column))
+
+    return stmt.on_conflict_do_update(
+        index_elements=["tier", "host_id", "bucket_start"],
+        set_={
+            "samples": table.samples + ex.samples,
+            "cpu_temp_sum": table.cpu_temp_sum + ex.cpu_temp_sum,
+            "cpu_temp_min": least(table.cpu_temp_min, ex.cpu_temp_min),
+            "cpu_temp_max": greatest(table.cpu_temp_max, ex.cpu_temp_max),
+            "fan_speed_sum": table.fan_speed_sum + ex.fan_speed_sum,
+            "fan_speed_min": least(table.fan_speed_min, ex.fan_speed_min),
+            "fan_speed_max": greatest(table.fan_speed_max, ex.fan_speed_max),
+            "power_samples": table.power_samples + ex.power_samples,
+            "power_sum": func.coalesce(table.power_sum, 0) + func.coalesce(ex.power_sum, 0),
+            "power_min": least(table.power_min, ex.power_min),
+            "power_max": greatest(table.power_max, ex.power_max),
+        },
+    )
+
+
+def aggregate_rows(rows: Iterable[Dict]) -> List[Dict]:
+    """把一批原始采样聚合成各档位的桶（每个 (档位, 主机, 桶) 一行）"""
+    buckets: Dict[Tuple[int, int, int], Dict] = {}
+    for row in rows:
+        epoch = to_epoch(row["recorded_at"])
+        host_id = row["host_id"] or 0
+        cpu, fan, power = row["cpu_temp"], row["fan_speed"], row["power_consumption"]
+        for tier in ROLLUP_TIERS:
+            start = epoch - epoch % tier.seconds
+            agg = buckets.get((tier.seconds, host_id, start))
+            if agg is None:
+                buckets[(tier.seconds, host_id, start)] = {
+                    "tier": tier.seconds, "host_id": host_id, "bucket_start": start, "samples": 1,
+                    "cpu_temp_sum": cpu, "cpu_temp_min": cpu, "cpu_temp_max": cpu,
+                    "fan_speed_sum": fan, "fan_speed_min": fan, "fan_speed_max": fan,
+                    "power_samples": 0 if power is None else 1,
+                    "power_sum": power, "power_min": power, "power_max": power,
+                }
+                continue
+            agg["samples"] += 1
+            agg["cpu_temp_sum"] += cpu
+            agg["cpu_temp_min"] = min(agg["cpu_temp_min"], cpu)
+            agg["cpu_temp_max"] = max(agg["cpu_temp_max"], cpu)
+            agg["fan_speed_sum"] += fan
+            agg["fan_speed_min"] = min(agg["fan_speed_min"], fan)
+            agg["fan_speed_max"] = max(agg["fan_speed_max"], fan)
+            if power is not None:
+                agg["power_samples"] += 1
+                if agg["power_sum"] is None:
+                    agg["power_sum"] = agg["power_min"] = agg["power_max"] = power
+                else:
+                    agg["power_sum"] += power
+                    agg["power_min"] = min(agg["power_min"], power)
+                    agg["power_max"] = max(agg["power_max"], power)
+    return list(buckets.values())
+
+
+def apply_rollups(conn: Connection, rows: List[Dict]) -> None:
+    """在调用方的事务内把一批新写入的原始采样合并到各档位"""
+    aggregated = aggregate_rows(rows)
+    if aggregated:
+        conn.execute(_upsert_statement(), aggregated)
+
+
+# 回填：由原始数据直接在 SQLite 内聚合，结果同样走 upsert 合并
+_BACKFILL_SQL = text("""
+    INSERT INTO monitor_rollup (
+        tier, host_id, bucket_start, samples,
+        cpu_temp_sum, cpu_temp_min, cpu_temp_max,
+        fan_speed_sum, fan_speed_min, fan_speed_max,
+        power_samples, power_sum, power_min, power_max
+    )
+    SELECT :tier, COALESCE(host_id, 0),
+           (CAST(strftime('%s', recorded_at) AS INTEGER) / :tier) * :tier AS bucket_start,
+           count(*), sum(cpu_temp), min(cpu_temp), max(cpu_temp),
+           sum(fan_speed), min(fan_speed), max(fan_speed),
+           count(power_consumption), sum(power_consumption), min(power_consumption), max(power_consumption)
+    FROM monitor_history
+    WHERE recorded_at >= :since AND recorded_at < :until
+    GROUP BY COALESCE(host_id, 0), bucket_start
+    ON CONFLICT (tier, host_id, bucket_start) DO UPDATE SET
+        samples = samples + excluded.samples,
+        cpu_temp_sum = cpu_temp_sum + excluded.cpu_temp_sum,
+        cpu_temp_min = min(cpu_temp_min, excluded.cpu_temp_min),
+        cpu_temp_max = max(cpu_temp_max, excluded.cpu_temp_max),
+        fan_speed_sum = fan_speed_sum + excluded.fan_speed_sum,
+        fan_speed_min = min(fan_speed_min, excluded.fan_speed_min),
+        fan_speed_max = max(fan_speed_max, excluded.fan_speed_max),
+        power_samples = power_samples + excluded.power_samples,
+        power_sum = COALESCE(power_sum, 0) + COALESCE(excluded.power_sum, 0),
+        power_min = min(COALESCE(power_min, excluded.power_min), COALESCE(excluded.power_min, power_min)),
+        power_max = max(COALESCE(power_max, excluded.power_max), COALESCE(excluded.power_max, power_max))
+""")
+
+
+def _sqlite_time(value: datetime) -> str:
+    """与 SQLAlchemy 写入 monitor_history.recorded_at 的字符串格式一致"""
+    return as_utc(value).replace(tzinfo=None).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _set_setting(conn: Connection, key: str, value: str) -> None:
+    conn.execute(
+        text("INSERT INTO settings (key, value) VALUES (:key, :value) "
+             "ON CONFLICT (key) DO UPDATE SET value = excluded.value"),
+        {"key": key, "value": value},
+    )
+
+
+def backfill_rollups(engine: Engine, until: Optional[datetime] = None) -> int:
+    """用已有原始数据回填各档位
+
+    只回填 ``until`` 之前的原始数据，之后的采样由 HistoryWriter 增量合并；
+    两部分的行集合不相交，落在同一个桶里时 upsert 会把它们累加，结果准确。
+    调用方应在写入线程启动前取得 ``until``（默认当前时间）。
+
+    首次运行时记录截止点，之后按块推进游标，游标与该块的聚合在同一事务中
+    提交，进程中途退出后重启会从游标处继续，不会重复累加。
+
+    Returns:
+        本次处理的时间块数，已回填完成返回 0。
+    """
+    with engine.begin() as conn:
+        state = dict(conn.execute(
+            text("SELECT key, value FROM settings WHERE key IN (:until_key, :cursor_key)"),
+            {"until_key": BACKFILL_UNTIL_KEY, "cursor_key": BACKFILL_CURSOR_KEY},
+        ).all())
+        if BACKFILL_UNTIL_KEY not in state:
+            first = conn.execute(text("SELECT min(recorded_at) FROM monitor_history")).scalar()
+            state[BACKFILL_UNTIL_KEY] = _sqlite_time(until or utcnow())
+            state[BACKFILL_CURSOR_KEY] = str(first) if first is not None else state[BACKFILL_UNTIL_KEY]
+            _set_setting(conn, BACKFILL_UNTIL_KEY, state[BACKFILL_UNTIL_KEY])
+            _set_setting(conn, BACKFILL_CURSOR_KEY, state[BACKFILL_CURSOR_KEY])
+
+    target = datetime.fromisoformat(state[BACKFILL_UNTIL_KEY])
+    cursor = datetime.fromisoformat(state[BACKFILL_CURSOR_KEY])
+    chunks = 0
+    while cursor < target:
+        end = min(cursor + BACKFILL_CHUNK, target)
+        with engine.begin() as conn:
+            for tier in ROLLUP_TIERS:
+                conn.execute(_BACKFILL_SQL, {
+                    "tier": tier.seconds, "since": _sqlite_time(cursor), "until": _sqlite_time(end),
+                })
+            _set_setting(conn, BACKFILL_CURSOR_KEY, _sqlite_time(end))
+        chunks += 1
+        cursor = end
+
+    if chunks:
+        logger.info(f"历史数据预聚合回填完成，共 {chunks} 个时间块")
+    return chunks
+
+
+def purge_rollups(engine: Engine, now: Optional[datetime] = None) -> int:
+    """按各档位的保留期删除过期的聚合数据，返回删除行数"""
+    now = now or utcnow()
+    deleted = 0
+    with engine.begin() as conn:
+        for tier in ROLLUP_TIERS:
+            cutoff = to_epoch(now - timedelta(days=tier.retention_days))
+            result = conn.execute(
+                MonitorRollup.__table__.delete().where(
+                    MonitorRollup.tier == tier.seconds,
+                    MonitorRollup.bucket_start < cutoff,
+                )
+            )
+            deleted += result.rowcount or 0
+    return deleted
+
+
+def select_tier(since: datetime, bucket_seconds: int, now: Optional[datetime] = None) -> Optional[RollupTier]:
+    """选出满足点数预算的最粗档位：桶宽度不超过目标桶宽，且保留期覆盖查询起点
+
+    返回 None 表示应直接查询原始数据。
+    """
+    now = now or utcnow()
+    chosen = None
+    for tier in ROLLUP_TIERS:
+        if tier.seconds <= bucket_seconds and since >= now - timedelta(days=tier.retention_days):
+            chosen = tier
+    return chosen
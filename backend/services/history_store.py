@@ -0,0 +1,290 @@
+"""
+Pluggable storage for raw history samples: a single table or time partitions.
+"""
+import logging
+import re
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import (
+    Column, DateTime, Float, Index, Integer, MetaData, Table, func, select, text, union_all,
+)
+from sqlalchemy.engine import Connection
+
+from database import MonitorHistory, as_utc, engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_STORE = "table"
+
+# 清理进度回调：(已删除行数, 完成百分比)
+ProgressCallback = Callable[[int, float], None]
+
+
+def purge_table_in_chunks(table: Table, cutoff: datetime, chunk_size: int, chunk_pause: float,
+                          on_progress: Optional[ProgressCallback] = None) -> int:
+    """按主键范围分块删除 recorded_at < cutoff 的行，块间让出写锁
+
+    主键随写入时间递增，过期数据集中在一段连续的 id 区间内，每块是一个短事务。
+    """
+    with engine.connect() as conn:
+        low, high = conn.execute(
+            select(func.min(table.c.id), func.max(table.c.id)).where(table.c.recorded_at < cutoff)
+        ).one()
+    if low is None:
+        return 0
+
+    deleted = 0
+    span = high - low + 1
+    start_id = low
+    while start_id <= high:
+        end_id = min(start_id + chunk_size, high + 1)
+        with engine.begin() as conn:
+            result = conn.execute(
+                table.delete().where(
+                    table.c.id >= start_id,
+                    table.c.id < end_id,
+                    table.c.recorded_at < cutoff,
+                )
+            )
+        deleted += result.rowcount or 0
+        start_id = end_id
+        if on_progress:
+            on_progress(deleted, round((start_id - low) * 100 / span, 1))
+        if start_id <= high and chunk_pause > 0:
+            time.sleep(chunk_pause)
+    return deleted
+
+
+class HistoryStore:
+    """原始历史采样的存储后端
+
+    写入线程在事务内调用 ``insert``、提交后调用 ``register``，历史查询通过 ``select_samples`` 取得数据源，
+    数据清理调用 ``purge``。子类决定数据落在哪些表中。
+    """
+
+    name = ""
+    # 最近一次清理整表删除的分区数（只有分区存储会删除分区）
+    partitions_dropped = 0
+
+    def refresh(self) -> None:
+        """启动时从数据库加载存储结构（分区列表等）"""
+
+    def insert(self, conn: Connection, rows: List[Dict]) -> List[str]:
+        """在调用方的事务内写入，返回本次新建的表名"""
+        raise NotImplementedError
+
+    def register(self, created: List[str]) -> None:
+        """事务提交后登记 insert 新建的表（回滚时不调用，查询不会引用不存在的表）"""
+
+    def tables_for(self, since: datetime, until: datetime) -> List[Table]:
+        """与 [since, until) 有交集的表"""
+        raise NotImplementedError
+
+    def select_samples(self, since: datetime, until: datetime, host_id: Optional[int] = None):
+        """返回 [since, until) 内原始采样的子查询，列与 monitor_history 相同（不含 id）
+
+        多张表时用 UNION ALL 拼接，时间和主机条件下推到每张表以使用索引。
+        """
+        selects = []
+        for table in self.tables_for(since, until):
+            stmt = select(
+                table.c.host_id, table.c.cpu_temp, table.c.fan_speed,
+                table.c.power_consumption, table.c.recorded_at,
+            ).where(table.c.recorded_at >= since, table.c.recorded_at < until)
+            if host_id is not None:
+                stmt = stmt.where(table.c.host_id == host_id)
+            selects.append(stmt)
+        if len(selects) == 1:
+            return selects[0].subquery("samples")
+        return union_all(*selects).subquery("samples")
+
+    def purge(self, cutoff: datetime, chunk_size: int, chunk_pause: float,
+              on_progress: Optional[ProgressCallback] = None) -> int:
+        """删除 cutoff 之前的数据，返回逐行删除的行数（整表删除的分区记入 partitions_dropped）"""
+        raise NotImplementedError
+
+
+class TableHistoryStore(HistoryStore):
+    """所有采样写入 monitor_history 一张表，过期数据分块 DELETE"""
+
+    name = "table"
+
+    def insert(self, conn: Connection, rows: List[Dict]) -> List[str]:
+        conn.execute(MonitorHistory.__table__.insert(), rows)
+        return []
+
+    def tables_for(self, since: datetime, until: datetime) -> List[Table]:
+        return [MonitorHistory.__table__]
+
+    def purge(self, cutoff: datetime, chunk_size: int, chunk_pause: float,
+              on_progress: Optional[ProgressCallback] = None) -> int:
+        return purge_table_in_chunks(MonitorHistory.__table__, cutoff, chunk_size, chunk_pause, on_progress)
+
+
+class PartitionedHistoryStore(HistoryStore):
+    """按时间分区：每个分区一张表（monitor_history_d20240101 / monitor_history_w20240101）
+
+    写入和查询只触及相关分区，过期数据整表 DROP，插入和清理的开销不随保留期增长。
+    分区按 UTC 日期对齐，周分区从周一开始。一个分区在其全部时间范围过期后才会被删除，
+    因此数据最多比保留期多留一个分区跨度（查询按时间过滤，不受影响）。
+
+    切换分区粒度或从单表切换过来时，已有的分区和 monitor_history 中的旧数据
+    仍会被查询和清理，无需迁移。
+    """
+
+    span_days = 1
+    prefix = "monitor_history_d"
+
+    # 所有分区表名（含其他粒度）：前缀字母 -> 跨度天数
+    _PARTITION_NAME = re.compile(r"^monitor_history_([dw])(\d{8})$")
+    _SPAN_BY_KIND = {"d": 1, "w": 7}
+
+    def __init__(self):
+        self._metadata = MetaData()
+        self._lock = threading.Lock()
+        # 表名 -> (分区起始日期, 跨度天数)
+        self._partitions: Dict[str, Tuple[date, int]] = {}
+        self._tables: Dict[str, Table] = {}
+
+    def _table(self, name: str) -> Table:
+        table = self._tables.get(name)
+        if table is not None:
+            return table
+        with self._lock:
+            if name in self._tables:
+                return self._tables[name]
+            table = Table(
+                name, self._metadata,
+                Column("id", Integer, primary_key=True),
+                Column("host_id", Integer),
+                Column("cpu_temp", Float, nullable=False),
+                Column("fan_speed", Integer, nullable=False),
+                Column("power_consumption", Integer),
+                Column("recorded_at", DateTime, nullable=False),
+                Index(f"ix_{name}_host_time", "host_id", "recorded_at"),
+                Index(f"ix_{name}_recorded_at", "recorded_at"),
+            )
+            self._tables[name] = table
+        return table
+
+    def partition_start(self, value: datetime) -> date:
+        day = as_utc(value).date()
+        return day - timedelta(days=day.weekday()) if self.span_days == 7 else day
+
+    def partition_name(self, start: date) -> str:
+        return f"{self.prefix}{start:%Y%m%d}"
+
+    def refresh(self) -> None:
+        with engine.connect() as conn:
+            names = conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'monitor_history_%'")
+            ).scalars().all()
+        partitions = {}
+        for name in names:
+            partition = self._parse(name)
+            if partition:
+                partitions[name] = partition
+        with self._lock:
+            self._partitions = partitions
+        logger.info(f"历史数据分区存储（{self.name}）已加载 {len(partitions)} 个分区")
+
+    def _parse(self, name: str) -> Optional[Tuple[date, int]]:
+        """分区表名 -> (起始日期, 跨度天数)，不是分区表时返回 None"""
+        match = self._PARTITION_NAME.match(name)
+        if not match:
+            return None
+        return datetime.strptime(match.group(2), "%Y%m%d").date(), self._SPAN_BY_KIND[match.group(1)]
+
+    def insert(self, conn: Connection, rows: List[Dict]) -> List[str]:
+        by_partition: Dict[date, List[Dict]] = {}
+        for row in rows:
+            by_partition.setdefault(self.partition_start(row["recorded_at"]), []).append(row)
+        created = []
+        for start, part_rows in by_partition.items():
+            name = self.partition_name(start)
+            table = self._table(name)
+            # 每批都检查：建表与写入同属调用方的事务，事务回滚时表也不存在，
+            # 因此新分区等提交后由 register 登记
+            table.create(conn, checkfirst=True)
+            if name not in self._partitions:
+                created.append(name)
+            conn.execute(table.insert(), part_rows)
+        return created
+
+    def register(self, created: List[str]) -> None:
+        new = {name: self._parse(name) for name in created if name not in self._partitions}
+        if new:
+            with self._lock:
+                self._partitions = {**self._partitions, **new}
+
+    def tables_for(self, since: datetime, until: datetime) -> List[Table]:
+        since_day, until_day = as_utc(since).date(), as_utc(until).date()
+        # 从单表切换过来时的旧数据（空表时只是一次索引探测）
+        tables = [MonitorHistory.__table__]
+        for name, (start, span) in sorted(self._partitions.items(), key=lambda item: item[1][0]):
+            if start <= until_day and start + timedelta(days=span) > since_day:
+                tables.append(self._table(name))
+        return tables
+
+    def purge(self, cutoff: datetime, chunk_size: int, chunk_pause: float,
+              on_progress: Optional[ProgressCallback] = None) -> int:
+        cutoff = as_utc(cutoff)
+        expired = [
+            name for name, (start, span) in self._partitions.items()
+            if datetime.combine(start + timedelta(days=span), dt_time(), tzinfo=timezone.utc) <= cutoff
+        ]
+        self.partitions_dropped = 0
+        deleted = purge_table_in_chunks(MonitorHistory.__table__, cutoff, chunk_size, chunk_pause)
+        # 只统计删除的分区数：为报告行数而 count(*) 会扫描整个分区，抵消整表删除的意义
+        for index, name in enumerate(sorted(expired), start=1):
+            with engine.begin() as conn:
+                conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+            self.partitions_dropped = index
+            with self._lock:
+                self._partitions = {k: v for k, v in self._partitions.items() if k != name}
+            if on_progress:
+                on_progress(deleted, round(index * 100 / len(expired), 1))
+            logger.info(f"已删除过期历史分区 {name}")
+        return deleted
+
+
+class DailyHistoryStore(PartitionedHistoryStore):
+    name = "daily"
+    span_days = 1
+    prefix = "monitor_history_d"
+
+
+class WeeklyHistoryStore(PartitionedHistoryStore):
+    name = "weekly"
+    span_days = 7
+    prefix = "monitor_history_w"
+
+
+HISTORY_STORES: Dict[str, Type[HistoryStore]] = {
+    TableHistoryStore.name: TableHistoryStore,
+    DailyHistoryStore.name: DailyHistoryStore,
+    WeeklyHistoryStore.name: WeeklyHistoryStore,
+}
+
+_store: HistoryStore = TableHistoryStore()
+
+
+def get_history_store() -> HistoryStore:
+    """当前使用的历史存储"""
+    return _store
+
+
+def configure_history_store(kind: Optional[str]) -> HistoryStore:
+    """按名称切换历史存储（启动时调用），未知名称使用默认存储"""
+    global _store
+    store_cls = HISTORY_STORES.get(kind or DEFAULT_HISTORY_STORE)
+    if store_cls is None:
+        logger.warning(f"未知的历史存储方式: {kind}，使用 {DEFAULT_HISTORY_STORE}")
+        store_cls = HISTORY_STORES[DEFAULT_HISTORY_STORE]
+    store = store_cls()
+    store.refresh()
+    _store = store
+    return store
@@ -0,0 +1,160 @@
+"""
+Write-behind batching for MonitorHistory samples.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from database import engine, utcnow
+from services.history_rollup import apply_rollups
+from services.history_store import get_history_store
+from services.sensor_backend import SensorReading
+from services.sensor_store import insert_sensor_samples, reset_sensor_ids
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    """历史采样先放入内存缓冲，由写入线程批量写入数据库
+
+    攒够 batch_size 条或首条等待超过 flush_interval 秒时，在一个事务内写入原始数据、
+    预聚合档位和逐传感器读数。缓冲上限为 max_pending，满时 submit 等待而不是继续占用内存。
+    """
+
+    DEFAULT_BATCH_SIZE = 500
+    DEFAULT_FLUSH_INTERVAL = 2.0
+    DEFAULT_MAX_PENDING = 20000
+
+    # 缓冲区满时 submit 的轮询间隔（秒）
+    BACKPRESSURE_POLL = 0.01
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_pending)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"written": 0, "batches": 0, "failed": 0, "backpressure_waits": 0}
+
+    @property
+    def pending(self) -> int:
+        """等待写入的采样数"""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """启动写入线程（重复调用无副作用）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"历史数据写入线程已启动，批量: {self.batch_size}，刷新间隔: {self.flush_interval}秒")
+
+    async def stop(self) -> None:
+        """写完缓冲中的全部采样后停止写入线程"""
+        if not self._thread:
+            return
+        self._stop_event.set()
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+        logger.info(f"历史数据写入线程已停止，累计写入 {self.stats['written']} 条")
+
+    @staticmethod
+    def _row(host_id: Optional[int], cpu_temp: float, fan_speed: int, power: int,
+             recorded_at: Optional[datetime], sensors: Optional[Sequence[SensorReading]]) -> Dict:
+        row = {
+            "host_id": host_id,
+            "cpu_temp": cpu_temp,
+            "fan_speed": fan_speed,
+            "power_consumption": power,
+            "recorded_at": recorded_at or utcnow(),
+        }
+        if sensors:
+            row["sensors"] = sensors
+        return row
+
+    def submit_nowait(self, host_id: Optional[int], cpu_temp: float, fan_speed: int, power: int,
+                      recorded_at: Optional[datetime] = None,
+                      sensors: Optional[Sequence[SensorReading]] = None) -> bool:
+        """不等待地加入缓冲，缓冲已满时返回 False"""
+        try:
+            self._queue.put_nowait(self._row(host_id, cpu_temp, fan_speed, power, recorded_at, sensors))
+            return True
+        except queue.Full:
+            return False
+
+    async def submit(self, host_id: Optional[int], cpu_temp: float, fan_speed: int, power: int,
+                     recorded_at: Optional[datetime] = None,
+                     sensors: Optional[Sequence[SensorReading]] = None) -> None:
+        """加入缓冲（可附带逐传感器读数），缓冲已满时等待"""
+        row = self._row(host_id, cpu_temp, fan_speed, power, recorded_at, sensors)
+        while True:
+            try:
+                self._queue.put_nowait(row)
+                return
+            except queue.Full:
+                self.stats["backpressure_waits"] += 1
+                await asyncio.sleep(self.BACKPRESSURE_POLL)
+
+    def _run(self) -> None:
+        """写入线程主循环：攒一批、写一批"""
+        while True:
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+            elif self._stop_event.is_set():
+                break
+
+    def _collect_batch(self) -> List[Dict]:
+        """等到第一条采样后继续收集，直到达到批量大小或刷新间隔"""
+        batch: List[Dict] = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                timeout = 0.2
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            if self._stop_event.is_set():
+                timeout = 0
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                if deadline is None and not self._stop_event.is_set():
+                    continue
+                break
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _write(self, batch: List[Dict]) -> None:
+        """在一个事务内写入原始数据、预聚合和传感器读数（失败重试一次）"""
+        sensors = [(row["host_id"], row["recorded_at"], row.pop("sensors")) for row in batch if "sensors" in row]
+        for attempt in range(2):
+            try:
+                store = get_history_store()
+                with engine.begin() as conn:
+                    created = store.insert(conn, batch)
+                    apply_rollups(conn, batch)
+                    if sensors:
+                        insert_sensor_samples(conn, sensors)
+                store.register(created)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except Exception as e:
+                # 回滚后缓存中本次新建的传感器 id 不再有效
+                reset_sensor_ids()
+                if attempt == 0:
+                    logger.warning(f"历史数据批量写入失败，重试中: {e}")
+                    time.sleep(0.5)
+                else:
+                    self.stats["failed"] += len(batch)
+                    logger.error(f"历史数据批量写入失败，丢弃 {len(batch)} 条: {e}")
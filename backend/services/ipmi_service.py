@@ -1,73 +1,47 @@
-import asyncio
-import subprocess
-import re
 import logging
 from typing import Optional
-from dataclasses import dataclass
 
-logger = logging.getLogger(__name__)
+from services.circuit_breaker import CircuitBreaker
+from services.ipmi_transport import IPMICommandError, IPMITransport, create_transport
+from services.sensor_backend import HardwareStatus, SensorBackend, create_sensor_backend
 
-@dataclass
-class HardwareStatus:
-    cpu_temp: float
-    power: int
+logger = logging.getLogger(__name__)
 
 class IPMIService:
-    def __init__(self, ip: str, username: str, password: str):
+    def __init__(self, ip: str, username: str, password: str,
+                 transport: Optional[str] = None, sensor_backend: Optional[str] = None,
+                 port: int = 623):
         self.ip = ip
         self.username = username
         self.password = password
         self._manual_control = False
+        # 风扇控制命令经由可插拔的传输层发送（默认复用常驻 ipmitool shell 会话）
+        self.transport: IPMITransport = create_transport(
+            transport, ip, username, password, port=port
+        )
+        # 传感器读取后端（racadm 全量读取 / SDR 缓存定向读取）
+        self.sensors: SensorBackend = create_sensor_backend(
+            sensor_backend, ip, username, password, self.transport
+        )
+        # 熔断器：BMC 连续失败时快速失败；超时按观测到的 p99 延迟自适应。
+        # 完成码错误和输出中缺少数据说明 BMC 有响应，不计为故障
+        self.breaker = CircuitBreaker(ip, ignored=(IPMICommandError, ValueError))
+        # 有熔断器兜底，读取失败只重试一次
+        self.sensors.max_retries = 2
     
-    async def _run_command(self, command: list, max_retries: int = 3) -> str:
-        """异步执行命令，带重试机制"""
-        for attempt in range(max_retries):
-            try:
-                proc = await asyncio.create_subprocess_exec(
-                    *command,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=15)
-                
-                if proc.returncode == 0:
-                    return stdout.decode()
-                
-                logger.warning(f"命令执行失败 (尝试 {attempt + 1}/{max_retries}): {stderr.decode()}")
-            except asyncio.TimeoutError:
-                logger.warning(f"命令超时 (尝试 {attempt + 1}/{max_retries})")
-            
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)
-        
-        raise RuntimeError(f"命令执行失败: {' '.join(command)}")
+    async def _guarded(self, op: str, fn, *args):
+        """经熔断器调用 BMC，超时取该类调用的自适应超时"""
+        self.transport.timeout = self.sensors.timeout = self.breaker.timeout(op)
+        return await self.breaker.call(op, fn, *args)
 
-    async def get_hardware_status(self) -> HardwareStatus:
-        """获取硬件状态"""
-        data = await self._run_command([
-            'racadm', '-r', self.ip, '-u', self.username, '-p', self.password,
-            'getsensorinfo'
-        ])
-        
-        cpu_temps = [int(m.group(1)) for m in re.finditer(r"CPU\d Temp\s+Ok\s+(\d+)C", data)]
-        if not cpu_temps:
-            raise ValueError("未找到有效的CPU温度数据")
-        
-        power_match = re.search(r"System Board Pwr Consumption\s+Ok\s+(\d+)Watts", data)
-        
-        return HardwareStatus(
-            cpu_temp=sum(cpu_temps) / len(cpu_temps),
-            power=int(power_match.group(1)) if power_match else 0
-        )
+    async def get_hardware_status(self, all_sensors: bool = True) -> HardwareStatus:
+        """获取硬件状态（all_sensors 为 False 时只读取控制需要的传感器）"""
+        return await self._guarded("sensors", self.sensors.read, all_sensors)
     
     async def enable_manual_control(self) -> bool:
         """启用手动风扇控制"""
         try:
-            await self._run_command([
-                'ipmitool', '-I', 'lanplus', '-H', self.ip,
-                '-U', self.username, '-P', self.password,
-                'raw', '0x30', '0x30', '0x01', '0x00'
-            ])
+            await self._guarded("command", self.transport.raw, 0x30, 0x30, bytes([0x01, 0x00]))
             self._manual_control = True
             logger.info("已启用手动风扇控制")
             return True
@@ -76,13 +50,9 @@ class IPMIService:
             return False
     
     async def disable_manual_control(self) -> bool:
-        """恢复自动风扇控制"""
+        """恢复自动风扇控制（不经过熔断器：即使 BMC 状态不佳也要尽量交还控制权）"""
         try:
-            await self._run_command([
-                'ipmitool', '-I', 'lanplus', '-H', self.ip,
-                '-U', self.username, '-P', self.password,
-                'raw', '0x30', '0x30', '0x01', '0x01'
-            ])
+            await self.transport.raw(0x30, 0x30, bytes([0x01, 0x01]))
             self._manual_control = False
             logger.info("已恢复自动风扇控制")
             return True
@@ -95,18 +65,17 @@ class IPMIService:
         if not 0 <= percentage <= 100:
             raise ValueError(f"无效的风扇速度: {percentage}%")
         
-        hex_speed = f"0x{percentage:02x}"
         try:
-            await self._run_command([
-                'ipmitool', '-I', 'lanplus', '-H', self.ip,
-                '-U', self.username, '-P', self.password,
-                'raw', '0x30', '0x30', '0x02', '0xff', hex_speed
-            ])
+            await self._guarded("command", self.transport.raw, 0x30, 0x30, bytes([0x02, 0xff, percentage]))
             return True
         except Exception as e:
             logger.error(f"设置风扇转速失败: {e}")
             return False
     
+    async def close(self):
+        """关闭传输层（例如退出常驻的 ipmitool shell）"""
+        await self.transport.close()
+    
     @property
     def is_manual_control(self) -> bool:
         return self._manual_control
@@ -0,0 +1,301 @@
+"""
+IPMI transport layer: how raw IPMI requests reach the BMC.
+
+- ``subprocess``: one ``ipmitool raw`` process per command (full RMCP+ handshake every time)
+- ``shell``: a long-lived ``ipmitool shell`` co-process per host that keeps one
+  authenticated lanplus session open and reuses it for every command
+"""
+import asyncio
+import logging
+import os
+import re
+from typing import Callable, Dict, List, Optional, Protocol, Tuple, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRANSPORT = "shell"
+
+# ipmitool raw 出错时的输出，例如:
+# Unable to send RAW command (channel=0x0 netfn=0x30 lun=0x0 cmd=0x30 rsp=0xc1): Invalid command
+_RAW_ERROR = re.compile(r"Unable to send RAW command(?:.*rsp=0x([0-9a-fA-F]{2}))?")
+_HEX_LINE = re.compile(r"^(?:[0-9a-fA-F]{2}\s*)+$")
+_ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+# ipmitool 不支持 shell 时的输出，例如:
+# Compiled without readline/editline, shell is disabled
+_SHELL_UNSUPPORTED = re.compile(r"shell is disabled|without readline|Invalid command: shell", re.IGNORECASE)
+
+
+class _ShellUnavailable(RuntimeError):
+    """ipmitool 不支持 shell 子命令（未编译 readline）"""
+
+
+class IPMICommandError(RuntimeError):
+    """BMC 返回了非零完成码"""
+
+    def __init__(self, message: str, completion_code: Optional[int] = None):
+        super().__init__(message)
+        self.completion_code = completion_code
+
+
+async def run_command(command: List[str], max_retries: int = 3, timeout: float = 15) -> str:
+    """异步执行命令，带重试机制"""
+    for attempt in range(max_retries):
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise
+
+            if proc.returncode == 0:
+                return stdout.decode()
+
+            logger.warning(f"命令执行失败 (尝试 {attempt + 1}/{max_retries}): {stderr.decode()}")
+        except asyncio.TimeoutError:
+            logger.warning(f"命令超时 (尝试 {attempt + 1}/{max_retries})")
+
+        if attempt < max_retries - 1:
+            await asyncio.sleep(2 ** attempt)
+
+    raise RuntimeError(f"命令执行失败: {' '.join(command)}")
+
+
+class LineParser(Protocol):
+    def feed(self, line: str) -> bool:
+        """处理一行输出，返回 True 表示不再需要后续输出"""
+
+
+P = TypeVar("P", bound=LineParser)
+
+
+async def stream_command(command: List[str], make_parser: Callable[[], P],
+                         max_retries: int = 3, timeout: float = 15) -> P:
+    """异步执行命令并在输出到达时逐行交给解析器，带重试机制
+
+    每次尝试新建一个解析器；解析器的 feed 返回 True 时不再读取剩余输出，
+    直接结束进程。返回完成解析的解析器。
+    """
+    for attempt in range(max_retries):
+        parser = make_parser()
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        # stderr 单独读取，避免其管道写满后进程阻塞
+        stderr_task = asyncio.create_task(proc.stderr.read())
+        try:
+            stopped = await asyncio.wait_for(_feed_lines(proc.stdout, parser), timeout=timeout)
+            if stopped:
+                proc.kill()
+            await proc.wait()
+            stderr = await stderr_task
+            if stopped or proc.returncode == 0:
+                return parser
+            logger.warning(f"命令执行失败 (尝试 {attempt + 1}/{max_retries}): {stderr.decode(errors='replace')}")
+        except asyncio.TimeoutError:
+            logger.warning(f"命令超时 (尝试 {attempt + 1}/{max_retries})")
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            stderr_task.cancel()
+
+        if attempt < max_retries - 1:
+            await asyncio.sleep(2 ** attempt)
+
+    raise RuntimeError(f"命令执行失败: {' '.join(command)}")
+
+
+async def _feed_lines(stream: asyncio.StreamReader, parser: LineParser) -> bool:
+    """逐行读取直到 EOF 或解析器表示已足够，返回是否提前结束"""
+    async for line in stream:
+        if parser.feed(line.decode(errors="replace").rstrip("\r\n")):
+            return True
+    return False
+
+
+def format_raw_args(netfn: int, cmd: int, data: bytes) -> List[str]:
+    """将原始请求转换为 ipmitool raw 的参数"""
+    return ["raw", f"0x{netfn:02x}", f"0x{cmd:02x}", *(f"0x{b:02x}" for b in data)]
+
+
+def parse_raw_output(output: str) -> bytes:
+    """解析 ipmitool raw 的输出（十六进制字节，可能跨多行）"""
+    data = bytearray()
+    for line in output.splitlines():
+        line = _ANSI_ESCAPE.sub("", line).strip()
+        error = _RAW_ERROR.search(line)
+        if error and error.group(1):
+            raise IPMICommandError(line, int(error.group(1), 16))
+        if error or line.startswith("Error") or "Unable to" in line:
+            # 会话建立失败、BMC 无响应等传输层错误
+            raise RuntimeError(line)
+        if line and _HEX_LINE.match(line):
+            data.extend(int(token, 16) for token in line.split())
+    return bytes(data)
+
+
+class IPMITransport:
+    """IPMI 传输基类：发送一条原始请求并返回响应数据（不含完成码）"""
+
+    name = "base"
+
+    def __init__(self, ip: str, username: str, password: str,
+                 port: int = 623, cipher_suite: Optional[int] = None, timeout: float = 15):
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.port = port
+        self.cipher_suite = cipher_suite
+        self.timeout = timeout
+
+    def ipmitool_args(self) -> List[str]:
+        args = ['ipmitool', '-I', 'lanplus', '-H', self.ip,
+                '-U', self.username, '-P', self.password]
+        if self.port != 623:
+            args += ['-p', str(self.port)]
+        if self.cipher_suite is not None:
+            args += ['-C', str(self.cipher_suite)]
+        return args
+
+    async def raw(self, netfn: int, cmd: int, data: bytes = b"") -> bytes:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """释放传输占用的资源"""
+
+
+class SubprocessTransport(IPMITransport):
+    """每条命令启动一个 ipmitool 进程"""
+
+    name = "subprocess"
+
+    async def raw(self, netfn: int, cmd: int, data: bytes = b"") -> bytes:
+        output = await run_command(
+            self.ipmitool_args() + format_raw_args(netfn, cmd, data),
+            timeout=self.timeout
+        )
+        return parse_raw_output(output)
+
+
+class ShellTransport(IPMITransport):
+    """常驻 ipmitool shell 协进程，复用同一个已认证的 lanplus 会话
+
+    命令串行写入协进程的 stdin，读取输出直到再次出现提示符。
+    协进程异常退出或超时时自动重启；如果 ipmitool 不支持 shell
+    （未编译 readline），则退化为 SubprocessTransport。
+    """
+
+    name = "shell"
+    PROMPT = b"ipmitool> "
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+        self._fallback: Optional[SubprocessTransport] = None
+
+    async def _spawn(self) -> None:
+        self._proc = await asyncio.create_subprocess_exec(
+            *self.ipmitool_args(), 'shell',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env={**os.environ, "TERM": "dumb"}
+        )
+        output, ready = await asyncio.wait_for(self._read_until_prompt(), timeout=self.timeout)
+        if not ready:
+            await self._proc.wait()
+            # 只有 ipmitool 明确不支持 shell 时才永久退化；认证、网络或 BMC 繁忙等失败按普通错误重试
+            if _SHELL_UNSUPPORTED.search(output):
+                raise _ShellUnavailable(output.strip())
+            raise RuntimeError(f"ipmitool shell 启动失败: {output.strip()[-200:]}")
+        logger.info(f"[{self.ip}] ipmitool shell 会话已建立")
+
+    async def _read_until_prompt(self) -> Tuple[str, bool]:
+        """读取输出直到提示符出现，返回 (输出, 是否读到提示符)；进程退出时为 False"""
+        buffer = bytearray()
+        while not buffer.endswith(self.PROMPT):
+            chunk = await self._proc.stdout.read(4096)
+            if not chunk:
+                return buffer.decode(errors="replace"), False
+            buffer.extend(chunk)
+        return buffer[:-len(self.PROMPT)].decode(errors="replace"), True
+
+    async def _kill(self) -> None:
+        if self._proc and self._proc.returncode is None:
+            self._proc.kill()
+            await self._proc.wait()
+        self._proc = None
+
+    async def _execute(self, line: str) -> str:
+        if self._proc is None or self._proc.returncode is not None:
+            await self._spawn()
+        self._proc.stdin.write(line.encode() + b"\n")
+        await self._proc.stdin.drain()
+        output, ready = await asyncio.wait_for(self._read_until_prompt(), timeout=self.timeout)
+        if not ready:
+            raise RuntimeError("ipmitool shell 意外退出")
+        return output
+
+    async def raw(self, netfn: int, cmd: int, data: bytes = b"") -> bytes:
+        if self._fallback:
+            self._fallback.timeout = self.timeout
+            return await self._fallback.raw(netfn, cmd, data)
+
+        line = " ".join(format_raw_args(netfn, cmd, data))
+        async with self._lock:
+            for attempt in range(2):
+                try:
+                    return parse_raw_output(await self._execute(line))
+                except IPMICommandError:
+                    raise
+                except _ShellUnavailable:
+                    await self._kill()
+                    logger.warning(f"[{self.ip}] ipmitool shell 不可用，退化为单次进程模式")
+                    self._fallback = SubprocessTransport(
+                        self.ip, self.username, self.password,
+                        port=self.port, cipher_suite=self.cipher_suite, timeout=self.timeout
+                    )
+                    break
+                except (asyncio.TimeoutError, RuntimeError, OSError) as e:
+                    await self._kill()
+                    if attempt == 0:
+                        # 会话可能已被 BMC 超时回收，重建后重试一次
+                        logger.warning(f"[{self.ip}] ipmitool shell 会话失效，正在重建: {e}")
+                        continue
+                    raise RuntimeError(f"IPMI 命令执行失败: {line}") from e
+        return await self._fallback.raw(netfn, cmd, data)
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._proc and self._proc.returncode is None:
+                try:
+                    self._proc.stdin.write(b"exit\n")
+                    await self._proc.stdin.drain()
+                    await asyncio.wait_for(self._proc.wait(), timeout=5)
+                except (asyncio.TimeoutError, OSError):
+                    pass
+            await self._kill()
+
+
+TRANSPORTS: Dict[str, Type[IPMITransport]] = {
+    SubprocessTransport.name: SubprocessTransport,
+    ShellTransport.name: ShellTransport,
+}
+
+
+def create_transport(kind: Optional[str], ip: str, username: str, password: str, **kwargs) -> IPMITransport:
+    """按名称创建传输实例，未知名称使用默认传输"""
+    transport_cls = TRANSPORTS.get(kind or DEFAULT_TRANSPORT)
+    if transport_cls is None:
+        logger.warning(f"未知的 IPMI 传输方式: {kind}，使用 {DEFAULT_TRANSPORT}")
+        transport_cls = TRANSPORTS[DEFAULT_TRANSPORT]
+    return transport_cls(ip, username, password, **kwargs)
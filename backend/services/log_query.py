@@ -0,0 +1,254 @@
+"""
+Tail-seeking query engine over the rotating log files, with a sidecar block index.
+"""
+import math
+import os
+import re
+import struct
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from logging_config import LOG_FILE, LOG_BACKUP_COUNT
+
+# 索引块大小：每块约 64 KB，块边界对齐到行首
+BLOCK_SIZE = 64 * 1024
+INDEX_DIR = LOG_FILE.parent / ".index"
+
+LINE_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (\w+) - (.+)")
+_BLOCK_PATTERN = re.compile(rb"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d{3} - (\w+) - ", re.MULTILINE)
+
+# 级别位图：块内出现过的级别，按级别过滤时跳过不含该级别的块
+LEVEL_BITS = {"DEBUG": 1, "INFO": 2, "WARNING": 4, "ERROR": 8, "CRITICAL": 16}
+_OTHER_LEVEL = 32
+
+# 索引文件：头部（魔数、版本、首行 CRC32）+ 每块一条（起止偏移、首末时间戳、级别位图）
+_INDEX_MAGIC = b"DFCL"
+_INDEX_VERSION = 1
+_INDEX_HEADER = struct.Struct("<4sBI")
+_INDEX_ENTRY = struct.Struct("<QQddH")
+
+Block = Tuple[int, int, float, float, int]
+
+_index_lock = threading.Lock()
+
+
+def log_files() -> List[Path]:
+    """当前日志和轮转备份，从新到旧"""
+    files = [LOG_FILE] + [LOG_FILE.with_name(f"{LOG_FILE.name}.{i}") for i in range(1, LOG_BACKUP_COUNT + 1)]
+    return [f for f in files if f.exists()]
+
+
+def _parse_epoch(stamp: bytes) -> float:
+    """'YYYY-mm-dd HH:MM:SS'（本地时间，与日志 asctime 一致）-> epoch 秒"""
+    s = stamp.decode("ascii")
+    return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                    int(s[11:13]), int(s[14:16]), int(s[17:19])).timestamp()
+
+
+def _level_mask(levels) -> int:
+    mask = 0
+    for level in levels:
+        mask |= LEVEL_BITS.get(level.decode("ascii", "replace"), _OTHER_LEVEL)
+    return mask
+
+
+def iter_lines_reversed(f, start: int, end: int, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """从 end 向 start 按块倒序读取，逐行产出（不含换行符）
+
+    start 须为行首；end 之前最后一个换行符之后的内容（正在写入的半行）被忽略。
+    """
+    pos = end
+    buf = b""
+    seen_newline = False
+    while pos > start:
+        size = min(block_size, pos - start)
+        pos -= size
+        f.seek(pos)
+        buf = f.read(size) + buf
+        lines = buf.split(b"\n")
+        if not seen_newline:
+            if len(lines) == 1:
+                continue
+            lines.pop()
+            seen_newline = True
+        buf = lines[0]
+        for line in reversed(lines[1:]):
+            yield line
+    if seen_newline and buf:
+        yield buf
+
+
+class LogIndex:
+    """单个日志文件的块索引，按 inode 保存在 INDEX_DIR 下，轮转改名后仍然有效
+
+    只索引完整的块；文件末尾不足一块的部分在查询时直接扫描。
+    """
+
+    def __init__(self, path: Path, f):
+        self.path = path
+        st = os.fstat(f.fileno())
+        self.size = st.st_size
+        self.index_path = INDEX_DIR / f"{st.st_dev}-{st.st_ino}.idx"
+        self.blocks: List[Block] = []
+
+    @property
+    def indexed_end(self) -> int:
+        return self.blocks[-1][1] if self.blocks else 0
+
+    def _first_line_crc(self, f) -> Optional[int]:
+        f.seek(0)
+        line = f.readline(BLOCK_SIZE)
+        return zlib.crc32(line) if line.endswith(b"\n") else None
+
+    def load(self, f) -> None:
+        """读取已有索引并补齐新增的完整块"""
+        crc = self._first_line_crc(f)
+        if crc is None:
+            return
+        self.blocks = self._read_index(crc)
+        if self.indexed_end > self.size:
+            self.blocks = []  # 文件被截断或 inode 被复用
+        appended = list(self._scan(f, self.indexed_end))
+        if not appended:
+            return
+        self.blocks.extend(appended)
+        INDEX_DIR.mkdir(parents=True, exist_ok=True)
+        mode = "ab" if len(self.blocks) > len(appended) else "wb"
+        with open(self.index_path, mode) as out:
+            if mode == "wb":
+                out.write(_INDEX_HEADER.pack(_INDEX_MAGIC, _INDEX_VERSION, crc))
+            out.write(b"".join(_INDEX_ENTRY.pack(*block) for block in appended))
+
+    def _read_index(self, crc: int) -> List[Block]:
+        try:
+            data = self.index_path.read_bytes()
+        except OSError:
+            return []
+        if len(data) < _INDEX_HEADER.size:
+            return []
+        magic, version, stored_crc = _INDEX_HEADER.unpack_from(data)
+        if magic != _INDEX_MAGIC or version != _INDEX_VERSION or stored_crc != crc:
+            return []
+        usable = (len(data) - _INDEX_HEADER.size) // _INDEX_ENTRY.size * _INDEX_ENTRY.size
+        return [block for block in _INDEX_ENTRY.iter_unpack(data[_INDEX_HEADER.size:_INDEX_HEADER.size + usable])]
+
+    def _scan(self, f, offset: int) -> Iterator[Block]:
+        """从 offset 向后切分完整的块并统计时间范围和级别"""
+        last_ts = self.blocks[-1][3] if self.blocks else math.nan
+        while self.size - offset >= BLOCK_SIZE:
+            f.seek(offset)
+            data = f.read(BLOCK_SIZE)
+            cut = data.rfind(b"\n") + 1
+            while cut == 0:
+                # 超长的一行：继续读到换行符为止
+                more = f.read(BLOCK_SIZE)
+                if not more:
+                    return
+                data += more
+                cut = data.rfind(b"\n") + 1
+            data = data[:cut]
+            matches = _BLOCK_PATTERN.findall(data)
+            if matches:
+                first_ts, last_ts = _parse_epoch(matches[0][0]), _parse_epoch(matches[-1][0])
+            else:
+                first_ts = last_ts
+            yield offset, offset + cut, first_ts, last_ts, _level_mask(m[1] for m in matches)
+            offset += cut
+
+    def segments(self) -> List[Block]:
+        """完整块 + 末尾未索引部分（时间范围未知、级别全集）"""
+        tail = (self.indexed_end, self.size, math.nan, math.nan, -1)
+        return self.blocks + ([tail] if self.size > self.indexed_end else [])
+
+
+def _prune_indexes(files: List[Path]) -> None:
+    """删除已不对应任何日志文件的索引"""
+    if not INDEX_DIR.exists():
+        return
+    alive = set()
+    for path in files:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        alive.add(f"{st.st_dev}-{st.st_ino}.idx")
+    for index_file in INDEX_DIR.glob("*.idx"):
+        if index_file.name not in alive:
+            try:
+                index_file.unlink()
+            except OSError:
+                pass
+
+
+def _local_stamp(value: Optional[datetime]) -> Tuple[Optional[float], Optional[str]]:
+    """查询边界 -> (epoch 秒, 与日志时间同格式的本地时间字符串)"""
+    if value is None:
+        return None, None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.timestamp(), value.strftime("%Y-%m-%d %H:%M:%S,") + f"{value.microsecond // 1000:03d}"
+
+
+def query_logs(level: Optional[str] = None, limit: int = 100, search: Optional[str] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict]:
+    """从最新的日志开始倒序查询，最多返回 limit 条
+
+    只按 limit / search 查询时不使用索引，从文件末尾按块倒读，读够即止；
+    带时间范围或级别时先补齐各文件的块索引，跳过时间范围或级别不匹配的块，
+    并在遇到早于 since 的块时停止（包括更早的轮转文件）。
+    """
+    level = level.upper() if level else None
+    search = search.lower() if search else None
+    since_epoch, since_stamp = _local_stamp(since)
+    until_epoch, until_stamp = _local_stamp(until)
+    use_index = level is not None or since is not None or until is not None
+    level_bit = LEVEL_BITS.get(level, _OTHER_LEVEL) if level else None
+
+    files = log_files()
+    logs: List[Dict] = []
+    if use_index:
+        with _index_lock:
+            _prune_indexes(files)
+
+    for path in files:
+        try:
+            f = open(path, "rb")
+        except OSError:
+            continue  # 查询期间被轮转删除
+        with f:
+            index = LogIndex(path, f)
+            if use_index:
+                with _index_lock:
+                    index.load(f)
+                segments = index.segments()
+            else:
+                segments = [(0, index.size, math.nan, math.nan, -1)]
+
+            for start, end, first_ts, last_ts, mask in reversed(segments):
+                if since_epoch is not None and last_ts < since_epoch - 1:
+                    return logs  # 之后的块和更早的文件都早于 since
+                if until_epoch is not None and first_ts > until_epoch:
+                    continue
+                if level_bit is not None and not mask & level_bit:
+                    continue
+
+                for raw in iter_lines_reversed(f, start, end):
+                    match = LINE_PATTERN.match(raw.decode("utf-8", "replace").strip())
+                    if not match:
+                        continue
+                    time_str, log_level, message = match.groups()
+                    if until_stamp is not None and time_str > until_stamp:
+                        continue
+                    if since_stamp is not None and time_str < since_stamp:
+                        return logs
+                    if level and log_level != level:
+                        continue
+                    if search and search not in message.lower():
+                        continue
+                    logs.append({"time": time_str, "level": log_level, "message": message})
+                    if len(logs) >= limit:
+                        return logs
+    return logs
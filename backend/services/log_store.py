@@ -0,0 +1,188 @@
+"""
+Structured log store: batched SQLite writes with FTS5 search over messages.
+"""
+import logging
+import re
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text
+
+from database import LogRecord, LOG_FTS_TABLE, as_utc, engine, read_engine
+from services.history_store import purge_table_in_chunks
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_RETENTION_DAYS = 14
+# trigram 分词最短可匹配 3 个字符，更短的关键词（以及没有 trigram 索引时）用 LIKE
+_TRIGRAM_MIN_CHARS = 3
+# 监控日志以 "[主机名] " 开头
+_HOST_PREFIX = re.compile(r"^\[([^\]]+)\] ")
+
+_log_table = LogRecord.__table__
+_fts_tokenizer: Optional[str] = None
+_fts_checked = False
+
+
+class LogStoreHandler(logging.Handler):
+    """把日志记录批量写入 log_records 表
+
+    emit 只把记录放入有界缓冲（满时丢弃最旧的记录），后台线程每 ``flush_interval``
+    秒或攒够 ``batch_size`` 条时在一个事务中批量插入。
+    """
+
+    DEFAULT_BATCH_SIZE = 200
+    DEFAULT_FLUSH_INTERVAL = 1.0
+    DEFAULT_MAX_PENDING = 10000
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        super().__init__()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: deque = deque(maxlen=max_pending)
+        self._pending_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"written": 0, "dropped": 0, "failed": 0}
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="log-store-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # 写入失败时本模块输出的日志不再回写，避免循环
+        if record.name == __name__:
+            return
+        try:
+            message = record.getMessage()
+            if record.exc_info:
+                message = f"{message}\n{logging.Formatter().formatException(record.exc_info)}"
+            host = _HOST_PREFIX.match(message)
+            row = {
+                "recorded_at": datetime.fromtimestamp(record.created, tz=timezone.utc),
+                "level": record.levelname,
+                "logger": record.name,
+                "host": host.group(1) if host else None,
+                "message": message,
+            }
+            with self._pending_lock:
+                if len(self._pending) == self._pending.maxlen:
+                    self.stats["dropped"] += 1
+                self._pending.append(row)
+                if len(self._pending) >= self.batch_size:
+                    self._wakeup.set()
+        except Exception:
+            self.handleError(record)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush()
+        self._flush()
+
+    def _flush(self) -> None:
+        with self._pending_lock:
+            batch = list(self._pending)
+            self._pending.clear()
+        if not batch:
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(_log_table.insert(), batch)
+            self.stats["written"] += len(batch)
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            logger.warning(f"日志写入数据库失败，丢弃 {len(batch)} 条: {e}")
+
+    def close(self) -> None:
+        """停止写入线程并写入剩余的记录（logging.shutdown 时调用）"""
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        super().close()
+
+
+def _get_fts_tokenizer() -> Optional[str]:
+    """全文索引使用的分词器（trigram）；没有可用于子串搜索的全文索引时返回 None"""
+    global _fts_tokenizer, _fts_checked
+    if not _fts_checked:
+        with read_engine.connect() as conn:
+            sql = conn.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+            ), {"name": LOG_FTS_TABLE}).scalar()
+        if sql and "trigram" in sql:
+            _fts_tokenizer = "trigram"
+        _fts_checked = True
+    return _fts_tokenizer
+
+
+def _fts_phrase(keyword: str) -> str:
+    """关键词作为一个 FTS5 短语（整体匹配，引号转义）"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def _format_time(value: datetime) -> str:
+    """与日志文件相同的本地时间格式"""
+    local = value.replace(tzinfo=timezone.utc).astimezone()
+    return local.strftime("%Y-%m-%d %H:%M:%S,") + f"{local.microsecond // 1000:03d}"
+
+
+def query_log_records(level: Optional[str] = None, limit: int = 100, search: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      host: Optional[str] = None, cursor: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+    """从新到旧查询结构化日志，返回 (记录, 下一页游标)
+
+    游标为本页最后一条记录的 id，下一页查询 id 更小的记录；没有更多记录时为 None。
+    """
+    stmt = select(
+        _log_table.c.id, _log_table.c.recorded_at, _log_table.c.level,
+        _log_table.c.host, _log_table.c.message,
+    )
+    params = {}
+    if level:
+        stmt = stmt.where(_log_table.c.level == level.upper())
+    if host:
+        stmt = stmt.where(_log_table.c.host == host)
+    if since:
+        stmt = stmt.where(_log_table.c.recorded_at >= as_utc(since, naive_local=True))
+    if until:
+        stmt = stmt.where(_log_table.c.recorded_at <= as_utc(until, naive_local=True))
+    if cursor is not None:
+        stmt = stmt.where(_log_table.c.id < cursor)
+    if search:
+        tokenizer = _get_fts_tokenizer()
+        if tokenizer == "trigram" and len(search) >= _TRIGRAM_MIN_CHARS:
+            stmt = stmt.where(text(
+                f"log_records.id IN (SELECT rowid FROM {LOG_FTS_TABLE} WHERE {LOG_FTS_TABLE} MATCH :match)"
+            ))
+            params["match"] = _fts_phrase(search)
+        else:
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            stmt = stmt.where(_log_table.c.message.ilike(f"%{escaped}%", escape="\\"))
+    stmt = stmt.order_by(_log_table.c.id.desc()).limit(limit + 1)
+
+    with read_engine.connect() as conn:
+        rows = conn.execute(stmt, params).all()
+    logs = [
+        {"id": row.id, "time": _format_time(row.recorded_at), "level": row.level,
+         "host": row.host, "message": row.message}
+        for row in rows[:limit]
+    ]
+    next_cursor = logs[-1]["id"] if len(rows) > limit else None
+    return logs, next_cursor
+
+
+def purge_log_records(cutoff: datetime, chunk_size: int, chunk_pause: float) -> int:
+    """分块删除 cutoff 之前的日志记录（全文索引由触发器同步删除）"""
+    return purge_table_in_chunks(_log_table, cutoff, chunk_size, chunk_pause)
@@ -1,182 +1,592 @@
 import asyncio
 import logging
+import time
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timezone
-from typing import List, Tuple, Optional
+from typing import Dict, List, Set, Tuple, Optional, Union
 
 from services.ipmi_service import IPMIService
 from services.websocket_service import WebSocketManager
-from database import SessionLocal, MonitorHistory, FanCurve, Settings, utcnow
+from services.history_writer import HistoryWriter
+from services.sample_buffer import SampleBuffer
+from services.poll_limiter import PollLimiter
+from services.fan_controller import (
+    CompiledCurve, FanController, create_controller, interpolate_curve,
+    DEFAULT_CONTROLLER, DEFAULT_SPEED_DEADBAND, COMMAND_REFRESH_INTERVAL,
+)
+from services.poll_interval import next_poll_interval, DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL
+from services.temperature_trend import TemperatureTrend, DEFAULT_PREDICT_HORIZON, DEFAULT_PREDICT_WINDOW
+from services.sensor_backend import HardwareStatus, DEFAULT_CONTROL_TARGET
+from services.circuit_breaker import CircuitOpenError, OPEN
+from database import SessionLocal, FanCurve, Settings, Host, utcnow
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_CONCURRENCY = 16
+
+# 控制器参数名 -> 配置项
+CONTROLLER_SETTING_KEYS = {
+    "hysteresis": "fan_hysteresis",
+    "setpoint": "pid_setpoint",
+    "kp": "pid_kp",
+    "ki": "pid_ki",
+    "kd": "pid_kd",
+}
+
+
+@dataclass
+class HostContext:
+    """单台受管服务器的运行时状态"""
+    host_id: int
+    name: str
+    ipmi: IPMIService
+    # 连接配置 (ip, username, password, transport, sensor_backend)，变化时重建上下文
+    config: Tuple = ()
+    status: Dict = field(default_factory=lambda: {
+        "cpu_temp": 0,
+        "max_cpu_temp": None,
+        "inlet_temp": None,
+        "control_temp": None,
+        "fan_speed": 0,
+        "power": 0,
+        "control_mode": "auto",
+        "predicted_temp": None,
+        "poll_interval": None,
+        "circuit": "closed",
+        "health": 100,
+        "last_update": None,
+    })
+    # 最近采样的温度趋势（预测控制使用）
+    trend: TemperatureTrend = field(default_factory=TemperatureTrend)
+    # 风扇控制策略（每台主机独立的内部状态）
+    controller: FanController = field(default_factory=lambda: create_controller(DEFAULT_CONTROLLER))
+    # 最近一次成功下发的转速及时间（monotonic），None 表示需要重新下发
+    commanded_speed: Optional[int] = None
+    commanded_at: float = 0.0
+    target_speed: Optional[int] = None
+    commands_sent: int = 0
+    commands_suppressed: int = 0
+    consecutive_errors: int = 0
+    # 已推送过故障告警、尚未推送恢复
+    alerting: bool = False
+    # 已推送过熔断告警、尚未恢复
+    circuit_alerted: bool = False
+    last_latency: float = 0.0
+    # 当前生效的轮询间隔（秒），0 表示尚未确定
+    poll_interval: float = 0.0
+    # 最近一次读取到的全部传感器读数
+    sensors: List = field(default_factory=list)
+    # 已提示过缺少控制目标传感器（避免每次轮询都打日志）
+    control_fallback_warned: bool = False
+    task: Optional[asyncio.Task] = None
+
+
 class MonitorService:
     def __init__(self, ws_manager: WebSocketManager):
         self.ws_manager = ws_manager
-        self.ipmi: Optional[IPMIService] = None
+        self.hosts: Dict[int, HostContext] = {}
         self.running = False
         self.interval = 30
+        self.max_concurrency = DEFAULT_MAX_CONCURRENCY
+        # 自适应轮询：按温度状态在 [min_interval, max_interval] 之间调整间隔
+        self.adaptive_interval = False
+        self.min_interval = DEFAULT_MIN_INTERVAL
+        self.max_interval = DEFAULT_MAX_INTERVAL
+        # 预测控制：按温度趋势外推 predict_horizon 秒后的温度查曲线
+        self.predictive = False
+        self.predict_horizon = DEFAULT_PREDICT_HORIZON
+        self.predict_window = DEFAULT_PREDICT_WINDOW
+        # 风扇控制策略及参数；转速变化小于 speed_deadband 时不下发命令
+        self.controller_config: Tuple = (DEFAULT_CONTROLLER, ())
+        self.speed_deadband = DEFAULT_SPEED_DEADBAND
+        # 按哪个温度控制风扇（cpu_avg / cpu_max / inlet），以及是否保存逐传感器历史
+        self.control_sensor = DEFAULT_CONTROL_TARGET
+        self.sensor_history = False
+        # 限制同时进行的 IPMI 轮询数量，避免一次性压垮网络或本机进程数
+        self._poll_limiter = PollLimiter(self.max_concurrency)
+        self._wakeup = asyncio.Event()
+        # 正在交还控制权并关闭会话的旧主机上下文
+        self._releasing: Set[asyncio.Task] = set()
+        # 历史数据异步批量写入，避免每个采样都在事件循环线程上提交事务
+        self.history_writer = HistoryWriter()
+        # 最近 6 小时的采样常驻内存（列式环形缓冲），仪表盘短时间范围查询不访问数据库
+        self.sample_buffer = SampleBuffer()
+        # 顶层字段为默认主机状态（兼容单机版前端），hosts 为每台主机的状态
         self.current_status = {
             "cpu_temp": 0,
             "fan_speed": 0,
             "power": 0,
-            "control_mode": "auto"
+            "control_mode": "auto",
+            "hosts": {}
         }
-        # 风扇曲线缓存
-        self._fan_curve_cache: Optional[List[Tuple[int, int]]] = None
-    
-    def calculate_fan_speed(self, temp: float, curve: List[Tuple[int, int]]) -> int:
+        # 风扇曲线缓存（重新加载时编译为查找结构）
+        self._fan_curve_cache: Optional[CompiledCurve] = None
+
+    @property
+    def ipmi(self) -> Optional[IPMIService]:
+        """默认主机的 IPMI 服务（兼容单机模式）"""
+        primary = self.primary_host
+        return primary.ipmi if primary else None
+
+    @property
+    def primary_host(self) -> Optional[HostContext]:
+        """默认主机：id 最小的已启用主机"""
+        if not self.hosts:
+            return None
+        return self.hosts[min(self.hosts)]
+
+    def calculate_fan_speed(self, temp: float, curve: Union[CompiledCurve, List[Tuple[int, int]]]) -> int:
         """根据温度曲线计算风扇转速"""
-        if not curve:
-            return 20  # 默认安全转速
-        
-        curve = sorted(curve, key=lambda x: x[0])
-        
-        if temp <= curve[0][0]:
-            return curve[0][1]
-        if temp >= curve[-1][0]:
-            return curve[-1][1]
-        
-        for i in range(len(curve) - 1):
-            t0, s0 = curve[i]
-            t1, s1 = curve[i + 1]
-            if t0 <= temp < t1:
-                # 线性插值
-                return int(s0 + (temp - t0) * (s1 - s0) / (t1 - t0))
-        
-        return curve[-1][1]
+        return interpolate_curve(temp, curve)
+
+    def _create_controller(self) -> FanController:
+        kind, params = self.controller_config
+        return create_controller(kind, **dict(params))
+
+    def _sensor_temperature(self, ctx: HostContext, hw_status: HardwareStatus) -> float:
+        """控制目标对应的温度；缺少该传感器（如没有进风口温度）时退回 CPU 最高温度"""
+        temp = hw_status.control_temperature(self.control_sensor)
+        if temp is not None:
+            ctx.control_fallback_warned = False
+            return temp
+        if not ctx.control_fallback_warned:
+            ctx.control_fallback_warned = True
+            logger.warning(f"[{ctx.name}] 未找到控制目标 {self.control_sensor} 对应的传感器，改用 CPU 最高温度")
+        return hw_status.max_cpu_temp
+
+    def _control_temperature(self, ctx: HostContext, temp: float) -> float:
+        """用于查曲线的温度：记录趋势，预测控制开启时返回外推温度"""
+        ctx.trend.add(time.time(), temp)
+        if not self.predictive:
+            return temp
+        return ctx.trend.project(self.predict_horizon)
 
     def _load_settings_sync(self):
-        """从数据库加载配置（同步版本）"""
+        """从数据库加载配置和主机列表（同步版本）"""
         db = SessionLocal()
         try:
             settings = {s.key: s.value for s in db.query(Settings).all()}
-            
-            self.ipmi = IPMIService(
-                ip=settings.get('ip_address', ''),
-                username=settings.get('username', ''),
-                password=settings.get('password', '')
-            )
             self.interval = int(settings.get('interval', 30))
+            self.adaptive_interval = settings.get('adaptive_interval', 'false') == 'true'
+            self.min_interval = int(settings.get('min_interval', DEFAULT_MIN_INTERVAL))
+            self.max_interval = int(settings.get('max_interval', DEFAULT_MAX_INTERVAL))
+            # 内存缓冲按最密的采样间隔分配容量
+            self.sample_buffer.set_interval(self.min_interval if self.adaptive_interval else self.interval)
+
+            self.predictive = settings.get('predictive_control', 'false') == 'true'
+            self.predict_horizon = int(settings.get('predict_horizon', DEFAULT_PREDICT_HORIZON))
+            self.predict_window = int(settings.get('predict_window', DEFAULT_PREDICT_WINDOW))
+            for ctx in self.hosts.values():
+                ctx.trend.resize(self.predict_window)
+
+            control_sensor = settings.get('control_sensor', DEFAULT_CONTROL_TARGET)
+            if control_sensor != self.control_sensor:
+                # 换了控制温度，旧的趋势和控制器内部状态不再可比
+                self.control_sensor = control_sensor
+                for ctx in self.hosts.values():
+                    ctx.trend.clear()
+                    ctx.controller.reset()
+                    ctx.control_fallback_warned = False
+            self.sensor_history = settings.get('sensor_history', 'false') == 'true'
+
+            self.speed_deadband = int(settings.get('speed_deadband', DEFAULT_SPEED_DEADBAND))
+            controller_config = (settings.get('fan_controller', DEFAULT_CONTROLLER), tuple(
+                (name, float(settings[key])) for name, key in CONTROLLER_SETTING_KEYS.items() if key in settings
+            ))
+            if controller_config != self.controller_config:
+                self.controller_config = controller_config
+                for ctx in self.hosts.values():
+                    ctx.controller = self._create_controller()
+
+            max_concurrency = int(settings.get('max_concurrency', DEFAULT_MAX_CONCURRENCY))
+            if max_concurrency != self.max_concurrency:
+                self.max_concurrency = max_concurrency
+                # 原地调整上限：替换成新的信号量时，进行中的轮询仍释放旧的，切换期间并发会超过上限
+                self._poll_limiter.resize(max_concurrency)
+
+            default_transport = settings.get('ipmi_transport')
+            default_backend = settings.get('sensor_backend')
+            hosts = db.query(Host).filter(Host.enabled.is_(True)).order_by(Host.id).all()
+            self._sync_hosts([
+                (h.id, h.name, (
+                    h.ip_address, h.username, h.password,
+                    h.ipmi_transport or default_transport, h.sensor_backend or default_backend
+                ))
+                for h in hosts if h.ip_address
+            ])
         finally:
             db.close()
-    
-    def _get_fan_curve_sync(self) -> List[Tuple[int, int]]:
-        """获取风扇曲线配置（同步版本，带缓存）"""
+
+    def _sync_hosts(self, rows: List[Tuple[int, str, Tuple]]):
+        """根据主机配置增删或更新运行时上下文"""
+        wanted = {row[0]: row for row in rows}
+
+        for host_id in list(self.hosts):
+            ctx = self.hosts[host_id]
+            row = wanted.get(host_id)
+            if row is None or ctx.config != row[2]:
+                # 主机被删除/禁用或连接信息变化：停止旧的轮询任务，按旧的连接信息交还风扇控制后释放会话
+                release = asyncio.ensure_future(self._release_host(ctx))
+                self._releasing.add(release)
+                release.add_done_callback(self._releasing.discard)
+                del self.hosts[host_id]
+                self.current_status["hosts"].pop(host_id, None)
+                if row is None:
+                    self.sample_buffer.drop(host_id)
+
+        for host_id, name, config in rows:
+            if host_id in self.hosts:
+                self.hosts[host_id].name = name
+                continue
+            ip, username, password, transport, sensor_backend = config
+            self.hosts[host_id] = HostContext(
+                host_id=host_id,
+                name=name,
+                ipmi=IPMIService(
+                    ip=ip, username=username, password=password,
+                    transport=transport, sensor_backend=sensor_backend
+                ),
+                config=config,
+                trend=TemperatureTrend(self.predict_window),
+                controller=self._create_controller()
+            )
+
+        if self.running:
+            self._start_host_tasks()
+
+    async def _release_host(self, ctx: HostContext):
+        """停止主机的轮询任务，恢复自动风扇控制并关闭会话（不再监控的主机不能停在手动转速）"""
+        if ctx.task:
+            ctx.task.cancel()
+            await asyncio.gather(ctx.task, return_exceptions=True)
+        await ctx.ipmi.disable_manual_control()
+        await ctx.ipmi.close()
+
+    def _start_host_tasks(self):
+        """为尚未运行的主机启动轮询任务"""
+        for ctx in self.hosts.values():
+            if ctx.task is None or ctx.task.done():
+                ctx.task = asyncio.create_task(self._run_host(ctx))
+
+    def _get_fan_curve_sync(self) -> CompiledCurve:
+        """获取编译后的风扇曲线（同步版本，带缓存）"""
         if self._fan_curve_cache is not None:
             return self._fan_curve_cache
-        
+
         db = SessionLocal()
         try:
             points = db.query(FanCurve).order_by(FanCurve.temperature).all()
-            self._fan_curve_cache = [(p.temperature, p.fan_speed) for p in points]
+            self._fan_curve_cache = CompiledCurve((p.temperature, p.fan_speed) for p in points)
             return self._fan_curve_cache
         finally:
             db.close()
-    
+
     def invalidate_curve_cache(self):
         """使风扇曲线缓存失效，下次查询时重新加载"""
         self._fan_curve_cache = None
         logger.info("风扇曲线缓存已清除")
-    
+
     async def start(self):
         """启动监控服务"""
         self.running = True
+        self.history_writer.start()
+        # 开始轮询前预热内存缓冲，之后的采样按时间顺序追加
+        try:
+            await asyncio.to_thread(self.sample_buffer.warm)
+        except Exception as e:
+            logger.error(f"历史数据预热失败: {e}")
         try:
             self._load_settings_sync()
         except Exception as e:
             logger.error(f"加载配置失败: {e}")
             return
-        
-        if not self.ipmi or not self.ipmi.ip:
+
+        if not self.hosts:
             logger.warning("未配置 iDRAC 地址，监控服务等待配置...")
-            # 等待配置，每30秒检查一次
-            while self.running and (not self.ipmi or not self.ipmi.ip):
-                await asyncio.sleep(30)
-                try:
-                    self._load_settings_sync()
-                except Exception:
-                    pass
-            if not self.running:
-                return
-        
-        # 接管风扇控制
-        if await self.ipmi.enable_manual_control():
-            self.current_status["control_mode"] = "manual"
-        
-        logger.info(f"监控服务已启动，间隔: {self.interval}秒")
-        
-        consecutive_errors = 0
+
+        logger.info(
+            f"监控服务已启动，主机数: {len(self.hosts)}，间隔: {self.interval}秒，"
+            f"并发上限: {self.max_concurrency}"
+        )
+
+        # 每台主机一个独立的轮询任务，这里只负责定期检查配置变化
         while self.running:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                pass
+            if not self.running:
+                break
             try:
+                self._load_settings_sync()
+            except Exception as e:
+                logger.error(f"加载配置失败: {e}")
+
+    async def _run_host(self, ctx: HostContext):
+        """单台主机的轮询循环，主机之间互不阻塞"""
+        try:
+            async with self._poll_limiter:
+                # 接管风扇控制
+                if await ctx.ipmi.enable_manual_control():
+                    ctx.status["control_mode"] = "manual"
+                    self._publish_status(ctx)
+                # 接管后按控制器的新状态重新下发转速
+                ctx.commanded_speed = None
+                ctx.controller.reset()
+
+            while self.running:
+                delay = await self.poll_host(ctx)
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            pass
+
+    async def poll_host(self, ctx: HostContext) -> float:
+        """轮询一台主机并调整风扇，返回距下次轮询的等待秒数"""
+        try:
+            # 熔断中的主机直接跳过，不占用并发名额
+            ctx.ipmi.breaker.check()
+            started = time.perf_counter()
+            async with self._poll_limiter:
                 # 获取硬件状态
-                hw_status = await self.ipmi.get_hardware_status()
-                
-                # 获取风扇曲线并计算转速
+                # 不保存逐传感器历史时只读取控制需要的传感器
+                hw_status = await ctx.ipmi.get_hardware_status(self.sensor_history)
+
+                # 获取风扇曲线并按控制目标的温度计算转速（预测控制时按外推温度）
+                sensor_temp = self._sensor_temperature(ctx, hw_status)
+                control_temp = self._control_temperature(ctx, sensor_temp)
                 curve = self._get_fan_curve_sync()
-                target_speed = self.calculate_fan_speed(hw_status.cpu_temp, curve)
-                
-                # 设置风扇转速
-                await self.ipmi.set_fan_speed(target_speed)
-                
-                # 更新当前状态
-                self.current_status.update({
-                    "cpu_temp": hw_status.cpu_temp,
-                    "fan_speed": target_speed,
-                    "power": hw_status.power,
-                    "last_update": utcnow().isoformat()
-                })
-                
-                # 保存历史数据
-                db = SessionLocal()
-                try:
-                    db.add(MonitorHistory(
-                        cpu_temp=hw_status.cpu_temp,
-                        fan_speed=target_speed,
-                        power_consumption=hw_status.power
-                    ))
-                    db.commit()
-                finally:
-                    db.close()
-                
-                # 推送 WebSocket 更新
-                await self.ws_manager.broadcast({
-                    "type": "status_update",
-                    "data": self.current_status
-                })
-                
-                logger.info(
-                    f"状态监测 - CPU: {hw_status.cpu_temp:.1f}°C | "
-                    f"风扇: {target_speed}% | 功耗: {hw_status.power}W"
-                )
-                
-                consecutive_errors = 0
-                await asyncio.sleep(self.interval)
-                
-            except Exception as e:
-                consecutive_errors += 1
-                logger.error(f"监控错误 (#{consecutive_errors}): {e}")
-                
-                if consecutive_errors >= 10:
-                    logger.critical("连续错误过多，暂停监控")
-                    await asyncio.sleep(300)  # 暂停5分钟
-                    consecutive_errors = 0
-                else:
-                    await asyncio.sleep(min(60, 2 ** consecutive_errors))
-    
+                target_speed = ctx.controller.compute(control_temp, curve, time.time())
+
+                # 设置风扇转速（变化不足 deadband 时不发送命令）
+                fan_speed = await self._apply_fan_speed(ctx, target_speed)
+            ctx.last_latency = time.perf_counter() - started
+
+            ctx.poll_interval = self._next_interval(ctx, sensor_temp, curve)
+            ctx.sensors = hw_status.sensors
+
+            # 更新当前状态
+            recorded_at = utcnow()
+            ctx.status.update({
+                "cpu_temp": hw_status.cpu_temp,
+                "max_cpu_temp": hw_status.max_cpu_temp,
+                "inlet_temp": hw_status.inlet_temp,
+                "control_temp": round(sensor_temp, 1),
+                "fan_speed": fan_speed,
+                "power": hw_status.power,
+                "predicted_temp": round(control_temp, 1) if self.predictive else None,
+                "poll_interval": round(ctx.poll_interval, 1),
+                "circuit": ctx.ipmi.breaker.state,
+                "health": ctx.ipmi.breaker.health,
+                "last_update": recorded_at.isoformat()
+            })
+            self._publish_status(ctx)
+
+            # 保存历史数据（写入缓冲区，由写入线程批量提交），同时追加到内存缓冲
+            await self.history_writer.submit(
+                ctx.host_id, hw_status.cpu_temp, fan_speed, hw_status.power, recorded_at,
+                hw_status.sensors if self.sensor_history else None
+            )
+            self.sample_buffer.append(
+                ctx.host_id, recorded_at, hw_status.cpu_temp, fan_speed, hw_status.power
+            )
+
+            # 推送 WebSocket 更新
+            await self._broadcast_status(ctx)
+
+            logger.info(
+                f"[{ctx.name}] 状态监测 - CPU: {hw_status.cpu_temp:.1f}°C | "
+                f"风扇: {fan_speed}% | 功耗: {hw_status.power}W | 间隔: {ctx.poll_interval:.0f}秒"
+            )
+
+            ctx.consecutive_errors = 0
+            ctx.circuit_alerted = False
+            if ctx.alerting:
+                ctx.alerting = False
+                await self._broadcast_alert(ctx, "info", "recovered", "主机恢复正常")
+            return ctx.poll_interval
+
+        except CircuitOpenError as e:
+            # 熔断中：到半开探测时间再轮询
+            self._update_circuit_status(ctx)
+            return max(1.0, e.retry_in)
+
+        except Exception as e:
+            ctx.consecutive_errors += 1
+            logger.error(f"[{ctx.name}] 监控错误 (#{ctx.consecutive_errors}): {e}")
+            if ctx.consecutive_errors == 1 and not ctx.alerting:
+                ctx.alerting = True
+                await self._broadcast_alert(ctx, "warning", "poll_failed", str(e))
+
+            breaker = ctx.ipmi.breaker
+            self._update_circuit_status(ctx)
+            if breaker.state == OPEN:
+                # 本次失败触发了熔断（或半开探测失败），之后的轮询在熔断期间直接跳过
+                retry_in = breaker.retry_in()
+                logger.warning(f"[{ctx.name}] BMC 已熔断，{retry_in:.0f} 秒后重新探测")
+                if not ctx.circuit_alerted:
+                    ctx.circuit_alerted = True
+                    await self._broadcast_alert(
+                        ctx, "critical", "circuit_open", f"BMC 连续失败，暂停轮询，{retry_in:.0f} 秒后重新探测"
+                    )
+                return max(1.0, retry_in)
+            return min(60, 2 ** ctx.consecutive_errors)
+
+    def _update_circuit_status(self, ctx: HostContext):
+        """熔断状态变化时更新并推送主机状态"""
+        breaker = ctx.ipmi.breaker
+        circuit = (breaker.state, breaker.health)
+        if circuit != (ctx.status["circuit"], ctx.status["health"]):
+            ctx.status["circuit"], ctx.status["health"] = circuit
+            self._publish_status(ctx)
+
+    def _next_interval(self, ctx: HostContext, temp: float, curve: CompiledCurve) -> float:
+        """距下次轮询的间隔：未开启自适应时为固定间隔"""
+        if not self.adaptive_interval:
+            return self.interval
+        previous = ctx.poll_interval or self.min_interval
+        return next_poll_interval(temp, ctx.trend.slope(), curve, previous,
+                                  self.min_interval, self.max_interval)
+
+    async def _apply_fan_speed(self, ctx: HostContext, target: int) -> int:
+        """下发目标转速，返回当前生效的转速
+
+        与上次下发的转速相差小于 speed_deadband 时跳过（升到 100% 除外），
+        但距上次下发超过 COMMAND_REFRESH_INTERVAL 时仍会重发。
+        """
+        ctx.target_speed = target
+        last = ctx.commanded_speed
+        if last is not None and abs(target - last) < self.speed_deadband \
+                and not (target >= 100 > last) \
+                and time.monotonic() - ctx.commanded_at < COMMAND_REFRESH_INTERVAL:
+            ctx.commands_suppressed += 1
+            return last
+        if await ctx.ipmi.set_fan_speed(target):
+            ctx.commanded_speed = target
+            ctx.commanded_at = time.monotonic()
+            ctx.commands_sent += 1
+        return target
+
+    def sensor_readings(self, host_id: int) -> Optional[Dict]:
+        """主机最近一次读取到的全部传感器；主机不存在时返回 None"""
+        ctx = self.hosts.get(host_id)
+        if ctx is None:
+            return None
+        return {
+            "host_id": host_id,
+            "name": ctx.name,
+            "control_sensor": self.control_sensor,
+            "last_update": ctx.status.get("last_update"),
+            "sensors": [asdict(s) for s in ctx.sensors],
+        }
+
+    def health_stats(self) -> Dict:
+        """每台主机的熔断器状态、健康分、错误率及各类调用的延迟和自适应超时"""
+        hosts = {
+            ctx.host_id: {
+                "name": ctx.name,
+                "consecutive_errors": ctx.consecutive_errors,
+                "last_latency": round(ctx.last_latency, 3),
+                **ctx.ipmi.breaker.snapshot(),
+            }
+            for ctx in self.hosts.values()
+        }
+        return {
+            "open": sum(1 for h in hosts.values() if h["state"] == OPEN),
+            "hosts": hosts,
+        }
+
+    def control_stats(self) -> Dict:
+        """控制器配置和每台主机的命令计数"""
+        kind, params = self.controller_config
+        hosts = {
+            ctx.host_id: {
+                "name": ctx.name,
+                "controller": ctx.controller.name,
+                "target_speed": ctx.target_speed,
+                "commanded_speed": ctx.commanded_speed,
+                "commands_sent": ctx.commands_sent,
+                "commands_suppressed": ctx.commands_suppressed,
+            }
+            for ctx in self.hosts.values()
+        }
+        return {
+            "controller": kind,
+            "params": dict(params),
+            "speed_deadband": self.speed_deadband,
+            "commands_sent": sum(h["commands_sent"] for h in hosts.values()),
+            "commands_suppressed": sum(h["commands_suppressed"] for h in hosts.values()),
+            "hosts": hosts,
+        }
+
+    async def poll_all(self) -> None:
+        """并发轮询所有主机一次（受并发上限约束）"""
+        await asyncio.gather(*(self.poll_host(ctx) for ctx in list(self.hosts.values())))
+
+    def _publish_status(self, ctx: HostContext):
+        """将主机状态写入 current_status"""
+        self.current_status["hosts"][ctx.host_id] = dict(ctx.status, name=ctx.name)
+        if ctx is self.primary_host:
+            self.current_status.update(ctx.status)
+
+    async def _broadcast_status(self, ctx: HostContext):
+        """推送主机状态；默认主机额外推送兼容单机版的 status_update"""
+        await self.ws_manager.broadcast({
+            "type": "host_status",
+            "host_id": ctx.host_id,
+            "data": self.current_status["hosts"][ctx.host_id]
+        })
+        if ctx is self.primary_host:
+            await self.ws_manager.broadcast({
+                "type": "status_update",
+                "data": {k: v for k, v in self.current_status.items() if k != "hosts"}
+            })
+
+    async def _broadcast_alert(self, ctx: HostContext, severity: str, kind: str, message: str):
+        """推送主机告警（alerts 主题）"""
+        await self.ws_manager.broadcast({
+            "type": "alert",
+            "host_id": ctx.host_id,
+            "host": ctx.name,
+            "severity": severity,
+            "kind": kind,
+            "message": message,
+            "time": utcnow().isoformat(),
+        })
+
     async def stop(self):
         """停止监控服务"""
         self.running = False
-        if self.ipmi:
-            await self.ipmi.disable_manual_control()
+        self._wakeup.set()
+        tasks = [ctx.task for ctx in self.hosts.values() if ctx.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*(ctx.ipmi.disable_manual_control() for ctx in self.hosts.values()))
+        await asyncio.gather(*(ctx.ipmi.close() for ctx in self.hosts.values()))
+        await asyncio.gather(*self._releasing, return_exceptions=True)
+        # 确保缓冲区中的历史数据全部落盘
+        await self.history_writer.stop()
         logger.info("监控服务已停止")
-    
+
     async def reload_settings(self):
         """重新加载配置"""
         self._load_settings_sync()
+        # 等被移除或变更的主机交还风扇控制后再返回
+        await asyncio.gather(*self._releasing, return_exceptions=True)
         logger.info("配置已重新加载")
-    
-    async def restore_auto_control(self):
-        """恢复自动控制"""
-        if self.ipmi:
-            await self.ipmi.disable_manual_control()
-            self.current_status["control_mode"] = "auto"
+
+    async def restore_auto_control(self, host_id: Optional[int] = None):
+        """恢复自动控制；未指定主机时恢复所有主机"""
+        if host_id is None:
+            targets = list(self.hosts.values())
+        else:
+            targets = [self.hosts[host_id]] if host_id in self.hosts else []
+
+        async def restore(ctx: HostContext):
+            await ctx.ipmi.disable_manual_control()
+            ctx.commanded_speed = None
+            ctx.status["control_mode"] = "auto"
+            self._publish_status(ctx)
+
+        await asyncio.gather(*(restore(ctx) for ctx in targets))
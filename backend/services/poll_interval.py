@@ -0,0 +1,38 @@
+"""
+Adaptive polling interval derived from the temperature trend and fan curve.
+"""
+from typing import Iterable, Tuple
+
+DEFAULT_MIN_INTERVAL = 10
+DEFAULT_MAX_INTERVAL = 120
+# 温度与曲线拐点相差不超过该值（°C）时按最短间隔轮询
+NEAR_BREAKPOINT = 2.0
+# 温度变化快于该值（°C/秒，约 3°C/分钟）时按最短间隔轮询
+FAST_SLOPE = 0.05
+# 温度平稳时每次轮询把间隔放大的倍数
+BACKOFF = 1.5
+
+
+def next_poll_interval(temp: float, slope: float, curve: Iterable[Tuple[float, int]], previous: float,
+                       min_interval: float, max_interval: float) -> float:
+    """根据当前温度、温度斜率（°C/秒）和风扇曲线计算下次轮询的间隔
+
+    - 靠近曲线拐点、高于曲线最高点或温度变化很快时用最短间隔，转速变化能及时跟上；
+    - 否则间隔按 BACKOFF 逐次放大到最长间隔，但保证按当前斜率到达下一个拐点前
+      至少还能轮询两次。
+    """
+    points = sorted(t for t, _ in curve)
+    if not points or abs(slope) >= FAST_SLOPE or temp >= points[-1] - NEAR_BREAKPOINT:
+        return min_interval
+    if min(abs(temp - p) for p in points) <= NEAR_BREAKPOINT:
+        return min_interval
+
+    interval = previous * BACKOFF
+    if slope > 0:
+        ahead = [p for p in points if p > temp]
+        interval = min(interval, (ahead[0] - temp) / slope / 2)
+    elif slope < 0:
+        behind = [p for p in points if p < temp]
+        if behind:
+            interval = min(interval, (temp - behind[-1]) / -slope / 2)
+    return max(min_interval, min(max_interval, interval))
@@ -0,0 +1,52 @@
+"""
+Concurrency limit for host polls whose limit can change while polls are in flight.
+"""
+import asyncio
+from collections import deque
+from typing import Deque
+
+
+class PollLimiter:
+    """同时进行的轮询数不超过 limit 的限制器，用法与 asyncio.Semaphore 相同（async with）
+
+    调整上限时不替换对象：正在进行的轮询仍在同一个计数上释放名额，调小上限后
+    只有在进行中的轮询数降到新上限以下时才放行等待者，任何时刻都不会超过上限。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def resize(self, limit: int) -> None:
+        """修改上限；调大时立即放行等待者，调小时等进行中的轮询自然结束"""
+        self.limit = limit
+        self._wake()
+
+    def _wake(self) -> None:
+        # 按先来先到放行，名额在放行时即记入 active
+        while self._waiters and self.active < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    async def __aenter__(self) -> "PollLimiter":
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return self
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已分到名额后才被取消：归还名额
+                self.active -= 1
+                self._wake()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.active -= 1
+        self._wake()
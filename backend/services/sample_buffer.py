@@ -0,0 +1,231 @@
+"""
+In-memory columnar ring buffer of recent history samples, one per host.
+"""
+import logging
+import math
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from database import SessionLocal, as_utc
+from services.history_query import bucket_seconds_for, bucket_span, poll_interval
+from services.history_rollup import from_epoch, select_tier, to_epoch
+from services.history_store import get_history_store
+
+logger = logging.getLogger(__name__)
+
+# 默认缓存最近 6 小时，覆盖仪表盘的 1h / 6h 范围
+DEFAULT_WINDOW = timedelta(hours=6)
+# 按采样间隔计算容量时预留的余量（间隔抖动、手动触发的额外轮询）
+CAPACITY_HEADROOM = 1.25
+# 功耗未知时的占位值（uint16 最大值）
+_POWER_NONE = 0xFFFF
+
+
+class HostSampleBuffer:
+    """单台主机的固定容量环形缓冲，每个指标一列 array，写满后覆盖最旧的采样
+
+    每个采样占 19 字节：时间戳 float64、CPU 温度 float64（与数据库精度相同）、
+    风扇转速 uint8（%）、功耗 uint16（W）。
+    """
+
+    __slots__ = ("capacity", "times", "cpu_temps", "fan_speeds", "powers",
+                 "head", "size", "complete_since")
+
+    def __init__(self, capacity: int, complete_since: float):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.cpu_temps = array("d", bytes(8 * capacity))
+        self.fan_speeds = array("B", bytes(capacity))
+        self.powers = array("H", bytes(2 * capacity))
+        self.head = 0   # 下一个写入位置
+        self.size = 0
+        # 从此时间（epoch 秒）起的采样完整保存在缓冲中，更早的查询需回落到数据库
+        self.complete_since = complete_since
+
+    def append(self, epoch: float, cpu_temp: float, fan_speed: int, power: Optional[int]) -> None:
+        i = self.head
+        if self.size == self.capacity:
+            # 覆盖最旧的采样，它之前的时间段不再完整
+            self.complete_since = max(self.complete_since, self.times[i] + 1e-6)
+        else:
+            self.size += 1
+        self.times[i] = epoch
+        self.cpu_temps[i] = cpu_temp
+        self.fan_speeds[i] = max(0, min(255, int(fan_speed)))
+        self.powers[i] = _POWER_NONE if power is None else max(0, min(_POWER_NONE - 1, int(power)))
+        self.head = (i + 1) % self.capacity
+
+    def ordered(self, column: array) -> array:
+        """按时间顺序返回一列（写满时拼接环的两段）"""
+        if self.size < self.capacity:
+            return column[:self.size]
+        return column[self.head:] + column[:self.head]
+
+    def resized(self, capacity: int) -> "HostSampleBuffer":
+        """复制为新容量的缓冲，保留最新的采样"""
+        times = self.ordered(self.times)
+        temps, fans, powers = self.ordered(self.cpu_temps), self.ordered(self.fan_speeds), self.ordered(self.powers)
+        first = max(0, len(times) - capacity)
+        complete_since = self.complete_since
+        if first > 0:
+            # 缩容丢弃了最旧的采样
+            complete_since = max(complete_since, times[first - 1] + 1e-6)
+        buffer = HostSampleBuffer(capacity, complete_since)
+        for i in range(first, len(times)):
+            buffer.append(times[i], temps[i], fans[i], None if powers[i] == _POWER_NONE else powers[i])
+        return buffer
+
+    @property
+    def nbytes(self) -> int:
+        """列数据占用的字节数"""
+        return sum(col.itemsize * len(col) for col in (self.times, self.cpu_temps, self.fan_speeds, self.powers))
+
+
+class SampleBuffer:
+    """所有主机最近一段时间的采样，供仪表盘的短时间范围查询直接使用
+
+    由事件循环线程写入、请求线程池读取，读写都持有同一把锁（操作均为常数或
+    线性于窗口内采样数）。
+    """
+
+    def __init__(self, window: timedelta = DEFAULT_WINDOW, interval: int = 30):
+        self.window = window
+        self.capacity = self._capacity_for(interval)
+        self._hosts: Dict[int, HostSampleBuffer] = {}
+        # 预热覆盖的起点；预热后从未出现的主机在此之后确实没有数据
+        self._warm_since: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _capacity_for(self, interval: int) -> int:
+        return math.ceil(self.window.total_seconds() / max(1, interval) * CAPACITY_HEADROOM)
+
+    def set_interval(self, interval: int) -> None:
+        """采样间隔变化时调整每台主机的容量"""
+        capacity = self._capacity_for(interval)
+        if capacity == self.capacity:
+            return
+        with self._lock:
+            self.capacity = capacity
+            self._hosts = {host_id: buf.resized(capacity) for host_id, buf in self._hosts.items()}
+
+    def append(self, host_id: int, recorded_at: datetime, cpu_temp: float, fan_speed: int,
+               power: Optional[int]) -> None:
+        epoch = as_utc(recorded_at).timestamp()
+        with self._lock:
+            buffer = self._hosts.get(host_id)
+            if buffer is None:
+                # 运行中新增的主机：数据库里可能还有更早的数据，从现在起才算完整
+                buffer = self._hosts[host_id] = HostSampleBuffer(self.capacity, epoch)
+            buffer.append(epoch, cpu_temp, fan_speed, power)
+
+    def drop(self, host_id: int) -> None:
+        with self._lock:
+            self._hosts.pop(host_id, None)
+
+    def warm(self, now: Optional[datetime] = None) -> int:
+        """从数据库加载窗口内的采样（启动时、开始轮询前调用），返回加载条数"""
+        now = now or datetime.now(timezone.utc)
+        since = now - self.window
+        samples = get_history_store().select_samples(since, now)
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                samples.c.host_id, samples.c.recorded_at, samples.c.cpu_temp,
+                samples.c.fan_speed, samples.c.power_consumption,
+            ).filter(samples.c.host_id.isnot(None)).order_by(samples.c.recorded_at).all()
+        finally:
+            db.close()
+
+        since_epoch = since.timestamp()
+        hosts: Dict[int, HostSampleBuffer] = {}
+        for host_id, recorded_at, cpu_temp, fan_speed, power in rows:
+            buffer = hosts.get(host_id)
+            if buffer is None:
+                buffer = hosts[host_id] = HostSampleBuffer(self.capacity, since_epoch)
+            buffer.append(as_utc(recorded_at).timestamp(), cpu_temp, fan_speed, power)
+        with self._lock:
+            self._hosts = hosts
+            self._warm_since = since_epoch
+        logger.info(f"最近 {self.window} 的历史数据已载入内存，共 {len(rows)} 条，{len(hosts)} 台主机")
+        return len(rows)
+
+    def query(self, host_id: int, since: datetime, until: datetime, limit: int) -> Optional[List[Dict]]:
+        """按与 query_history 相同的规则分桶聚合；缓冲不能完整覆盖时返回 None
+
+        query_history 改查预聚合档位时，这里同样先把采样归入该档位的桶：只取档位桶起点落在
+        [since, until) 内的采样，按档位桶起点分组并以其作为点的时间，两条路径结果一致。
+        """
+        since_epoch = to_epoch(since)
+        bucket_seconds = bucket_seconds_for(until - since, limit)
+        tier = select_tier(since, bucket_seconds, now=until)
+        # 原始数据按整秒时间戳分桶（与 SQL 中 strftime('%s') 的截断一致），档位则按档位桶起点
+        step = tier.seconds if tier is not None else 1
+
+        def boundary(epoch: int) -> int:
+            """不早于 epoch 的第一个档位桶起点：键小于它的采样，时间戳也都小于它"""
+            return -(-epoch // step) * step
+
+        # 需要缓冲完整覆盖的起点：档位按截断到整秒的 since 取桶，可能含 since 之前不足一秒的采样
+        covered_from = since.timestamp() if tier is None else boundary(since_epoch)
+        with self._lock:
+            buffer = self._hosts.get(host_id)
+            if buffer is None:
+                # 启动预热后没有出现过的主机：窗口内确实没有数据
+                if self._warm_since is not None and covered_from >= self._warm_since:
+                    return []
+                return None
+            if covered_from < buffer.complete_since:
+                return None
+            times = buffer.ordered(buffer.times)
+            temps = buffer.ordered(buffer.cpu_temps)
+            fans = buffer.ordered(buffer.fan_speeds)
+            powers = buffer.ordered(buffer.powers)
+
+        start = bisect_left(times, covered_from)
+        end = bisect_left(times, until.timestamp() if tier is None else boundary(to_epoch(until)))
+        span = bucket_span(since, until, bucket_seconds)
+        result: List[Dict] = []
+        # 逐桶用二分定位边界，再对 array 切片做 sum/min/max，避免逐采样的 Python 运算
+        while start < end and len(result) < limit:
+            key = int(times[start])
+            key -= key % step
+            bucket = (key - since_epoch) // bucket_seconds
+            stop = min(end, bisect_left(times, boundary(since_epoch + (bucket + 1) * bucket_seconds), start))
+            n = stop - start
+            t = temps[start:stop]
+            f = fans[start:stop]
+            p = powers[start:stop]
+            if _POWER_NONE in p:
+                p = [v for v in p if v != _POWER_NONE]
+            if tier is None:
+                first = datetime.fromtimestamp(times[start], tz=timezone.utc).replace(tzinfo=None)
+            else:
+                first = from_epoch(key)
+            result.append({
+                "time": first.isoformat(),
+                "cpu_temp": round(sum(t) / n, 1),
+                "cpu_temp_min": min(t),
+                "cpu_temp_max": max(t),
+                "fan_speed": round(sum(f) / n, 1),
+                "fan_speed_min": min(f),
+                "fan_speed_max": max(f),
+                "power": round(sum(p) / len(p), 1) if p else None,
+                "power_min": min(p) if p else None,
+                "power_max": max(p) if p else None,
+                "poll_interval": poll_interval(span(bucket), n, 1),
+            })
+            start = stop
+        return result
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(buf.nbytes for buf in self._hosts.values())
+
+    @property
+    def sample_count(self) -> int:
+        with self._lock:
+            return sum(buf.size for buf in self._hosts.values())
@@ -0,0 +1,476 @@
+"""
+Sensor backends: how temperatures, fans and power are read from the BMC.
+
+- ``racadm``: ``racadm getsensorinfo`` every tick (whole sensor inventory as text);
+  the full inventory is parsed in one regex pass over the output, while reads that only
+  need the control sensors are parsed line by line as output arrives and stop early
+- ``sdr``: fetch the SDR repository once (cached on disk per host), then issue
+  targeted ``Get Sensor Reading`` requests for the CPU, inlet/exhaust temperature
+  and power sensors
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional, Type
+
+from services.ipmi_transport import IPMITransport, run_command, stream_command
+from database import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SENSOR_BACKEND = "racadm"
+
+
+# 风扇控制依据的温度
+CONTROL_TARGETS = ("cpu_avg", "cpu_max", "inlet")
+DEFAULT_CONTROL_TARGET = "cpu_avg"
+
+_CPU_TEMP_NAME = re.compile(r"^CPU\d+ Temp$")
+
+
+@dataclass
+class SensorReading:
+    """一个数值型传感器读数"""
+    name: str
+    kind: str       # temperature / fan / power / current / voltage / percent
+    value: float
+    unit: str       # C / RPM / W / A / V / %
+    status: str = "Ok"
+
+
+@dataclass
+class HardwareStatus:
+    cpu_temp: float     # 所有 CPU 温度的平均值
+    power: int
+    # 本次读取到的全部传感器（sdr 后端只含定向读取的传感器）
+    sensors: List[SensorReading] = field(default_factory=list)
+
+    @property
+    def cpu_temps(self) -> List[float]:
+        return [s.value for s in self.sensors if s.status == "Ok" and _CPU_TEMP_NAME.match(s.name)]
+
+    @property
+    def max_cpu_temp(self) -> float:
+        return max(self.cpu_temps, default=self.cpu_temp)
+
+    @property
+    def inlet_temp(self) -> Optional[float]:
+        for s in self.sensors:
+            if s.kind == "temperature" and s.status == "Ok" and "Inlet" in s.name:
+                return s.value
+        return None
+
+    def control_temperature(self, target: str) -> Optional[float]:
+        """按控制目标取温度；没有对应传感器时返回 None"""
+        if target == "cpu_max":
+            return self.max_cpu_temp
+        if target == "inlet":
+            return self.inlet_temp
+        return self.cpu_temp
+
+
+# ---- racadm getsensorinfo 解析 ----
+
+# 读数单位 -> (统一单位, 传感器种类)
+RACADM_UNITS = {
+    "C": ("C", "temperature"),
+    "RPM": ("RPM", "fan"),
+    "Watts": ("W", "power"),
+    "Amps": ("A", "current"),
+    "Volts": ("V", "voltage"),
+    "%": ("%", "percent"),
+}
+# 一行一个传感器：名称（单个空格分隔的若干词）、至少两个空格、状态、读数。
+# 不带数值读数的行（表头、电源 Present、离散传感器）不会匹配；占有量词避免失败行上的回溯
+_RACADM_READING = re.compile(
+    r"(?P<name>[^\s<]\S*+(?: \S++)*+) {2,}+(?P<status>\S++) ++(?P<value>-?\d++(?:\.\d++)?)"
+    r"(?P<unit>C|RPM|Watts|Amps|Volts|%)(?!\S)"
+)
+# 整段输出上的同一模式：以换行符开头，引擎按字面量前缀直接跳到各行行首，
+# 比在每个位置尝试 (?m)^ 或逐行调用 match 快得多
+_RACADM_READINGS = re.compile(r"\n" + _RACADM_READING.pattern)
+_RACADM_SECTION = "Sensor Type"
+# 控制只需要的分组：CPU / 进风口温度在 TEMPERATURE 中，整机功耗在 CURRENT 中
+_CONTROL_SECTIONS = frozenset({"TEMPERATURE", "CURRENT"})
+
+
+class SensorInfoParser:
+    """逐行解析 racadm getsensorinfo 输出（可在子进程输出到达时边读边解析）
+
+    输出按 "Sensor Type : XXX" 分组，每组先是以 "<" 开头的表头，再是每个传感器一行。
+    all_sensors 为 False 时只解析控制需要的分组，并在 TEMPERATURE 分组结束且读到
+    整机功耗后让 feed 返回 True，调用方即可停止读取剩余输出。
+    """
+
+    __slots__ = ("all_sensors", "readings", "section", "lines", "_temperature_done", "_power_found")
+
+    def __init__(self, all_sensors: bool = True):
+        self.all_sensors = all_sensors
+        self.readings: List[SensorReading] = []
+        # 没有分组标题的输出按一个整体处理
+        self.section: Optional[str] = None
+        self.lines = 0
+        self._temperature_done = False
+        self._power_found = False
+
+    @property
+    def done(self) -> bool:
+        return not self.all_sensors and self._temperature_done and self._power_found
+
+    def feed(self, line: str) -> bool:
+        """输入一行（不含换行符），返回 True 表示已拿到所需的全部传感器"""
+        self.lines += 1
+        if line.startswith(_RACADM_SECTION):
+            if self.section == "TEMPERATURE":
+                self._temperature_done = True
+            self.section = line.partition(":")[2].strip().upper()
+            return self.done
+        if not self.all_sensors and self.section is not None and self.section not in _CONTROL_SECTIONS:
+            return False
+        match = _RACADM_READING.match(line)
+        if match is None:
+            return False
+        name, status, value, unit = match.groups()
+        unit, kind = RACADM_UNITS[unit]
+        self.readings.append(SensorReading(name=name, kind=kind, value=float(value), unit=unit, status=status))
+        if unit == "W" and "Pwr Consumption" in name:
+            self._power_found = True
+            return self.done
+        return False
+
+    def result(self) -> "HardwareStatus":
+        return summarize_sensors(self.readings)
+
+
+def parse_getsensorinfo(data: str, all_sensors: bool = True) -> List[SensorReading]:
+    """解析一段完整的 racadm getsensorinfo 输出
+
+    需要全部传感器时在整段文本上用一次 findall 完成；只需控制传感器时按分组逐行解析。
+    两种方式得到的读数与逐行 feed 相同。
+    """
+    if not all_sensors:
+        parser = SensorInfoParser(all_sensors)
+        for line in data.splitlines():
+            if parser.feed(line):
+                break
+        return parser.readings
+
+    readings = []
+    for name, status, value, unit in _RACADM_READINGS.findall("\n" + data):
+        unit, kind = RACADM_UNITS[unit]
+        # 按位置传参：大型机箱每次有数百个读数，比关键字参数省约三分之一的构造时间
+        readings.append(SensorReading(name, kind, float(value), unit, status))
+    return readings
+
+
+def summarize_sensors(sensors: List[SensorReading]) -> HardwareStatus:
+    """由传感器读数得到 CPU 平均温度和整机功耗"""
+    status = HardwareStatus(cpu_temp=0.0, power=0, sensors=sensors)
+    cpu_temps = status.cpu_temps
+    if not cpu_temps:
+        raise ValueError("未找到有效的CPU温度数据")
+    status.cpu_temp = sum(cpu_temps) / len(cpu_temps)
+    for s in sensors:
+        if s.unit == "W" and s.status == "Ok" and "Pwr Consumption" in s.name:
+            status.power = int(s.value)
+            break
+    return status
+
+
+class SensorBackend:
+    """传感器读取后端基类
+
+    read 的 all_sensors 为 False 时后端可以只读取控制需要的传感器（CPU 温度、
+    进风口温度和整机功耗）。
+    """
+
+    name = "base"
+
+    def __init__(self, ip: str, username: str, password: str, transport: IPMITransport):
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.transport = transport
+        # 外部命令（racadm）的单次超时和尝试次数
+        self.timeout: float = 15
+        self.max_retries = 3
+
+    async def read(self, all_sensors: bool = True) -> HardwareStatus:
+        raise NotImplementedError
+
+
+class RacadmSensorBackend(SensorBackend):
+    """通过 racadm getsensorinfo 读取传感器列表
+
+    需要全部传感器时无论如何都要读完整段输出，逐行流式解析没有收益，改为读完后整段解析；
+    只需控制传感器时边到达边解析，拿到 CPU 温度和整机功耗后即结束 racadm。
+    """
+
+    name = "racadm"
+
+    async def read(self, all_sensors: bool = True) -> HardwareStatus:
+        command = [
+            'racadm', '-r', self.ip, '-u', self.username, '-p', self.password,
+            'getsensorinfo'
+        ]
+        if all_sensors:
+            output = await run_command(command, max_retries=self.max_retries, timeout=self.timeout)
+            return summarize_sensors(parse_getsensorinfo(output))
+        parser = await stream_command(
+            command, lambda: SensorInfoParser(all_sensors), max_retries=self.max_retries, timeout=self.timeout
+        )
+        return parser.result()
+
+
+# ---- SDR 解析 ----
+
+SDR_FULL_SENSOR = 0x01
+SDR_COMPACT_SENSOR = 0x02
+
+SENSOR_TYPE_TEMPERATURE = 0x01
+ENTITY_PROCESSOR = 0x03
+UNIT_DEGREES_C = 0x01
+UNIT_WATTS = 0x06
+
+
+@dataclass
+class SdrSensor:
+    """SDR 中一个传感器的读数换算信息"""
+    number: int
+    name: str
+    entity_id: int
+    entity_instance: int
+    sensor_type: int
+    base_unit: int
+    analog_format: int = 0
+    linearization: int = 0
+    m: int = 1
+    b: int = 0
+    b_exp: int = 0
+    r_exp: int = 0
+    owner_lun: int = 0
+
+    def convert(self, raw: int) -> float:
+        """按 y = (M*x + B*10^Bexp) * 10^Rexp 将原始读数换算为实际值"""
+        if self.analog_format == 1:
+            x = raw - 255 if raw & 0x80 else raw  # 反码
+        elif self.analog_format == 2:
+            x = raw - 256 if raw & 0x80 else raw  # 补码
+        else:
+            x = raw
+        return (self.m * x + self.b * 10 ** self.b_exp) * 10 ** self.r_exp
+
+
+def _signed(value: int, bits: int) -> int:
+    return value - (1 << bits) if value & (1 << (bits - 1)) else value
+
+
+def _decode_id_string(type_length: int, raw: bytes) -> str:
+    length = type_length & 0x1F
+    return raw[:length].decode("latin-1").rstrip("\x00").strip()
+
+
+def parse_sdr_records(dump: bytes) -> List[SdrSensor]:
+    """解析 ipmitool sdr dump 生成的二进制 SDR 仓库（仅保留全/紧凑传感器记录）"""
+    sensors = []
+    offset = 0
+    while offset + 5 <= len(dump):
+        record_type, length = dump[offset + 3], dump[offset + 4]
+        record = dump[offset:offset + 5 + length]
+        offset += 5 + length
+        if len(record) < 5 + length:
+            break
+
+        if record_type == SDR_FULL_SENSOR and len(record) >= 48:
+            m = record[24] | ((record[25] & 0xC0) << 2)
+            b = record[26] | ((record[27] & 0xC0) << 2)
+            sensors.append(SdrSensor(
+                number=record[7],
+                name=_decode_id_string(record[47], record[48:]),
+                entity_id=record[8],
+                entity_instance=record[9] & 0x7F,
+                sensor_type=record[12],
+                base_unit=record[21],
+                analog_format=record[20] >> 6,
+                linearization=record[23] & 0x7F,
+                m=_signed(m, 10),
+                b=_signed(b, 10),
+                b_exp=_signed(record[29] & 0x0F, 4),
+                r_exp=_signed(record[29] >> 4, 4),
+                owner_lun=record[6] & 0x03,
+            ))
+        elif record_type == SDR_COMPACT_SENSOR and len(record) >= 32:
+            sensors.append(SdrSensor(
+                number=record[7],
+                name=_decode_id_string(record[31], record[32:]),
+                entity_id=record[8],
+                entity_instance=record[9] & 0x7F,
+                sensor_type=record[12],
+                base_unit=record[21],
+                owner_lun=record[6] & 0x03,
+            ))
+    return sensors
+
+
+def select_sensors(sensors: List[SdrSensor]) -> Dict[str, List[SdrSensor]]:
+    """挑出 CPU 温度、进/出风口温度和整机功耗传感器"""
+    readable = [s for s in sensors if s.owner_lun == 0 and s.linearization == 0]
+    cpu = [
+        s for s in readable
+        if s.sensor_type == SENSOR_TYPE_TEMPERATURE and s.entity_id == ENTITY_PROCESSOR
+        and s.base_unit == UNIT_DEGREES_C
+    ]
+    airflow = [
+        s for s in readable
+        if s.sensor_type == SENSOR_TYPE_TEMPERATURE and s.base_unit == UNIT_DEGREES_C
+        and ("Inlet" in s.name or "Exhaust" in s.name)
+    ]
+    watts = [s for s in readable if s.base_unit == UNIT_WATTS]
+    power = [s for s in watts if "Pwr Consumption" in s.name] or watts[:1]
+    return {"cpu": cpu, "airflow": airflow, "power": power[:1]}
+
+
+class SdrSensorBackend(SensorBackend):
+    """基于 SDR 缓存的定向读取
+
+    SDR 仓库只在首次使用或指纹（固件版本 + SDR 仓库修改时间戳）变化时通过
+    ``ipmitool sdr dump`` 拉取一次，解析结果按主机缓存到磁盘；之后每个周期
+    只对需要的传感器发送 Get Sensor Reading，每条响应仅几个字节。
+    """
+
+    name = "sdr"
+
+    # 指纹重新校验间隔（秒），用于发现固件升级或 SDR 变更
+    FINGERPRINT_TTL = 3600
+
+    def __init__(self, *args, cache_dir: Optional[str] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_dir = cache_dir or os.path.join(DATA_DIR, "sdr_cache")
+        self._selected: Optional[Dict[str, List[SdrSensor]]] = None
+        self._fingerprint: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def cache_file(self) -> str:
+        safe_name = re.sub(r"[^0-9A-Za-z._-]", "_", f"{self.ip}_{self.transport.port}")
+        return os.path.join(self.cache_dir, f"{safe_name}.json")
+
+    async def fingerprint(self) -> str:
+        """固件版本（Get Device ID）+ SDR 仓库信息（记录数、增/删时间戳）"""
+        device_id = await self.transport.raw(0x06, 0x01)
+        repo_info = await self.transport.raw(0x0a, 0x20)
+        return device_id[2:4].hex() + device_id[11:15].hex() + "-" + repo_info[1:3].hex() + repo_info[5:13].hex()
+
+    def _load_cache(self) -> Optional[dict]:
+        try:
+            with open(self.cache_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_cache(self, fingerprint: str, sensors: List[SdrSensor]) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"fingerprint": fingerprint, "sensors": [asdict(s) for s in sensors]}, f)
+        os.replace(tmp, self.cache_file)
+
+    async def _dump_sdr(self) -> bytes:
+        """通过 ipmitool sdr dump 拉取完整 SDR 仓库"""
+        fd, path = tempfile.mkstemp(prefix="sdr-", suffix=".bin")
+        os.close(fd)
+        try:
+            await run_command(self.transport.ipmitool_args() + ['sdr', 'dump', path], timeout=120)
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(path)
+
+    async def _ensure_sdr(self) -> Dict[str, List[SdrSensor]]:
+        now = time.monotonic()
+        if self._selected is not None and now - self._checked_at < self.FINGERPRINT_TTL:
+            return self._selected
+
+        async with self._lock:
+            fingerprint = await self.fingerprint()
+            self._checked_at = time.monotonic()
+            if self._selected is not None and fingerprint == self._fingerprint:
+                return self._selected
+
+            cached = self._load_cache()
+            if cached and cached.get("fingerprint") == fingerprint:
+                sensors = [SdrSensor(**s) for s in cached["sensors"]]
+            else:
+                logger.info(f"[{self.ip}] SDR 缓存失效或不存在，正在拉取 SDR 仓库")
+                sensors = parse_sdr_records(await self._dump_sdr())
+                self._save_cache(fingerprint, sensors)
+                logger.info(f"[{self.ip}] SDR 仓库已缓存，共 {len(sensors)} 个传感器")
+
+            selected = select_sensors(sensors)
+            if not selected["cpu"]:
+                raise ValueError("SDR 中未找到 CPU 温度传感器")
+            self._selected = selected
+            self._fingerprint = fingerprint
+            return selected
+
+    def invalidate(self) -> None:
+        """丢弃内存中的 SDR，下次读取时重新校验指纹"""
+        self._selected = None
+
+    async def _read_sensor(self, sensor: SdrSensor) -> Optional[float]:
+        data = await self.transport.raw(0x04, 0x2d, bytes([sensor.number]))
+        # 第 2 字节 bit5 置位表示读数不可用
+        if len(data) < 2 or data[1] & 0x20:
+            return None
+        return sensor.convert(data[0])
+
+    async def read(self, all_sensors: bool = True) -> HardwareStatus:
+        # 只定向读取 CPU、进/出风口温度和功耗传感器，all_sensors 不影响读取范围
+        selected = await self._ensure_sdr()
+        readings = []
+        try:
+            # Dell 的 SDR 中各 CPU 温度传感器都叫 "Temp"，按 SDR 中的顺序命名为 "CPUn Temp"（与 racadm 一致）
+            for index, sensor in enumerate(selected["cpu"], start=1):
+                value = await self._read_sensor(sensor)
+                if value is not None:
+                    readings.append(SensorReading(f"CPU{index} Temp", "temperature", value, "C"))
+            for sensor in selected.get("airflow", []):
+                value = await self._read_sensor(sensor)
+                if value is not None:
+                    readings.append(SensorReading(sensor.name, "temperature", value, "C"))
+            for sensor in selected["power"]:
+                value = await self._read_sensor(sensor)
+                if value is not None:
+                    readings.append(SensorReading(sensor.name, "power", float(round(value)), "W"))
+        except Exception:
+            # 传感器编号可能因 SDR 变化而失效，下次重新校验
+            self.invalidate()
+            raise
+
+        status = summarize_sensors(readings)
+        if selected["power"] and not status.power:
+            # 功耗传感器名称不含 "Pwr Consumption" 时仍取所选的功耗传感器
+            status.power = next((int(r.value) for r in readings if r.unit == "W"), 0)
+        return status
+
+
+SENSOR_BACKENDS: Dict[str, Type[SensorBackend]] = {
+    RacadmSensorBackend.name: RacadmSensorBackend,
+    SdrSensorBackend.name: SdrSensorBackend,
+}
+
+
+def create_sensor_backend(kind: Optional[str], ip: str, username: str, password: str,
+                          transport: IPMITransport) -> SensorBackend:
+    """按名称创建传感器后端，未知名称使用默认后端"""
+    backend_cls = SENSOR_BACKENDS.get(kind or DEFAULT_SENSOR_BACKEND)
+    if backend_cls is None:
+        logger.warning(f"未知的传感器后端: {kind}，使用 {DEFAULT_SENSOR_BACKEND}")
+        backend_cls = SENSOR_BACKENDS[DEFAULT_SENSOR_BACKEND]
+    return backend_cls(ip, username, password, transport)
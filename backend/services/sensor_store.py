@@ -0,0 +1,145 @@
+"""
+Per-sensor history: a sensor-id dictionary plus a narrow samples table.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+
+from database import Sensor, SensorSample, engine, read_engine
+from services.history_query import bucket_seconds_for
+from services.history_rollup import from_epoch, to_epoch
+from services.sensor_backend import SensorReading
+
+logger = logging.getLogger(__name__)
+
+# 主机为空的采样按 0 号主机处理（与预聚合表一致）
+_NO_HOST = 0
+
+_sensor_table = Sensor.__table__
+_sample_table = SensorSample.__table__
+
+# (主机, 传感器名) -> 传感器 id
+_sensor_ids: Dict[Tuple[int, str], int] = {}
+_sensor_ids_lock = threading.Lock()
+
+
+def reset_sensor_ids() -> None:
+    """清空传感器 id 缓存（写入事务回滚后调用，回滚中新建的传感器 id 已失效）"""
+    with _sensor_ids_lock:
+        _sensor_ids.clear()
+
+
+def _resolve_sensor_ids(conn: Connection, host_id: int, readings: Sequence[SensorReading]) -> Dict[str, int]:
+    """传感器名 -> id，字典中没有的传感器在调用方的事务内新建"""
+    with _sensor_ids_lock:
+        ids = {r.name: _sensor_ids.get((host_id, r.name)) for r in readings}
+    missing = [r for r in readings if ids[r.name] is None]
+    if missing:
+        conn.execute(
+            sqlite_insert(_sensor_table).on_conflict_do_nothing(),
+            [{"host_id": host_id, "name": r.name, "kind": r.kind, "unit": r.unit} for r in missing],
+        )
+        rows = conn.execute(
+            select(_sensor_table.c.name, _sensor_table.c.id).where(_sensor_table.c.host_id == host_id)
+        ).all()
+        with _sensor_ids_lock:
+            for name, sensor_id in rows:
+                _sensor_ids[(host_id, name)] = sensor_id
+        ids.update((name, sensor_id) for name, sensor_id in rows if name in ids)
+    return ids
+
+
+def insert_sensor_samples(conn: Connection,
+                          samples: Sequence[Tuple[Optional[int], datetime, Sequence[SensorReading]]]) -> int:
+    """在调用方的事务内写入一批 (主机, 采样时间, 读数列表)，返回写入的读数条数"""
+    rows = []
+    for host_id, recorded_at, readings in samples:
+        if not readings:
+            continue
+        host_id = _NO_HOST if host_id is None else host_id
+        ids = _resolve_sensor_ids(conn, host_id, readings)
+        epoch = to_epoch(recorded_at)
+        rows.extend({"sensor_id": ids[r.name], "recorded_at": epoch, "value": r.value} for r in readings)
+    if rows:
+        conn.execute(_sample_table.insert(), rows)
+    return len(rows)
+
+
+def list_sensors(host_id: int) -> List[Dict]:
+    """主机的所有传感器"""
+    with read_engine.connect() as conn:
+        rows = conn.execute(
+            select(_sensor_table.c.id, _sensor_table.c.name, _sensor_table.c.kind, _sensor_table.c.unit)
+            .where(_sensor_table.c.host_id == host_id)
+            .order_by(_sensor_table.c.kind, _sensor_table.c.name)
+        ).all()
+    return [{"id": r.id, "name": r.name, "kind": r.kind, "unit": r.unit} for r in rows]
+
+
+def query_sensor_history(host_id: int, since: datetime, until: datetime, limit: int,
+                         names: Optional[Sequence[str]] = None) -> Dict:
+    """按时间桶聚合主机各传感器的读数，每个传感器最多 limit 个点
+
+    分组走 (sensor_id, recorded_at) 索引，每个点为桶内首个采样时间和 avg/min/max。
+    """
+    sensors = list_sensors(host_id)
+    if names:
+        sensors = [s for s in sensors if s["name"] in set(names)]
+    bucket_seconds = bucket_seconds_for(until - since, limit)
+    since_epoch = to_epoch(since)
+    result = {"bucket_seconds": bucket_seconds, "sensors": []}
+    if not sensors:
+        return result
+
+    c = _sample_table.c
+    bucket = ((c.recorded_at - since_epoch) // bucket_seconds).label("bucket")
+    stmt = select(
+        c.sensor_id, bucket, func.min(c.recorded_at), func.avg(c.value), func.min(c.value), func.max(c.value),
+    ).where(
+        c.sensor_id.in_([s["id"] for s in sensors]),
+        c.recorded_at >= since_epoch,
+        c.recorded_at < to_epoch(until),
+    ).group_by(c.sensor_id, bucket).order_by(c.sensor_id, bucket)
+
+    points: Dict[int, List[Dict]] = {}
+    with read_engine.connect() as conn:
+        for sensor_id, _, first, avg, low, high in conn.execute(stmt):
+            series = points.setdefault(sensor_id, [])
+            if len(series) < limit:
+                series.append({
+                    "time": from_epoch(first).isoformat(),
+                    "value": round(avg, 1),
+                    "min": low,
+                    "max": high,
+                })
+    result["sensors"] = [dict(s, data=points.get(s["id"], [])) for s in sensors]
+    return result
+
+
+def purge_sensor_samples(cutoff: datetime, chunk_size: int, chunk_pause: float) -> int:
+    """按传感器分块删除 cutoff 之前的读数（每块走 (sensor_id, recorded_at) 索引），块间让出写锁"""
+    cutoff_epoch = to_epoch(cutoff)
+    with engine.connect() as conn:
+        sensor_ids = conn.execute(select(_sensor_table.c.id)).scalars().all()
+
+    deleted = 0
+    for sensor_id in sensor_ids:
+        while True:
+            expired = select(_sample_table.c.id).where(
+                _sample_table.c.sensor_id == sensor_id,
+                _sample_table.c.recorded_at < cutoff_epoch,
+            ).limit(chunk_size)
+            with engine.begin() as conn:
+                count = conn.execute(_sample_table.delete().where(_sample_table.c.id.in_(expired))).rowcount or 0
+            deleted += count
+            if count < chunk_size:
+                break
+            if chunk_pause > 0:
+                time.sleep(chunk_pause)
+    return deleted
@@ -0,0 +1,56 @@
+"""
+Sliding-window temperature trend for predictive fan control.
+"""
+from collections import deque
+from typing import Deque, Tuple
+
+DEFAULT_PREDICT_WINDOW = 5      # 参与斜率估计的采样数
+DEFAULT_PREDICT_HORIZON = 30    # 预测提前量（秒），默认约一个采样间隔
+# 预测温度最多比当前温度高出的幅度，避免单个异常采样把风扇推到满速
+MAX_PROJECTED_RISE = 15.0
+
+
+class TemperatureTrend:
+    """最近若干个采样的温度趋势
+
+    用最小二乘法估计温度斜率（°C/秒），按斜率外推 horizon 秒后的温度。
+    只对升温做外推：降温时仍按当前温度控制，风扇不会提前降速。
+    """
+
+    __slots__ = ("samples",)
+
+    def __init__(self, window: int = DEFAULT_PREDICT_WINDOW):
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=max(2, window))
+
+    @property
+    def window(self) -> int:
+        return self.samples.maxlen
+
+    def resize(self, window: int) -> None:
+        if max(2, window) != self.samples.maxlen:
+            self.samples = deque(self.samples, maxlen=max(2, window))
+
+    def clear(self) -> None:
+        self.samples.clear()
+
+    def add(self, epoch: float, temp: float) -> None:
+        self.samples.append((epoch, temp))
+
+    def slope(self) -> float:
+        n = len(self.samples)
+        if n < 2:
+            return 0.0
+        mean_t = sum(t for t, _ in self.samples) / n
+        mean_y = sum(y for _, y in self.samples) / n
+        var = sum((t - mean_t) ** 2 for t, _ in self.samples)
+        if var <= 0:
+            return 0.0
+        return sum((t - mean_t) * (y - mean_y) for t, y in self.samples) / var
+
+    def project(self, horizon: float) -> float:
+        """horizon 秒后的预测温度（没有采样时返回 0）"""
+        if not self.samples:
+            return 0.0
+        current = self.samples[-1][1]
+        rise = min(MAX_PROJECTED_RISE, max(0.0, self.slope() * horizon))
+        return current + rise
@@ -1,37 +1,338 @@
 from fastapi import WebSocket
-from typing import List
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 每个连接最多排队的消息数，超出时丢弃最旧的消息
+DEFAULT_QUEUE_SIZE = 64
+# 单条消息的发送超时（秒），超时视为客户端卡死并断开
+DEFAULT_SEND_TIMEOUT = 5.0
+# 增量模式下每个状态主题保留的未确认状态数，超出后丢弃最旧的（客户端再确认它们时忽略）
+MAX_UNACKED_STATES = 32
+
+# 订阅主题
+TOPIC_STATUS = "status"      # 默认主机的 status_update（兼容单机版）
+TOPIC_HOST_PREFIX = "host:"  # host:<id> 单台主机的 host_status，host:* 为全部主机
+TOPIC_ALL_HOSTS = "host:*"
+TOPIC_LOGS = "logs"          # logs 或 logs:<LEVEL>，只接收该级别及以上的日志
+TOPIC_ALERTS = "alerts"
+
+_MISSING = object()
+
+
+def message_topic(message: dict) -> Optional[str]:
+    """服务端消息所属的主题"""
+    kind = message.get("type")
+    if kind == "status_update":
+        return TOPIC_STATUS
+    if kind == "host_status":
+        return f"{TOPIC_HOST_PREFIX}{message.get('host_id')}"
+    if kind in ("log", "log_batch"):
+        return TOPIC_LOGS
+    if kind == "alert":
+        return TOPIC_ALERTS
+    return None
+
+
+def is_state_topic(topic: Optional[str]) -> bool:
+    """状态类主题：每条消息是完整状态，带序号，可增量编码"""
+    return topic is not None and (topic == TOPIC_STATUS or topic.startswith(TOPIC_HOST_PREFIX))
+
+
+def parse_topic(topic: Any) -> Tuple[str, Optional[int]]:
+    """校验订阅主题，返回 (规范化主题, 日志级别)；非法时抛出 ValueError"""
+    if not isinstance(topic, str):
+        raise ValueError(f"无效的主题: {topic!r}")
+    if topic in (TOPIC_STATUS, TOPIC_ALERTS, TOPIC_ALL_HOSTS):
+        return topic, None
+    if topic.startswith(TOPIC_HOST_PREFIX) and topic[len(TOPIC_HOST_PREFIX):].isdigit():
+        return f"{TOPIC_HOST_PREFIX}{int(topic[len(TOPIC_HOST_PREFIX):])}", None
+    name, _, level = topic.partition(":")
+    if name == TOPIC_LOGS:
+        if not level:
+            return TOPIC_LOGS, logging.NOTSET
+        levelno = logging.getLevelName(level.upper())
+        if isinstance(levelno, int):
+            return TOPIC_LOGS, levelno
+    raise ValueError(f"无效的主题: {topic}")
+
+
+def _levelno(name: str) -> int:
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else logging.NOTSET
+
+
+def filter_log_batch(message: dict, level: int) -> Optional[dict]:
+    """只保留 level 及以上的日志记录；没有剩余记录时返回 None"""
+    entries = [e for e in message.get("data", []) if _levelno(e.get("level", "")) >= level]
+    if not entries:
+        return None
+    return dict(message, data=entries)
+
+
+def diff_state(base: dict, state: dict) -> Tuple[dict, List[str]]:
+    """state 相对 base 变化的字段和被删除的字段"""
+    changed = {k: v for k, v in state.items() if base.get(k, _MISSING) != v}
+    removed = [k for k in base if k not in state]
+    return changed, removed
+
+def coalesce_key(message: dict) -> Optional[str]:
+    """状态类消息只需保留最新一条：同 key 的待发消息会被新消息替换"""
+    kind = message.get("type")
+    if kind == "status_update":
+        return kind
+    if kind == "host_status":
+        return f"host_status:{message.get('host_id')}"
+    return None
+
+
+class ClientConnection:
+    """单个 WebSocket 客户端：有界发送队列 + 专属写任务
+
+    广播只把已序列化的消息放入队列，由写任务逐条发送，慢客户端不会拖慢
+    其他客户端和调用方。
+    """
+
+    def __init__(self, websocket: WebSocket, manager: "WebSocketManager",
+                 max_queue: int, send_timeout: float):
+        self.websocket = websocket
+        self.manager = manager
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.queue: Deque[Tuple[Optional[str], str]] = deque()
+        self._ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {"sent": 0, "dropped": 0, "coalesced": 0}
+        # 订阅的主题；None 表示未发送过 subscribe 的旧客户端，接收全部消息
+        self.topics: Optional[Set[str]] = None
+        self.log_level = logging.NOTSET
+        # 增量模式：状态消息只发送相对客户端最后确认状态的变化字段
+        self.delta = False
+        self.acked: Dict[str, Tuple[int, dict]] = {}
+        self.unacked: Dict[str, Dict[int, dict]] = {}
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._writer())
+
+    def enqueue(self, payload: str, key: Optional[str] = None) -> None:
+        if key is not None:
+            for i, (pending_key, _) in enumerate(self.queue):
+                if pending_key == key:
+                    # 未发出的旧状态直接被最新状态替换，位置不变
+                    self.queue[i] = (key, payload)
+                    self.stats["coalesced"] += 1
+                    return
+        if len(self.queue) >= self.max_queue:
+            self.queue.popleft()
+            self.stats["dropped"] += 1
+        self.queue.append((key, payload))
+        self._ready.set()
+
+    def wants(self, topic: Optional[str], message: dict) -> bool:
+        if self.topics is None or topic is None:
+            return True
+        if topic == TOPIC_LOGS:
+            if TOPIC_LOGS not in self.topics:
+                return False
+            if message.get("type") == "log_batch":
+                return True  # 按级别过滤记录在 broadcast 中完成
+            return _levelno(message.get("data", {}).get("level", "")) >= self.log_level
+        if topic.startswith(TOPIC_HOST_PREFIX):
+            return topic in self.topics or TOPIC_ALL_HOSTS in self.topics
+        return topic in self.topics
+
+    def subscribe(self, topics: Iterable[Any], delta: Optional[bool] = None) -> None:
+        parsed = [parse_topic(t) for t in topics]
+        if self.topics is None:
+            self.topics = set()
+        for topic, level in parsed:
+            self.topics.add(topic)
+            if level is not None:
+                self.log_level = level
+        if delta is not None and delta != self.delta:
+            self.delta = bool(delta)
+            self.acked.clear()
+            self.unacked.clear()
+
+    def unsubscribe(self, topics: Iterable[Any]) -> None:
+        parsed = [parse_topic(t)[0] for t in topics]
+        if self.topics is None:
+            # 旧客户端第一次退订：从“全部主题”开始减
+            self.topics = {TOPIC_STATUS, TOPIC_ALL_HOSTS, TOPIC_LOGS, TOPIC_ALERTS}
+        for topic in parsed:
+            self.topics.discard(topic)
+            self.acked.pop(topic, None)
+            self.unacked.pop(topic, None)
+
+    def ack(self, topic: str, seq: int) -> None:
+        """客户端确认已应用某主题序号为 seq 的状态，之后的增量以它为基准"""
+        history = self.unacked.get(topic)
+        if not history or seq not in history:
+            return
+        self.acked[topic] = (seq, history[seq])
+        for old in [s for s in history if s <= seq]:
+            del history[old]
+
+    def encode_state(self, topic: str, message: dict) -> str:
+        """增量模式下编码一条状态消息
+
+        还没有确认过的主题发送完整状态；否则 data 只包含相对 base 序号状态变化的
+        字段，removed 列出被删除的字段。基准总是客户端已确认的状态，所以中间的
+        消息被合并或丢弃都不影响客户端还原。
+        """
+        seq = message["seq"]
+        history = self.unacked.setdefault(topic, {})
+        history[seq] = message["data"]
+        if len(history) > MAX_UNACKED_STATES:
+            del history[min(history)]
+        base = self.acked.get(topic)
+        if base is None:
+            return json.dumps(message)
+        base_seq, base_state = base
+        changed, removed = diff_state(base_state, message["data"])
+        delta = dict(message, base=base_seq, data=changed)
+        if removed:
+            delta["removed"] = removed
+        return json.dumps(delta)
+
+    async def _writer(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self.queue:
+                    _, payload = self.queue.popleft()
+                    await asyncio.wait_for(self.websocket.send_text(payload), timeout=self.send_timeout)
+                    self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket 客户端发送超时（>{self.send_timeout}秒），断开连接")
+            await self.manager.evict(self.websocket)
+        except Exception:
+            await self.manager.evict(self.websocket)
+
+
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
+    def __init__(self, max_queue: int = DEFAULT_QUEUE_SIZE, send_timeout: float = DEFAULT_SEND_TIMEOUT):
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        # 每个状态主题的最新序号
+        self._seq: Dict[str, int] = {}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"WebSocket 连接建立，当前连接数: {len(self.active_connections)}")
-    
+        client = ClientConnection(websocket, self, self.max_queue, self.send_timeout)
+        self.clients[websocket] = client
+        client.start()
+        logger.info(f"WebSocket 连接建立，当前连接数: {len(self.clients)}")
+
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        logger.info(f"WebSocket 连接断开，当前连接数: {len(self.active_connections)}")
-    
-    async def broadcast(self, message: dict):
-        """广播消息给所有连接的客户端"""
-        if not self.active_connections:
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        if client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+        logger.info(f"WebSocket 连接断开，当前连接数: {len(self.clients)}")
+
+    async def evict(self, websocket: WebSocket):
+        """发送失败或超时的客户端：移出广播列表并尝试关闭连接"""
+        if websocket not in self.clients:
+            return
+        self.disconnect(websocket)
+        try:
+            await asyncio.wait_for(websocket.close(), timeout=1.0)
+        except Exception:
+            pass
+
+    def handle_message(self, websocket: WebSocket, text: str) -> None:
+        """处理客户端发来的消息：subscribe / unsubscribe / ack
+
+        subscribe:   {"type": "subscribe", "topics": ["host:1", "logs:WARNING", "alerts"], "delta": true}
+        unsubscribe: {"type": "unsubscribe", "topics": ["host:1"]}
+        ack:         {"type": "ack", "acks": {"host:1": 42, "status": 17}}
+        """
+        client = self.clients.get(websocket)
+        if client is None:
             return
-        
-        data = json.dumps(message)
-        disconnected = []
-        
-        for connection in self.active_connections:
+        try:
             try:
-                await connection.send_text(data)
-            except Exception:
-                disconnected.append(connection)
-        
-        for conn in disconnected:
-            self.disconnect(conn)
+                message = json.loads(text)
+            except json.JSONDecodeError:
+                raise ValueError("消息不是有效的 JSON")
+            if not isinstance(message, dict):
+                raise ValueError("消息必须是 JSON 对象")
+            kind = message.get("type")
+            if kind == "ack":
+                acks = message.get("acks")
+                if acks is None:
+                    acks = {message.get("topic"): message.get("seq")}
+                if not isinstance(acks, dict):
+                    raise ValueError("acks 必须是 {主题: 序号} 对象")
+                if not all(isinstance(topic, str) and isinstance(seq, int) and not isinstance(seq, bool)
+                           for topic, seq in acks.items()):
+                    raise ValueError("ack 的主题必须是字符串，序号必须是整数")
+                for topic, seq in acks.items():
+                    client.ack(topic, seq)
+                return
+            if kind not in ("subscribe", "unsubscribe"):
+                raise ValueError(f"未知的消息类型: {kind}")
+            topics = message.get("topics") or []
+            if not isinstance(topics, list):
+                raise ValueError("topics 必须是列表")
+            if kind == "subscribe":
+                client.subscribe(topics, message.get("delta"))
+            else:
+                client.unsubscribe(topics)
+            client.enqueue(json.dumps({
+                "type": "subscribed",
+                "topics": sorted(client.topics),
+                "log_level": logging.getLevelName(client.log_level),
+                "delta": client.delta,
+            }))
+        except ValueError as e:
+            client.enqueue(json.dumps({"type": "error", "message": str(e)}))
+
+    async def broadcast(self, message: dict):
+        """广播消息给订阅了对应主题的客户端
+
+        状态消息附带 topic 和递增的 seq。消息只序列化一次（增量模式的客户端单独
+        编码），放入每个连接的发送队列后立即返回，不等待发送完成。
+        """
+        if not self.clients:
+            return
+
+        topic = message_topic(message)
+        if is_state_topic(topic):
+            seq = self._seq[topic] = self._seq.get(topic, 0) + 1
+            message = dict(message, topic=topic, seq=seq)
+        data = None
+        key = coalesce_key(message)
+        # 日志批次按订阅级别过滤，同一级别只序列化一次
+        by_level: Dict[int, Optional[str]] = {}
+        for client in list(self.clients.values()):
+            if not client.wants(topic, message):
+                continue
+            if client.delta and is_state_topic(topic):
+                client.enqueue(client.encode_state(topic, message), key)
+                continue
+            if message.get("type") == "log_batch" and client.topics is not None \
+                    and client.log_level > logging.NOTSET:
+                if client.log_level not in by_level:
+                    filtered = filter_log_batch(message, client.log_level)
+                    by_level[client.log_level] = json.dumps(filtered) if filtered else None
+                if by_level[client.log_level] is not None:
+                    client.enqueue(by_level[client.log_level], key)
+                continue
+            if data is None:
+                data = json.dumps(message)
+            client.enqueue(data, key)
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+# 必须在导入 database 之前设置，避免写入真实数据目录
+os.environ.setdefault("DFC_DATA_DIR", tempfile.mkdtemp(prefix="dfc-test-"))
+
+import pytest
+from sqlalchemy import text
+
+from database import LOG_FTS_TABLE, Base, SessionLocal, engine, init_db
+
+
+@pytest.fixture
+def db():
+    """每个用例使用重新初始化的数据库"""
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        # 全文索引是虚拟表，不在 metadata 中
+        conn.execute(text(f"DROP TABLE IF EXISTS {LOG_FTS_TABLE}"))
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
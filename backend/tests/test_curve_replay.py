@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from database import MonitorHistory, engine, utcnow
+from services.curve_replay import replay_curve
+from services.fan_controller import CompiledCurve
+
+
+def test_replay_counts_every_sample_in_window(db):
+    until = utcnow()
+    since = until - timedelta(hours=2)
+    inside = [since + timedelta(seconds=30 * i) for i in range(240)]
+    # 窗口两侧的边界采样：since 之前一微秒和恰好在 until 的采样不在 [since, until) 内
+    outside = [since - timedelta(microseconds=1), until]
+    with engine.begin() as conn:
+        conn.execute(MonitorHistory.__table__.insert(), [
+            {"host_id": 1, "cpu_temp": 50 + i % 20, "fan_speed": 20, "power_consumption": 200, "recorded_at": t}
+            for i, t in enumerate(inside + outside)
+        ])
+
+    summary = list(replay_curve(CompiledCurve([(50, 15), (70, 40)]), since, until, 1))[-1]
+    assert summary["type"] == "summary"
+    assert summary["samples"] == len(inside)
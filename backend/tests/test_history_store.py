@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from database import engine
+from services.history_store import DailyHistoryStore
+
+
+def test_partition_from_rolled_back_batch_is_not_queried(db):
+    store = DailyHistoryStore()
+    store.refresh()
+    recorded_at = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+    rows = [{"host_id": 1, "cpu_temp": 50.0, "fan_speed": 20, "power_consumption": 200,
+             "recorded_at": recorded_at}]
+    since, until = recorded_at - timedelta(hours=1), recorded_at + timedelta(hours=1)
+    try:
+        with pytest.raises(RuntimeError):
+            with engine.begin() as conn:
+                created = store.insert(conn, [dict(row) for row in rows])
+                raise RuntimeError("写入失败")
+        assert created == ["monitor_history_d20240301"]
+        assert [t.name for t in store.tables_for(since, until)] == ["monitor_history"]
+
+        with engine.begin() as conn:
+            created = store.insert(conn, [dict(row) for row in rows])
+        store.register(created)
+        assert [t.name for t in store.tables_for(since, until)] == ["monitor_history", "monitor_history_d20240301"]
+        with engine.connect() as conn:
+            assert conn.execute(store.select_samples(since, until).select()).all()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text('DROP TABLE IF EXISTS "monitor_history_d20240301"'))
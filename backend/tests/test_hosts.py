@@ -0,0 +1,59 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import hosts, settings
+from database import Host, PASSWORD_MASK, Settings, sync_default_host
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+    app.include_router(hosts.router, prefix="/api/hosts")
+    app.include_router(settings.router, prefix="/api/settings")
+    return TestClient(app)
+
+
+def test_settings_save_does_not_touch_fleet_hosts(db):
+    client = make_client()
+    created = client.post("/api/hosts", json={"name": "h1", "ip_address": "10.0.0.1", "password": "secret"})
+    assert created.status_code == 200
+
+    response = client.put("/api/settings", json={"interval": 30, "username": "root", "ip_address": ""})
+    assert response.status_code == 200
+
+    db.expire_all()
+    host = db.query(Host).filter(Host.name == "h1").one()
+    assert (host.ip_address, host.username, host.password) == ("10.0.0.1", "root", "secret")
+    assert db.query(Host).count() == 1
+
+
+def test_settings_sync_into_legacy_host_skips_empty_values(db):
+    for key, value in {"ip_address": "10.0.0.9", "username": "admin", "password": "calvin"}.items():
+        db.query(Settings).filter(Settings.key == key).update({Settings.value: value})
+    db.commit()
+    sync_default_host(db)
+    client = make_client()
+    client.post("/api/hosts", json={"name": "h1", "ip_address": "10.0.0.1"})
+
+    client.put("/api/settings", json={"ip_address": "", "username": "root", "password": ""})
+    db.expire_all()
+    legacy = db.query(Host).filter(Host.legacy.is_(True)).one()
+    assert (legacy.ip_address, legacy.username, legacy.password) == ("10.0.0.9", "root", "calvin")
+
+    client.put("/api/settings", json={"ip_address": "10.0.0.10", "password": PASSWORD_MASK})
+    db.expire_all()
+    legacy = db.query(Host).filter(Host.legacy.is_(True)).one()
+    assert (legacy.ip_address, legacy.password) == ("10.0.0.10", "calvin")
+    assert db.query(Host).filter(Host.name == "h1").one().ip_address == "10.0.0.1"
+
+
+def test_update_host_ignores_masked_password(db):
+    client = make_client()
+    host = client.post("/api/hosts", json={"name": "h1", "ip_address": "10.0.0.1", "password": "secret"}).json()
+    assert host["password"] == PASSWORD_MASK
+
+    client.put(f"/api/hosts/{host['id']}", json=dict(host, username="admin"))
+    client.put(f"/api/hosts/{host['id']}", json={"password": ""})
+
+    db.expire_all()
+    stored = db.query(Host).filter(Host.id == host["id"]).one()
+    assert (stored.username, stored.password) == ("admin", "secret")
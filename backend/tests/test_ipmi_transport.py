@@ -0,0 +1,38 @@
+import asyncio
+import os
+import stat
+
+import pytest
+
+from services.ipmi_transport import ShellTransport, SubprocessTransport
+
+
+def fake_ipmitool(tmp_path, monkeypatch, shell_output: str):
+    """PATH 中放一个假的 ipmitool：shell 子命令输出 shell_output 后退出，raw 返回一个字节"""
+    script = tmp_path / "ipmitool"
+    script.write_text(
+        "#!/bin/sh\n"
+        'case "$*" in\n'
+        f"  *shell*) echo '{shell_output}'; exit 1 ;;\n"
+        "  *) echo ' 01' ;;\n"
+        "esac\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+
+def test_shell_without_readline_falls_back_to_subprocess(tmp_path, monkeypatch):
+    fake_ipmitool(tmp_path, monkeypatch, "Compiled without readline/editline, shell is disabled")
+    transport = ShellTransport("10.0.0.1", "root", "calvin", timeout=5)
+
+    assert asyncio.run(transport.raw(0x30, 0x30)) == b"\x01"
+    assert isinstance(transport._fallback, SubprocessTransport)
+
+
+def test_transient_shell_failure_does_not_disable_shell(tmp_path, monkeypatch):
+    fake_ipmitool(tmp_path, monkeypatch, "Error: Unable to establish IPMI v2 / RMCP+ session")
+    transport = ShellTransport("10.0.0.1", "root", "calvin", timeout=5)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(transport.raw(0x30, 0x30))
+    assert transport._fallback is None
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+import services.log_store as log_store
+from database import LOG_FTS_TABLE, LogRecord, _migrate_schema, engine
+
+
+def insert_logs(*messages):
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(LogRecord.__table__.insert(), [
+            {"recorded_at": now, "level": "ERROR", "logger": "test", "message": m} for m in messages
+        ])
+
+
+def reset_tokenizer_cache():
+    log_store._fts_tokenizer = None
+    log_store._fts_checked = False
+
+
+def search(keyword):
+    reset_tokenizer_cache()
+    logs, _ = log_store.query_log_records(search=keyword)
+    return [row["message"] for row in logs]
+
+
+def use_unicode61_index():
+    """模拟旧版本在不支持 trigram 的 SQLite 上建的 unicode61 索引"""
+    with engine.begin() as conn:
+        conn.execute(text("DROP TRIGGER log_records_ai"))
+        conn.execute(text("DROP TRIGGER log_records_ad"))
+        conn.execute(text(f"DROP TABLE {LOG_FTS_TABLE}"))
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {LOG_FTS_TABLE} USING fts5("
+            f"message, content='log_records', content_rowid='id', tokenize='unicode61')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER log_records_ai AFTER INSERT ON log_records BEGIN "
+            f"INSERT INTO {LOG_FTS_TABLE}(rowid, message) VALUES (new.id, new.message); END"
+        ))
+
+
+def test_search_matches_substrings_without_trigram_index(db):
+    use_unicode61_index()
+    insert_logs("[web-01] 监控错误: 命令超时", "[web-02] 状态监测正常")
+
+    assert search("错误") == ["[web-01] 监控错误: 命令超时"]
+    assert search("控错误") == ["[web-01] 监控错误: 命令超时"]
+    assert search("命令超") == ["[web-01] 监控错误: 命令超时"]
+
+
+def test_migration_replaces_unicode61_index(db):
+    use_unicode61_index()
+    _migrate_schema()
+    insert_logs("[web-01] 监控错误: 命令超时", "[web-02] 状态监测正常")
+
+    reset_tokenizer_cache()
+    assert log_store._get_fts_tokenizer() == "trigram"
+    assert search("控错误") == ["[web-01] 监控错误: 命令超时"]
+    assert search("监测") == ["[web-02] 状态监测正常"]
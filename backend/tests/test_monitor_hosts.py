@@ -0,0 +1,42 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import hosts
+from services.monitor_service import MonitorService
+
+
+class NullWebSocketManager:
+    async def broadcast(self, message: dict):
+        pass
+
+
+class RecordingIPMI:
+    """记录调用的假 IPMI 服务"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def disable_manual_control(self) -> bool:
+        self.calls.append("auto")
+        return True
+
+    async def close(self):
+        self.calls.append("close")
+
+
+def test_disabling_host_restores_auto_control(db):
+    service = MonitorService(NullWebSocketManager())
+    app = FastAPI()
+    app.include_router(hosts.router, prefix="/api/hosts")
+    hosts.set_monitor_service(service)
+    try:
+        client = TestClient(app)
+        host_id = client.post("/api/hosts", json={"name": "h1", "ip_address": "10.0.0.1"}).json()["id"]
+        ipmi = service.hosts[host_id].ipmi = RecordingIPMI()
+
+        assert client.put(f"/api/hosts/{host_id}", json={"enabled": False}).status_code == 200
+
+        assert host_id not in service.hosts
+        assert ipmi.calls == ["auto", "close"]
+    finally:
+        hosts.set_monitor_service(None)
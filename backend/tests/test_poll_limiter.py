@@ -0,0 +1,51 @@
+import asyncio
+
+from services.poll_limiter import PollLimiter
+
+
+def test_shrinking_limit_never_exceeds_new_limit_with_polls_in_flight():
+    async def run():
+        limiter = PollLimiter(4)
+        peak = {"active": 0, "after_resize": 0}
+        running = []
+        resized = asyncio.Event()
+
+        async def poll():
+            async with limiter:
+                running.append(1)
+                peak["active"] = max(peak["active"], len(running))
+                if resized.is_set():
+                    peak["after_resize"] = max(peak["after_resize"], len(running))
+                await asyncio.sleep(0.01)
+                running.pop()
+
+        tasks = [asyncio.create_task(poll()) for _ in range(12)]
+        await asyncio.sleep(0.005)
+        # 4 个轮询进行中时调小上限，旧名额归还后只放行到新上限
+        limiter.resize(2)
+        resized.set()
+        await asyncio.gather(*tasks)
+        return limiter, peak
+
+    limiter, peak = asyncio.run(run())
+    assert peak["active"] == 4
+    assert peak["after_resize"] <= 2
+    assert limiter.active == 0
+
+
+def test_growing_limit_releases_waiters_and_cancelled_waiters_return_slots():
+    async def run():
+        limiter = PollLimiter(1)
+        await limiter.__aenter__()
+        first = asyncio.create_task(limiter.__aenter__())
+        second = asyncio.create_task(limiter.__aenter__())
+        await asyncio.sleep(0)
+        first.cancel()
+        limiter.resize(2)
+        await asyncio.sleep(0)
+        return limiter, first, second
+
+    limiter, first, second = asyncio.run(run())
+    assert first.cancelled()
+    assert second.done() and not second.cancelled()
+    assert limiter.active == 2
@@ -0,0 +1,53 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+from database import MonitorHistory, engine, utcnow
+from services.history_query import query_history, resolve_range
+from services.history_rollup import apply_rollups
+from services.sample_buffer import SampleBuffer
+
+
+def populate():
+    """写入 7 小时、约 30 秒一个采样（带亚秒抖动）的数据，温度精度高于 0.1°C，部分功耗缺失"""
+    rng = random.Random(1)
+    # 起点落在整分钟后不足一秒处：1m 档位的首个桶含 since 之前的采样
+    until = utcnow().replace(second=0, microsecond=400000)
+    rows = []
+    for i in range(7 * 120, 0, -1):
+        rows.append({
+            "host_id": 1,
+            "recorded_at": until - timedelta(seconds=30 * i + rng.random()),
+            "cpu_temp": rng.randrange(160, 300) / 4,
+            "fan_speed": rng.randint(10, 60),
+            "power_consumption": None if i % 50 == 0 else rng.randint(120, 350),
+        })
+    with engine.begin() as conn:
+        conn.execute(MonitorHistory.__table__.insert(), rows)
+        apply_rollups(conn, rows)
+    return until
+
+
+@pytest.mark.parametrize("range_key", ["1h", "6h"])
+def test_buffer_matches_database(db, range_key):
+    until = populate()
+    delta, limit = resolve_range(range_key)
+    since = until - delta
+
+    buffer = SampleBuffer(window=timedelta(hours=7))
+    buffer.warm(now=until)
+    cached = buffer.query(1, since, until, limit)
+    assert cached
+    assert cached == query_history(db, since, until, limit, 1)
+
+
+def test_buffer_falls_back_when_first_rollup_bucket_is_not_covered(db):
+    until = populate()
+    delta, limit = resolve_range("6h")
+    since = until - delta
+
+    # 缓冲恰好从 since 开始，档位的首个桶还含 since 之前的采样，应回落到数据库
+    buffer = SampleBuffer()
+    buffer.warm(now=until)
+    assert buffer.query(1, since, until, limit) is None
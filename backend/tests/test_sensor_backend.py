@@ -0,0 +1,34 @@
+from pathlib import Path
+
+import pytest
+
+from services.sensor_backend import SensorInfoParser, parse_getsensorinfo, summarize_sensors
+
+FIXTURES = sorted((Path(__file__).parent.parent / "benchmarks" / "fixtures" / "getsensorinfo").glob("*.txt"))
+
+
+def feed_lines(data: str, all_sensors: bool) -> SensorInfoParser:
+    parser = SensorInfoParser(all_sensors)
+    for line in data.splitlines():
+        if parser.feed(line):
+            break
+    return parser
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda p: p.stem)
+def test_whole_text_parse_matches_line_parser(path):
+    data = path.read_bytes().decode()
+    readings = parse_getsensorinfo(data)
+    assert readings == feed_lines(data, True).readings
+    assert len(readings) > 10
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda p: p.stem)
+def test_control_parse_stops_early_with_same_summary(path):
+    data = path.read_bytes().decode()
+    full = summarize_sensors(parse_getsensorinfo(data))
+    control = feed_lines(data, False)
+    assert control.done
+    assert control.lines < data.count("\n")
+    status = control.result()
+    assert (status.cpu_temp, status.power, status.inlet_temp) == (full.cpu_temp, full.power, full.inlet_temp)
@@ -0,0 +1,24 @@
+import asyncio
+import json
+
+import pytest
+
+from services.websocket_service import ClientConnection, WebSocketManager
+
+
+@pytest.mark.parametrize("message", [
+    {"type": "ack", "acks": [["status", 1]]},
+    {"type": "ack", "acks": {"status": "1"}},
+    {"type": "ack", "topic": "status"},
+])
+def test_malformed_ack_is_reported_not_raised(message):
+    async def run():
+        manager = WebSocketManager()
+        websocket = object()
+        client = manager.clients[websocket] = ClientConnection(websocket, manager, 10, 1.0)
+        manager.handle_message(websocket, json.dumps(message))
+        return client
+
+    client = asyncio.run(run())
+    reply = json.loads(client.queue[-1][1])
+    assert reply["type"] == "error"
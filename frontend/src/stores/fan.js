@@ -64,6 +64,9 @@ export const useFanStore = defineStore('fan', () => {
           if (logs.value.length > 200) {
             logs.value.pop()
           }
+        } else if (data.type === 'log_batch') {
+          // 批次内按时间顺序排列，最新的放在最前
+          logs.value = [...data.data].reverse().concat(logs.value).slice(0, 200)
         }
       } catch (e) {
         console.error('WebSocket message parse error:', e)